@@ -4,15 +4,20 @@ from CommonServerUserPython import *
 
 ''' IMPORTS '''
 import csv
+import codecs
 import gzip
 import urllib3
 from dateutil.parser import parse
-from typing import Optional, Pattern, Dict, Any, Tuple, Union, List
+from typing import Optional, Pattern, Dict, Any, Tuple, Union, List, Iterable, Iterator
 
 # disable insecure warnings
 urllib3.disable_warnings()
 
 # Globals
+# the instance parameters which affect the indicators created from the content of a URL
+FINGERPRINT_PARAMS = ('url', 'feedTags', 'tlp_color', 'indicator_type', 'auto_detect_type', 'feed_url_to_config',
+                      'fieldnames', 'delimiter', 'doublequote', 'escapechar', 'quotechar', 'skipinitialspace',
+                      'ignore_regex', 'encoding', 'value_field')
 
 
 class Client(BaseClient):
@@ -20,7 +25,8 @@ class Client(BaseClient):
                  insecure: bool = False, credentials: dict = None, ignore_regex: str = None, encoding: str = 'latin-1',
                  delimiter: str = ',', doublequote: bool = True, escapechar: str = '',
                  quotechar: str = '"', skipinitialspace: bool = False, polling_timeout: int = 20, proxy: bool = False,
-                 feedTags: Optional[str] = None, tlp_color: Optional[str] = None, value_field: str = 'value', **kwargs):
+                 feedTags: Optional[str] = None, tlp_color: Optional[str] = None, value_field: str = 'value',
+                 skip_unchanged: bool = False, params_fingerprint: str = '', **kwargs):
         """
         :param url: URL of the feed.
         :param feed_url_to_config: for each URL, a configuration of the feed that contains
@@ -62,6 +68,10 @@ class Client(BaseClient):
         :param polling_timeout: timeout of the polling request in seconds. Default: 20
         :param proxy: Sets whether use proxy when sending requests
         :param tlp_color: Traffic Light Protocol color.
+        :param skip_unchanged: Send conditional requests based on the ETag, Last-Modified and content hash saved
+            for each URL, and return no readers when none of the URLs has changed since the last fetch.
+        :param params_fingerprint: A hash of the instance parameters, saved with the cache entry of each URL, so
+            the content of a URL is not skipped after the instance configuration changed.
         """
         self.tags: List[str] = argToList(feedTags)
         self.tlp_color = tlp_color
@@ -102,52 +112,42 @@ class Client(BaseClient):
             'quotechar': quotechar,
             'skipinitialspace': skipinitialspace
         }
+        self.skip_unchanged = skip_unchanged
+        self.params_fingerprint = params_fingerprint
+        # the validators and content hashes of the fetched URLs, saved once their indicators are created
+        self.url_cache: Optional[FeedURLCache] = None
+        self.download_session = create_feed_download_session()
 
-    def _build_request(self, url):
+    def _build_request(self, url, headers=None):
         r = requests.Request(
             'GET',
             url,
-            auth=self._auth
+            auth=self._auth,
+            headers=headers
         )
 
         return r.prepare()
 
     def build_iterator(self, **kwargs):
-        results = []
+        return list(self.iter_results(**kwargs))
+
+    def iter_results(self, **kwargs) -> Iterator[dict]:
+        """
+        Same as build_iterator, but the URLs are downloaded concurrently and the reader of each URL is yielded as
+        soon as its response arrives, so it can be parsed while the other URLs are still downloaded.
+        """
         urls = self._base_url
         if not isinstance(urls, list):
             urls = [urls]
-        for url in urls:
-            _session = requests.Session()
-
-            prepreq = self._build_request(url)
-
-            # this is to honour the proxy environment variables
-            kwargs.update(_session.merge_environment_settings(
-                prepreq.url,
-                {}, None, None, None  # defaults
-            ))
-            kwargs['stream'] = True
-            kwargs['verify'] = self._verify
-            kwargs['timeout'] = self.polling_timeout
-
-            if self.headers:
-                if 'headers' in kwargs:
-                    kwargs['headers'].update(self.headers)
-                else:
-                    kwargs['headers'] = self.headers
-
-            try:
-                r = _session.send(prepreq, **kwargs)
-            except requests.ConnectionError:
-                raise requests.ConnectionError('Failed to establish a new connection.'
-                                               ' Please make sure your URL is valid.')
-            try:
-                r.raise_for_status()
-            except Exception:
-                return_error('Exception in request: {} {}'.format(r.status_code, r.content))
-                raise
-
+        if self.skip_unchanged:
+            self.url_cache = FeedURLCache.from_integration_context(demisto.getIntegrationContext(),
+                                                                   self.params_fingerprint)
+        url_responses = iter_feed_url_responses(
+            lambda url, conditional_headers: self.get_url_response(url, conditional_headers, **kwargs), urls,
+            self.url_cache
+        )
+        for r in url_responses:
+            url = r.url
             response = self.get_feed_content_divided_to_lines(url, r)
             if self.feed_url_to_config:
                 fieldnames = self.feed_url_to_config.get(url, {}).get('fieldnames', [])
@@ -165,9 +165,38 @@ class Client(BaseClient):
                 **self.dialect
             )
 
-            results.append({url: csvreader})
+            yield {url: csvreader}
 
-        return results
+    def get_url_response(self, url, conditional_headers, **kwargs):
+        prepreq = self._build_request(url, conditional_headers)
+
+        # this is to honour the proxy environment variables
+        kwargs.update(self.download_session.merge_environment_settings(
+            prepreq.url,
+            {}, None, None, None  # defaults
+        ))
+        kwargs['stream'] = True
+        kwargs['verify'] = self._verify
+        kwargs['timeout'] = self.polling_timeout
+
+        if self.headers:
+            if 'headers' in kwargs:
+                kwargs['headers'].update(self.headers)
+            else:
+                kwargs['headers'] = self.headers
+
+        try:
+            r = self.download_session.send(prepreq, **kwargs)
+        except requests.ConnectionError:
+            raise requests.ConnectionError('Failed to establish a new connection.'
+                                           ' Please make sure your URL is valid.')
+        try:
+            r.raise_for_status()
+        except requests.HTTPError:
+            # reported by feed_main, as the request may be sent from a download thread
+            raise DemistoException('Exception in request: {} {}'.format(r.status_code, r.content))
+
+        return r
 
     def get_feed_content_divided_to_lines(self, url, raw_response):
         """Fetch feed data and divides its content to lines
@@ -177,14 +206,28 @@ class Client(BaseClient):
             raw_response: The raw response from the feed's url.
 
         Returns:
-            List. List of lines from the feed content.
+            Iterator. Iterator of the lines of the feed content, which are read from the response as they are parsed.
         """
         if self.feed_url_to_config and self.feed_url_to_config.get(url).get('is_zipped_file'):  # type: ignore
-            response_content = gzip.decompress(raw_response.content)
-        else:
-            response_content = raw_response.content
+            return iter(gzip.decompress(raw_response.content).decode(self.encoding).split('\n'))
+
+        return iter_decoded_lines(raw_response.iter_content(FEED_DOWNLOAD_CHUNK_SIZE), self.encoding)
+
 
-        return response_content.decode(self.encoding).split('\n')
+def iter_decoded_lines(chunks: Iterable[bytes], encoding: str) -> Iterator[str]:
+    """
+    Decodes the chunks of a body and splits them to lines, the same as body.decode(encoding).split('\\n')
+    :param chunks: The chunks of the body.
+    :param encoding: The encoding of the body.
+    :return: Iterator of the lines.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        pending = lines.pop()
+        yield from lines
+    yield pending + decoder.decode(b'', final=True)
 
 
 def determine_indicator_type(indicator_type, default_indicator_type, auto_detect, value):
@@ -254,7 +297,7 @@ def create_fields_mapping(raw_json: Dict[str, Any], mapping: Dict[str, Union[Tup
 
 
 def fetch_indicators_command(client: Client, default_indicator_type: str, auto_detect: bool, limit: int = 0, **kwargs):
-    iterator = client.build_iterator(**kwargs)
+    iterator = client.iter_results(**kwargs)
     indicators = []
     config = client.feed_url_to_config or {}
     for url_to_reader in iterator:
@@ -309,8 +352,11 @@ def feed_main(feed_name, params=None, prefix=''):
     if not params:
         params = {k: v for k, v in demisto.params().items() if v is not None}
     handle_proxy()
-    client = Client(**params)
     command = demisto.command()
+    # unchanged feed content is skipped only by fetches of instances which opted in
+    skip_unchanged = command == 'fetch-indicators' and argToBoolean(params.get('skip_unchanged', False))
+    client = Client(**dict(params, skip_unchanged=skip_unchanged,
+                           params_fingerprint=FeedURLCache.get_params_fingerprint(params, FINGERPRINT_PARAMS)))
     if command != 'fetch-indicators':
         demisto.info('Command being called is {}'.format(command))
     if prefix and not prefix.endswith('-'):
@@ -328,9 +374,17 @@ def feed_main(feed_name, params=None, prefix=''):
                 params.get('auto_detect_type'),
                 params.get('limit'),
             )
+            # in delta mode only the indicators which were added or changed since the last fetch are submitted
+            delta = FeedIndicatorsDelta.from_integration_context(demisto.getIntegrationContext()) \
+                if params.get('delta_mode') else None
             # we submit the indicators in batches
-            for b in batch(indicators, batch_size=2000):
+            for b in batch(delta.filter(indicators) if delta else indicators, batch_size=2000):
                 demisto.createIndicators(b)  # type: ignore
+            if client.url_cache:
+                demisto.setIntegrationContext(client.url_cache.update_integration_context(
+                    demisto.getIntegrationContext()))
+            if delta:
+                demisto.setIntegrationContext(delta.update_integration_context(demisto.getIntegrationContext()))
         else:
             args = demisto.args()
             args['feed_name'] = feed_name
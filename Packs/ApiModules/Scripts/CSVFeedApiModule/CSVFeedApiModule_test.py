@@ -1,3 +1,4 @@
+import pytest
 import requests_mock
 from CSVFeedApiModule import *
 
@@ -146,7 +147,45 @@ def test_get_feed_content():
             m.get(url, content=feed_url_to_config.get(url).get('content'))
             raw_response = requests.get(url)
 
-            assert client.get_feed_content_divided_to_lines(url, raw_response) == expected_output
+            assert list(client.get_feed_content_divided_to_lines(url, raw_response)) == expected_output
+
+
+def test_build_iterator_http_error(mocker):
+    """
+    Given:
+    - Two feed URLs, one of which answers with an error
+
+    When:
+    - Downloading the URLs concurrently
+
+    Then:
+    - Ensure the error is raised to the caller with the status and body of the response, and is not reported from
+      the download thread
+    """
+    return_error_mock = mocker.patch('CSVFeedApiModule.return_error')
+    client = Client(url=['https://ipstack1.com', 'https://ipstack2.com'], fieldnames='value', escapechar=None)
+    with requests_mock.Mocker() as m:
+        m.get('https://ipstack1.com', content=b'1.1.1.1')
+        m.get('https://ipstack2.com', status_code=500, content=b'server error')
+        with pytest.raises(DemistoException, match="500 b'server error'"):
+            client.build_iterator()
+    assert not return_error_mock.called
+
+
+def test_iter_decoded_lines():
+    """
+    Given:
+    - A UTF-8 body split to chunks in the middle of a line and of a multi-byte character
+
+    When:
+    - Dividing the chunks to lines
+
+    Then:
+    - Ensure the lines are the same as the lines of the whole decoded body
+    """
+    body = 'value,name\n1.1.1.1,caf\u00e9\n2.2.2.2,na\u00efve\n'.encode('utf8')
+    chunks = [body[i:i + 5] for i in range(0, len(body), 5)]
+    assert list(iter_decoded_lines(chunks, 'utf8')) == body.decode('utf8').split('\n')
 
 
 def test_date_format_parsing():
@@ -157,6 +196,47 @@ def test_date_format_parsing():
     assert formatted_date == '2020-02-01T12:13:14Z'
 
 
+def test_build_iterator_unchanged_feed(mocker):
+    """
+    Given:
+    - A feed URL whose ETag and content hash are saved in the integration context
+
+    When:
+    - Fetching indicators when the server answers 304, and when it returns the same content
+
+    Then:
+    - Ensure the conditional request header is sent and no readers are returned
+    - Ensure a modified feed is returned along with its new cache entry
+    - Ensure the cache entry is ignored after the instance parameters changed
+    """
+    with open('test_data/ip_ranges.txt') as ip_ranges_txt:
+        ip_ranges = ip_ranges_txt.read().encode('utf8')
+    url_cache_entry = {'etag': '"v1"', 'last_modified': None, 'hash': hashlib.sha256(ip_ranges).hexdigest(),
+                       'params': 'fingerprint'}
+    mocker.patch.object(demisto, 'getIntegrationContext',
+                        return_value={'feed_url_cache': {'https://ipstack.com': url_cache_entry}})
+
+    client = Client(url='https://ipstack.com', fieldnames='value', escapechar=None, skip_unchanged=True,
+                    params_fingerprint='fingerprint')
+    with requests_mock.Mocker() as m:
+        m.get('https://ipstack.com', status_code=304)
+        assert client.build_iterator() == []
+        assert m.last_request.headers['If-None-Match'] == '"v1"'
+
+        m.get('https://ipstack.com', content=ip_ranges)
+        assert client.build_iterator() == []
+
+        m.get('https://ipstack.com', content=ip_ranges + b'1.1.1.1', headers={'ETag': '"v2"'})
+        assert len(client.build_iterator()) == 1
+        assert client.url_cache.updates['https://ipstack.com']['etag'] == '"v2"'
+
+        client = Client(url='https://ipstack.com', fieldnames='value', escapechar=None, skip_unchanged=True,
+                        params_fingerprint='other fingerprint')
+        m.get('https://ipstack.com', content=ip_ranges)
+        assert len(client.build_iterator()) == 1
+        assert 'If-None-Match' not in m.last_request.headers
+
+
 class TestTagsParam:
     def test_tags_exists(self):
         """
@@ -4,10 +4,11 @@ from CommonServerUserPython import *
 
 ''' IMPORTS '''
 import urllib3
+import itertools
 import requests
 import traceback
 from dateutil.parser import parse
-from typing import Optional, Pattern, List
+from typing import Optional, Pattern, List, Iterator, Tuple
 
 # disable insecure warnings
 urllib3.disable_warnings()
@@ -15,13 +16,17 @@ urllib3.disable_warnings()
 ''' GLOBALS '''
 TAGS = 'feedTags'
 TLP_COLOR = 'trafficlightprotocol'
+# the instance parameters which affect the indicators created from the content of a URL
+FINGERPRINT_PARAMS = ('url', 'feedTags', 'tlp_color', 'indicator_type', 'auto_detect_type', 'indicator', 'fields',
+                      'feed_url_to_config', 'custom_fields_mapping', 'ignore_regex', 'encoding')
 
 
 class Client(BaseClient):
     def __init__(self, url: str, feed_name: str = 'http', insecure: bool = False, credentials: dict = None,
                  ignore_regex: str = None, encoding: str = None, indicator_type: str = '',
                  indicator: str = '', fields: str = '{}', feed_url_to_config: dict = None, polling_timeout: int = 20,
-                 headers: dict = None, proxy: bool = False, custom_fields_mapping: dict = None, **kwargs):
+                 headers: dict = None, proxy: bool = False, custom_fields_mapping: dict = None,
+                 skip_unchanged: bool = False, params_fingerprint: str = '', **kwargs):
         """Implements class for miners of plain text feeds over HTTP.
         **Config parameters**
         :param: url: URL of the feed.
@@ -61,6 +66,10 @@ class Client(BaseClient):
             }]
         }
         :param: proxy: Use proxy in requests.
+        :param: skip_unchanged: Send conditional requests based on the ETag, Last-Modified and content hash saved
+            for each URL, and return no iterators when none of the URLs has changed since the last fetch.
+        :param: params_fingerprint: A hash of the instance parameters, saved with the cache entry of each URL, so
+            the content of a URL is not skipped after the instance configuration changed.
         **Extraction dictionary**
             Extraction dictionaries contain the following keys:
             :regex: Python regular expression for searching the text.
@@ -137,6 +146,12 @@ class Client(BaseClient):
         if custom_fields_mapping is None:
             custom_fields_mapping = {}
         self.custom_fields_mapping = custom_fields_mapping
+        self.skip_unchanged = skip_unchanged
+        self.params_fingerprint = params_fingerprint
+        # the validators and content hashes of the fetched URLs, saved once their indicators are created
+        self.url_cache: Optional[FeedURLCache] = None
+        self.extraction_plans: dict = {}
+        self.download_session = create_feed_download_session()
 
     def get_feed_config(self, fields_json: str = '', indicator_json: str = ''):
         """
@@ -195,6 +210,15 @@ class Client(BaseClient):
         :param kwargs: Arguments to send to the HTTP API endpoint
         :return: List of indicators
         """
+        return list(self.iter_results(**kwargs))
+
+    def iter_results(self, **kwargs) -> Iterator[dict]:
+        """
+        Same as build_iterator, but the URLs are downloaded concurrently and the lines of each URL are yielded as
+        soon as its response arrives, so they can be parsed while the other URLs are still downloaded.
+        :param kwargs: Arguments to send to the HTTP API endpoint
+        :return: Iterator of the lines of each URL
+        """
         kwargs['stream'] = True
         kwargs['verify'] = self._verify
         kwargs['timeout'] = self.polling_timeout
@@ -206,45 +230,62 @@ class Client(BaseClient):
             kwargs['auth'] = (self.username, self.password)
         try:
             urls = self._base_url
-            url_to_response_list: List[dict] = []
             if not isinstance(urls, list):
                 urls = [urls]
-            for url in urls:
-                r = requests.get(
-                    url,
-                    **kwargs
-                )
-                try:
-                    r.raise_for_status()
-                except Exception:
-                    LOG(f'{self.feed_name!r} - exception in request:'
-                        f' {r.status_code!r} {r.content!r}')
-                    raise
-                url_to_response_list.append({url: r})
+            if self.skip_unchanged:
+                self.url_cache = FeedURLCache.from_integration_context(demisto.getIntegrationContext(),
+                                                                       self.params_fingerprint)
+            url_responses = iter_feed_url_responses(
+                lambda url, conditional_headers: self.get_url_response(url, conditional_headers, **kwargs), urls,
+                self.url_cache
+            )
+            for r in url_responses:
+                yield {r.url: self.get_response_lines(r)}
         except requests.ConnectionError:
             raise requests.ConnectionError('Failed to establish a new connection. Please make sure your URL is valid.')
 
-        results = []
-        for url_to_response in url_to_response_list:
-            for url, lines in url_to_response.items():
-                result = lines.iter_lines()
-                if self.encoding is not None:
-                    result = map(
-                        lambda x: x.decode(self.encoding).encode('utf_8'),
-                        result
-                    )
-                else:
-                    result = map(
-                        lambda x: x.decode('utf_8'),
-                        result
-                    )
-                if self.ignore_regex is not None:
-                    result = filter(
-                        lambda x: self.ignore_regex.match(x) is None,  # type: ignore[union-attr]
-                        result
-                    )
-                results.append({url: result})
-        return results
+    def get_response_lines(self, response: FeedURLResponse):
+        result = response.iter_lines()
+        if self.encoding is not None:
+            result = map(
+                lambda x: x.decode(self.encoding).encode('utf_8'),
+                result
+            )
+        else:
+            result = map(
+                lambda x: x.decode('utf_8'),
+                result
+            )
+        if self.ignore_regex is not None:
+            result = filter(
+                lambda x: self.ignore_regex.match(x) is None,  # type: ignore[union-attr]
+                result
+            )
+        return result
+
+    def get_url_response(self, url: str, conditional_headers: dict, **kwargs):
+        if conditional_headers:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **conditional_headers)
+        r = self.download_session.get(
+            url,
+            **kwargs
+        )
+        try:
+            r.raise_for_status()
+        except Exception:
+            LOG(f'{self.feed_name!r} - exception in request:'
+                f' {r.status_code!r} {r.content!r}')
+            raise
+        return r
+
+    def get_extraction_plan(self, url: str) -> 'ExtractionPlan':
+        """
+        Gets the extraction plan of the URL, which is compiled once from its feed configuration
+        """
+        if url not in self.extraction_plans:
+            self.extraction_plans[url] = ExtractionPlan(self.feed_url_to_config.get(url, {}), self.indicator_type,
+                                                        self.custom_fields_mapping)
+        return self.extraction_plans[url]
 
     def custom_fields_creator(self, attributes: dict):
         created_custom_fields = {}
@@ -258,6 +299,75 @@ class Client(BaseClient):
         return created_custom_fields
 
 
+class ExtractionPlan:
+    def __init__(self, feed_config: dict, indicator_type: str, custom_fields_mapping: dict):
+        """
+        The compiled feed configuration of a single URL, used to extract the indicators from each line of the feed.
+        :param feed_config: The feed configuration of the URL, see Client.
+        :param indicator_type: The default indicator type.
+        :param custom_fields_mapping: Mapping of the extracted attributes to the indicator fields.
+        """
+        indicator = feed_config.get('indicator') or {}
+        self.indicator_regex: Optional[Pattern] = re.compile(indicator['regex']) if 'regex' in indicator else None
+        self.indicator_transform: str = indicator.get('transform', r'\g<0>')
+        self.fields: List[Tuple[str, Pattern, str]] = [
+            (f, re.compile(fattrs['regex']), fattrs.get('transform', r'\g<0>'))
+            for field in feed_config.get('fields', []) for f, fattrs in field.items() if 'regex' in fattrs
+        ]
+        self.indicator_type = feed_config.get('indicator_type', indicator_type)
+        self.config_indicator_type = feed_config.get('indicator_type')
+        self.has_custom_fields = len(custom_fields_mapping) > 0
+        # the tags and TLP color attributes keep their names, any other mapped attribute is renamed
+        self.fields_mapping = dict(custom_fields_mapping, **{TAGS: TAGS, TLP_COLOR: TLP_COLOR})
+
+    def extract(self, line, feed_tags: list, tlp_color: Optional[str]):
+        """
+        Extract the indicator and its attributes from a line of the feed
+        :param line: The current line in the feed
+        :param feed_tags: The indicator tags.
+        :param tlp_color: Traffic Light Protocol color.
+        :return: The indicator attributes and value
+        """
+        attributes = None
+        value: str = ''
+        line = line.strip()
+        if line:
+            if self.indicator_regex:
+                m = self.indicator_regex.search(line)
+                if m is None:
+                    return attributes, value
+                extracted_indicator = m.expand(self.indicator_transform)
+            else:
+                extracted_indicator = line.split()[0]
+            attributes = {}
+            for f, regex, transform in self.fields:
+                m = regex.search(line)
+
+                if m is None:
+                    continue
+
+                attributes[f] = m.expand(transform)
+
+                try:
+                    i = int(attributes[f])
+                except Exception:
+                    pass
+                else:
+                    attributes[f] = i
+            attributes['value'] = value = extracted_indicator
+            attributes['type'] = self.indicator_type
+            attributes['tags'] = feed_tags
+
+            if tlp_color:
+                attributes['trafficlightprotocol'] = tlp_color
+
+        return attributes, value
+
+    def create_custom_fields(self, attributes: dict) -> dict:
+        return {self.fields_mapping[attribute]: attribute_value for attribute, attribute_value in attributes.items()
+                if attribute in self.fields_mapping}
+
+
 def datestring_to_millisecond_timestamp(datestring):
     date = parse(str(datestring))
     return int(date.timestamp() * 1000)
@@ -273,96 +383,42 @@ def get_indicator_fields(line, url, feed_tags: list, tlp_color: Optional[str], c
     :param tlp_color: Traffic Light Protocol color.
     :return: The indicator
     """
-    attributes = None
-    value: str = ''
-    indicator = None
-    fields_to_extract = []
-    feed_config = client.feed_url_to_config.get(url, {})
-    if feed_config:
-        if 'indicator' in feed_config:
-            indicator = feed_config['indicator']
-            if 'regex' in indicator:
-                indicator['regex'] = re.compile(indicator['regex'])
-            if 'transform' not in indicator:
-                indicator['transform'] = r'\g<0>'
-
-    if 'fields' in feed_config:
-        fields = feed_config['fields']
-        for field in fields:
-            for f, fattrs in field.items():
-                field = {f: {}}
-                if 'regex' in fattrs:
-                    field[f]['regex'] = re.compile(fattrs['regex'])
-                if 'transform' not in fattrs:
-                    field[f]['transform'] = r'\g<0>'
-                else:
-                    field[f]['transform'] = fattrs['transform']
-                fields_to_extract.append(field)
-
-    line = line.strip()
-    if line:
-        extracted_indicator = line.split()[0]
-        if indicator:
-            extracted_indicator = indicator['regex'].search(line)
-            if extracted_indicator is None:
-                return attributes, value
-            if 'transform' in indicator:
-                extracted_indicator = extracted_indicator.expand(indicator['transform'])
-        attributes = {}
-        for field in fields_to_extract:
-            for f, fattrs in field.items():
-                m = fattrs['regex'].search(line)
-
-                if m is None:
-                    continue
-
-                attributes[f] = m.expand(fattrs['transform'])
+    return client.get_extraction_plan(url).extract(line, feed_tags, tlp_color)
 
-                try:
-                    i = int(attributes[f])
-                except Exception:
-                    pass
-                else:
-                    attributes[f] = i
-        attributes['value'] = value = extracted_indicator
-        attributes['type'] = feed_config.get('indicator_type', client.indicator_type)
-        attributes['tags'] = feed_tags
-
-        if tlp_color:
-            attributes['trafficlightprotocol'] = tlp_color
-
-    return attributes, value
 
-
-def fetch_indicators_command(client, feed_tags, tlp_color, itype, auto_detect, **kwargs):
-    iterators = client.build_iterator(**kwargs)
-    indicators = []
+def iter_indicators(client, feed_tags, tlp_color, itype, auto_detect, **kwargs) -> Iterator[dict]:
+    """
+    Lazily yields the indicators of the feed, line by line, so the feed is never held in memory as a whole
+    """
+    iterators = client.iter_results(**kwargs)
     for iterator in iterators:
         for url, lines in iterator.items():
+            plan = client.get_extraction_plan(url)
             for line in lines:
-                attributes, value = get_indicator_fields(line, url, feed_tags, tlp_color, client)
+                attributes, value = plan.extract(line, feed_tags, tlp_color)
                 if value:
-                    if 'lastseenbysource' in attributes.keys():
+                    if 'lastseenbysource' in attributes:
                         attributes['lastseenbysource'] = datestring_to_millisecond_timestamp(
                             attributes['lastseenbysource'])
 
-                    if 'firstseenbysource' in attributes.keys():
+                    if 'firstseenbysource' in attributes:
                         attributes['firstseenbysource'] = datestring_to_millisecond_timestamp(
                             attributes['firstseenbysource'])
-                    indicator_type = determine_indicator_type(
-                        client.feed_url_to_config.get(url, {}).get('indicator_type'), itype, auto_detect, value)
+                    indicator_type = determine_indicator_type(plan.config_indicator_type, itype, auto_detect, value)
                     indicator_data = {
                         "value": value,
                         "type": indicator_type,
                         "rawJSON": attributes,
                     }
 
-                    if len(client.custom_fields_mapping.keys()) > 0 or TAGS in attributes.keys():
-                        custom_fields = client.custom_fields_creator(attributes)
-                        indicator_data["fields"] = custom_fields
+                    if plan.has_custom_fields or TAGS in attributes:
+                        indicator_data["fields"] = plan.create_custom_fields(attributes)
 
-                    indicators.append(indicator_data)
-    return indicators
+                    yield indicator_data
+
+
+def fetch_indicators_command(client, feed_tags, tlp_color, itype, auto_detect, **kwargs):
+    return list(iter_indicators(client, feed_tags, tlp_color, itype, auto_detect, **kwargs))
 
 
 def determine_indicator_type(indicator_type, default_indicator_type, auto_detect, value):
@@ -389,7 +445,7 @@ def get_indicators_command(client: Client, args):
     feed_tags = args.get('feedTags')
     tlp_color = args.get('tlp_color')
     auto_detect = demisto.params().get('auto_detect_type')
-    indicators_list = fetch_indicators_command(client, feed_tags, tlp_color, itype, auto_detect)[:limit]
+    indicators_list = list(itertools.islice(iter_indicators(client, feed_tags, tlp_color, itype, auto_detect), limit))
     entry_result = camelize(indicators_list)
     hr = tableToMarkdown('Indicators', entry_result, headers=['Value', 'Type', 'Rawjson'])
     return hr, {}, indicators_list
@@ -417,8 +473,12 @@ def feed_main(feed_name, params=None, prefix=''):
         params['feed_name'] = feed_name
     feed_tags = argToList(demisto.params().get('feedTags'))
     tlp_color = demisto.params().get('tlp_color')
-    client = Client(**params)
     command = demisto.command()
+    # unchanged feed content is skipped only by fetches of instances which opted in
+    skip_unchanged = command == 'fetch-indicators' and argToBoolean(params.get('skip_unchanged', False))
+    client = Client(**dict(params, skip_unchanged=skip_unchanged,
+                           params_fingerprint=FeedURLCache.get_params_fingerprint(
+                               dict(params, feedTags=feed_tags, tlp_color=tlp_color), FINGERPRINT_PARAMS)))
     if command != 'fetch-indicators':
         demisto.info('Command being called is {}'.format(command))
     if prefix and not prefix.endswith('-'):
@@ -430,11 +490,19 @@ def feed_main(feed_name, params=None, prefix=''):
     }
     try:
         if command == 'fetch-indicators':
-            indicators = fetch_indicators_command(client, feed_tags, tlp_color, params.get('indicator_type'),
-                                                  params.get('auto_detect_type'))
+            indicators = iter_indicators(client, feed_tags, tlp_color, params.get('indicator_type'),
+                                         params.get('auto_detect_type'))
+            # in delta mode only the indicators which were added or changed since the last fetch are submitted
+            delta = FeedIndicatorsDelta.from_integration_context(demisto.getIntegrationContext()) \
+                if params.get('delta_mode') else None
             # we submit the indicators in batches
-            for b in batch(indicators, batch_size=2000):
+            for b in batch(delta.filter(indicators) if delta else indicators, batch_size=2000):
                 demisto.createIndicators(b)
+            if client.url_cache:
+                demisto.setIntegrationContext(client.url_cache.update_integration_context(
+                    demisto.getIntegrationContext()))
+            if delta:
+                demisto.setIntegrationContext(delta.update_integration_context(demisto.getIntegrationContext()))
         else:
             args = demisto.args()
             args['feed_name'] = feed_name
@@ -1,4 +1,6 @@
-from HTTPFeedApiModule import get_indicators_command, Client, datestring_to_millisecond_timestamp, feed_main
+from HTTPFeedApiModule import get_indicators_command, Client, datestring_to_millisecond_timestamp, feed_main, \
+    iter_indicators
+import re
 import requests_mock
 import demistomock as demisto
 
@@ -127,6 +129,43 @@ def test_custom_fields_creator():
     assert "old_filed2" not in custom_fields.keys()
 
 
+def test_iter_indicators_extraction_plan(mocker, requests_mock):
+    """
+    Given
+    - A feed configuration with an indicator regex and field regexes.
+
+    When
+    - Iterating over the indicators of the feed.
+
+    Then
+    - Ensure the indicators are yielded lazily with their fields.
+    - Ensure the regexes are compiled once per URL and the feed configuration is not modified.
+    """
+    feed_url = 'https://www.spamhaus.org/drop/asndrop.txt'
+    feed_url_to_config = {
+        feed_url: {
+            'indicator_type': 'ASN',
+            'indicator': {'regex': '^AS[0-9]+'},
+            'fields': [{'asndrop_country': {'regex': r'^.*;\W([a-zA-Z]+)\W+', 'transform': r'\1'}}]
+        }
+    }
+    client = Client(url=feed_url, feed_url_to_config=feed_url_to_config, ignore_regex='^;.*',
+                    custom_fields_mapping={'asndrop_country': 'country'})
+    requests_mock.get(feed_url, text='; header\nAS1 ; US | ORG1\nAS2 ; IL | ORG2\nno indicator\n')
+    compile_spy = mocker.spy(re, 'compile')
+
+    indicators = iter_indicators(client, ['tag'], None, 'ASN', False)
+    assert next(indicators) == {
+        'value': 'AS1',
+        'type': 'ASN',
+        'rawJSON': {'asndrop_country': 'US', 'value': 'AS1', 'type': 'ASN', 'tags': ['tag']},
+        'fields': {'country': 'US'}
+    }
+    assert [indicator['value'] for indicator in indicators] == ['AS2']
+    assert compile_spy.call_count == 2
+    assert feed_url_to_config[feed_url]['indicator'] == {'regex': '^AS[0-9]+'}
+
+
 def test_datestring_to_millisecond_timestamp():
     datesting1 = "2020-02-10 13:39:14"
     datesting2 = "2020-02-10T13:39:14"
@@ -232,6 +271,132 @@ def test_feed_main_fetch_indicators(mocker, requests_mock):
     } in indicators
 
 
+def test_feed_main_fetch_indicators_unchanged_feed(mocker, requests_mock):
+    """
+    Given
+    - A feed configured to skip unchanged content, which was already fetched, with its ETag and content hash saved
+      in the integration context.
+
+    When
+    - Fetching indicators when the server answers 304, and when it ignores the conditional request
+      and returns the same content.
+    - Fetching the same content after the feed tags were changed.
+
+    Then
+    - Ensure the conditional request headers are sent.
+    - Ensure createIndicators is not called in both cases.
+    - Ensure a modified feed is fetched and its new cache entry is saved.
+    - Ensure the feed is fetched again after the instance parameters changed.
+    """
+    feed_url = 'https://www.spamhaus.org/drop/asndrop.txt'
+    integration_context: dict = {}
+    params = {
+        'url': feed_url,
+        'ignore_regex': '^;.*',
+        'feed_url_to_config': {feed_url: {'indicator_type': 'ASN', 'indicator': {'regex': '^AS[0-9]+'}}},
+        'skip_unchanged': True
+    }
+    mocker.patch.object(demisto, 'params', side_effect=lambda: params)
+    mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=integration_context.update)
+    create_indicators = mocker.patch.object(demisto, 'createIndicators')
+
+    with open('test_data/asn_ranges.txt') as asn_ranges_txt:
+        asn_ranges = asn_ranges_txt.read().encode('utf8')
+
+    requests_mock.get(feed_url, content=asn_ranges, headers={'ETag': '"v1"'})
+    feed_main('great_feed_name')
+    assert create_indicators.call_count == 1
+    assert integration_context['feed_url_cache'][feed_url]['etag'] == '"v1"'
+
+    requests_mock.get(feed_url, status_code=304)
+    feed_main('great_feed_name')
+    assert requests_mock.last_request.headers['If-None-Match'] == '"v1"'
+
+    requests_mock.get(feed_url, content=asn_ranges)
+    feed_main('great_feed_name')
+    assert create_indicators.call_count == 1
+
+    requests_mock.get(feed_url, content=asn_ranges + b'AS1 ; US | ORG', headers={'ETag': '"v2"'})
+    feed_main('great_feed_name')
+    assert create_indicators.call_count == 2
+    assert integration_context['feed_url_cache'][feed_url]['etag'] == '"v2"'
+
+    params['feedTags'] = 'tag1'
+    feed_main('great_feed_name')
+    assert 'If-None-Match' not in requests_mock.last_request.headers
+    assert create_indicators.call_count == 3
+    assert create_indicators.call_args[0][0][0]['rawJSON']['tags'] == ['tag1']
+
+
+def test_feed_main_fetch_indicators_skip_unchanged_disabled(mocker, requests_mock):
+    """
+    Given
+    - A feed which is not configured to skip unchanged content (the default).
+
+    When
+    - Fetching the same content twice.
+
+    Then
+    - Ensure no conditional request is sent and the indicators are created in both fetches, so they do not expire.
+    """
+    feed_url = 'https://www.spamhaus.org/drop/asndrop.txt'
+    integration_context: dict = {}
+    mocker.patch.object(demisto, 'params', return_value={
+        'url': feed_url,
+        'feed_url_to_config': {feed_url: {'indicator_type': 'ASN', 'indicator': {'regex': '^AS[0-9]+'}}}
+    })
+    mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=integration_context.update)
+    create_indicators = mocker.patch.object(demisto, 'createIndicators')
+
+    requests_mock.get(feed_url, content=b'AS1 ; US | ORG', headers={'ETag': '"v1"'})
+    feed_main('great_feed_name')
+    feed_main('great_feed_name')
+    assert 'If-None-Match' not in requests_mock.last_request.headers
+    assert create_indicators.call_count == 2
+
+
+def test_feed_main_fetch_indicators_delta_mode(mocker, requests_mock):
+    """
+    Given
+    - A feed configured with delta mode.
+
+    When
+    - Fetching the feed twice, where one indicator was added to the feed in the second fetch.
+
+    Then
+    - Ensure the whole feed is submitted in the first fetch and only the new indicator in the second one.
+    """
+    feed_url = 'https://www.spamhaus.org/drop/asndrop.txt'
+    integration_context: dict = {}
+    mocker.patch.object(demisto, 'params', return_value={
+        'url': feed_url,
+        'ignore_regex': '^;.*',
+        'feed_url_to_config': {feed_url: {'indicator_type': 'ASN', 'indicator': {'regex': '^AS[0-9]+'}}},
+        'delta_mode': True
+    })
+    mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=integration_context.update)
+    create_indicators = mocker.patch.object(demisto, 'createIndicators')
+
+    with open('test_data/asn_ranges.txt') as asn_ranges_txt:
+        asn_ranges = asn_ranges_txt.read().encode('utf8')
+
+    requests_mock.get(feed_url, content=asn_ranges)
+    feed_main('great_feed_name')
+    assert sum(len(call[0][0]) for call in create_indicators.call_args_list) == 466
+
+    create_indicators.reset_mock()
+    requests_mock.get(feed_url, content=asn_ranges + b'\nAS1 ; US | ORG\n')
+    feed_main('great_feed_name')
+    assert create_indicators.call_count == 1
+    assert [indicator['value'] for indicator in create_indicators.call_args[0][0]] == ['AS1']
+
+
 def test_feed_main_test_module(mocker, requests_mock):
     """
     Given
@@ -1,20 +1,38 @@
 from CommonServerPython import *
 
 ''' IMPORTS '''
+import io
+import codecs
 import urllib3
 import jmespath
-from typing import List, Dict, Union, Optional
+from typing import Any, List, Dict, Union, Optional, Iterator
+
+try:
+    import ijson
+except ImportError:  # docker images without ijson stream with the standard JSON decoder
+    ijson = None
 
 # disable insecure warnings
 urllib3.disable_warnings()
 
+# the instance parameters which affect the indicators created from the content of a URL
+FINGERPRINT_PARAMS = ('url', 'feedTags', 'tlp_color', 'indicator_type', 'auto_detect_type', 'feed_name_to_config',
+                      'extractor', 'indicator', 'source_name')
+STREAM_CHUNK_SIZE = 64 * 1024
+# extractors of the form foo[*] or foo.bar[*], whose items can be parsed one at a time
+STREAMABLE_EXTRACTOR_REGEX = re.compile(r'^((?:[A-Za-z_][A-Za-z0-9_]*\.)*[A-Za-z_][A-Za-z0-9_]*)?\[\*\]$')
+NON_WHITESPACE_REGEX = re.compile(r'[^ \t\n\r]')
+STRUCTURE_REGEX = re.compile(r'["\[\]{}]')
+STRING_END_REGEX = re.compile(r'["\\]')
+NUMBER_CHARS = '0123456789+-.eE'
+
 
 class Client:
     def __init__(self, url: str = '', credentials: dict = None,
                  feed_name_to_config: Dict[str, dict] = None, source_name: str = 'JSON',
                  extractor: str = '', indicator: str = 'indicator',
                  insecure: bool = False, cert_file: str = None, key_file: str = None, headers: dict = None,
-                 tlp_color: Optional[str] = None, **_):
+                 tlp_color: Optional[str] = None, skip_unchanged: bool = False, params_fingerprint: str = '', **_):
         """
         Implements class for miners of JSON feeds over http/https.
         :param url: URL of the feed.
@@ -32,6 +50,10 @@ class Client:
         Example: headers = {'user-agent': 'my-app/0.0.1'} or Authorization: Bearer
         (curl -H "Authorization: Bearer " "https://api-url.com/api/v1/iocs?first_seen_since=2016-1-1")
         :param tlp_color: Traffic Light Protocol color.
+        :param skip_unchanged: Send conditional requests based on the ETag, Last-Modified and content hash saved
+            for each URL, and return no results when none of the URLs has changed since the last fetch.
+        :param params_fingerprint: A hash of the instance parameters, saved with the cache entry of each URL, so
+            the content of a URL is not skipped after the instance configuration changed.
 
          Example:
             Example feed config:
@@ -74,33 +96,255 @@ class Client:
 
         self.cert = (cert_file, key_file) if cert_file and key_file else None
         self.tlp_color = tlp_color
+        self.skip_unchanged = skip_unchanged
+        self.params_fingerprint = params_fingerprint
+        # the validators and content hashes of the fetched URLs, saved once their indicators are created
+        self.url_cache: Optional[FeedURLCache] = None
+        self.download_session = create_feed_download_session()
 
     def build_iterator(self, **kwargs) -> List:
-        results = []
-        for feed_name, feed in self.feed_name_to_config.items():
-            r = requests.get(
-                url=feed.get('url', self.url),
-                verify=self.verify,
-                auth=self.auth,
-                cert=self.cert,
-                headers=self.headers,
-                **kwargs
-            )
+        return list(self.iter_results(**kwargs))
 
+    def iter_results(self, **kwargs) -> Iterator[dict]:
+        """
+        Same as build_iterator, but the URLs are downloaded concurrently and the results of the feeds of each URL
+        are yielded as soon as its response arrives, so they can be parsed while the other URLs are still downloaded.
+        """
+        url_to_feed_names: Dict[str, list] = {}
+        for feed_name, feed in self.feed_name_to_config.items():
+            url_to_feed_names.setdefault(feed.get('url', self.url), []).append(feed_name)
+        urls = list(url_to_feed_names)
+        if self.skip_unchanged:
+            self.url_cache = FeedURLCache.from_integration_context(demisto.getIntegrationContext(),
+                                                                   self.params_fingerprint)
+        url_responses = iter_feed_url_responses(
+            lambda url, conditional_headers: self.get_url_response(url, conditional_headers, **kwargs), urls,
+            self.url_cache
+        )
+        for r in url_responses:
+            feed_names = url_to_feed_names[r.url]
+            if len(feed_names) == 1:
+                prefix = get_streaming_prefix(self.feed_name_to_config[feed_names[0]].get('extractor'))
+                if prefix is not None:
+                    yield {feed_names[0]: iter_json_items(r, prefix)}
+                    continue
             try:
-                r.raise_for_status()
                 data = r.json()
-                result = jmespath.search(expression=feed.get('extractor'), data=data)
-                results.append({feed_name: result})
-
             except ValueError as VE:
                 raise ValueError(f'Could not parse returned data to Json. \n\nError massage: {VE}')
+            for feed_name in feed_names:
+                result = jmespath.search(expression=self.feed_name_to_config[feed_name].get('extractor'), data=data)
+                yield {feed_name: result}
+
+    def get_url_response(self, url: str, conditional_headers: dict, **kwargs):
+        headers = dict(self.headers or {}, **conditional_headers) if conditional_headers else self.headers
+        # the body is read only when it is parsed, which allows parsing it as a stream
+        kwargs['stream'] = True
+        r = self.download_session.get(
+            url=url,
+            verify=self.verify,
+            auth=self.auth,
+            cert=self.cert,
+            headers=headers,
+            **kwargs
+        )
+        r.raise_for_status()
+        return r
+
+
+class ResponseReader(io.RawIOBase):
+    """
+    A file object reading the body of a response, whether or not it was already downloaded
+    """
+
+    def __init__(self, response: FeedURLResponse):
+        self.chunks = response.iter_content(STREAM_CHUNK_SIZE)
+        self.leftover = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.leftover:
+            self.leftover = next(self.chunks, b'')
+        size = min(len(buffer), len(self.leftover))
+        buffer[:size] = self.leftover[:size]
+        self.leftover = self.leftover[size:]
+        return size
+
+
+class JSONItemsParser:
+    """
+    Finds the list under a path of object keys in a JSON document which is read as a stream, and decodes its items one
+    at a time with the standard JSON decoder. The values of the other keys are skipped without being decoded.
+    Used when ijson is not available.
+    """
+
+    def __init__(self, chunks: Iterator[str]):
+        self.chunks = chunks
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skips whitespace and returns the next character, or an empty string at the end of the document
+        """
+        while True:
+            match = NON_WHITESPACE_REGEX.search(self.buffer, self.pos)
+            if match:
+                self.pos = match.start()
+                return match.group()
+            self.pos = len(self.buffer)
+            if not self.fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f'Expecting {char!r} delimiter')
+        self.pos += 1
+
+    def decode_value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.fill():
+                    continue
+                raise
+            # a number which is followed by a number character, or ends the buffer, may continue in the next chunk
+            if (end < len(self.buffer) and self.buffer[end] not in NUMBER_CHARS) or not self.fill():
+                self.pos = end
+                return value
+
+    def skip_value(self):
+        if self.peek() not in '[{':
+            self.decode_value()
+            return
+        depth = 0
+        in_string = False
+        while True:
+            match = (STRING_END_REGEX if in_string else STRUCTURE_REGEX).search(self.buffer, self.pos)
+            if not match:
+                self.pos = len(self.buffer)
+                if not self.fill():
+                    raise ValueError('Unexpected end of the document')
+                continue
+            char = match.group()
+            self.pos = match.end()
+            if in_string:
+                if char == '"':
+                    in_string = False
+                elif self.pos < len(self.buffer) or self.fill():
+                    # skip the escaped character
+                    self.pos += 1
+            elif char == '"':
+                in_string = True
+            elif char in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
 
-        return results
+    def items(self, keys: List[str]) -> Iterator:
+        """
+        Yields the items of the list under the keys, or nothing if there is no such list
+        """
+        for key in keys:
+            if self.peek() != '{':
+                # the value is still decoded, so an invalid document is reported
+                self.skip_value()
+                return
+            self.pos += 1
+            while True:
+                char = self.peek()
+                if char == '}':
+                    return
+                if char != '"':
+                    raise ValueError('Expecting property name enclosed in double quotes')
+                name = self.decode_value()
+                self.expect(':')
+                if name == key:
+                    break
+                self.skip_value()
+                if self.peek() == ',':
+                    self.pos += 1
+        if self.peek() != '[':
+            self.skip_value()
+            return
+        self.pos += 1
+        if self.peek() == ']':
+            return
+        while True:
+            yield self.decode_value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError("Expecting ',' delimiter")
+
+
+def iter_decoded_chunks(response: FeedURLResponse) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def get_streaming_prefix(extractor: Optional[str]) -> Optional[str]:
+    """
+    Gets the ijson prefix of the items selected by an extractor of the form foo[*] or foo.bar[*].
+    :param extractor: The JMESPath expression of the feed.
+    :return: The prefix, or None if the extractor has another form, in which case the whole document is parsed and
+        searched with JMESPath.
+    """
+    if not extractor:
+        return None
+    match = STREAMABLE_EXTRACTOR_REGEX.match(extractor.strip())
+    if not match:
+        return None
+    return f'{match.group(1)}.item' if match.group(1) else 'item'
+
+
+def iter_json_items(response: FeedURLResponse, prefix: str) -> Iterator:
+    """
+    Parses the body of a response incrementally, and yields the items under the prefix one at a time.
+    Same as a JMESPath projection, null items are skipped.
+    The body is parsed with ijson when it is available, and with JSONItemsParser otherwise.
+    :param response: The response of the feed.
+    :param prefix: The ijson prefix of the items.
+    :return: Iterator of the items.
+    """
+    if ijson is None:
+        items = JSONItemsParser(iter_decoded_chunks(response)).items(prefix.split('.')[:-1])
+        parse_error: type = ValueError
+    else:
+        items = ijson.items(io.BufferedReader(ResponseReader(response), STREAM_CHUNK_SIZE), prefix, use_float=True)
+        parse_error = ijson.JSONError
+    try:
+        for item in items:
+            if item is not None:
+                yield item
+    except parse_error as e:
+        raise ValueError(f'Could not parse returned data to Json. \n\nError massage: {e}')
 
 
 def test_module(client, params) -> str:
-    client.build_iterator()
+    # the items of streamed feeds are parsed lazily, so the first item of each feed is read to validate its content
+    for result in client.iter_results():
+        for items in result.values():
+            next(iter(items or []), None)
     return 'ok'
 
 
@@ -112,8 +356,17 @@ def fetch_indicators_command(client: Client, indicator_type: str, feedTags: list
     :param indicator_type: the default indicator type
     :param feedTags: the indicator tags
     """
-    indicators = []
-    for result in client.build_iterator(**kwargs):
+    return list(iter_indicators(client, indicator_type, feedTags, auto_detect, **kwargs))
+
+
+def iter_indicators(client: Client, indicator_type: str, feedTags: list, auto_detect: bool, **kwargs) -> Iterator[Dict]:
+    """
+    Lazily yields the indicators of the feed, so streamed feeds are never held in memory as a whole.
+    :param client: Client of a JSON Feed
+    :param indicator_type: the default indicator type
+    :param feedTags: the indicator tags
+    """
+    for result in client.iter_results(**kwargs):
         for service_name, items in result.items():
             feed_config = client.feed_name_to_config.get(service_name, {})
             indicator_field = feed_config.get('indicator') if feed_config.get('indicator') else 'indicator'
@@ -152,9 +405,7 @@ def fetch_indicators_command(client: Client, indicator_type: str, feedTags: list
 
                 indicator['rawJSON'] = item
 
-                indicators.append(indicator)
-
-    return indicators
+                yield indicator
 
 
 def determine_indicator_type(indicator_type, auto_detect, value):
@@ -211,10 +462,13 @@ def extract_all_fields_from_indicator(indicator, indicator_key):
 def feed_main(params, feed_name, prefix):
     handle_proxy()
 
-    client = Client(**params)
+    command = demisto.command()
+    # unchanged feed content is skipped only by fetches of instances which opted in
+    skip_unchanged = command == 'fetch-indicators' and argToBoolean(params.get('skip_unchanged', False))
+    client = Client(**dict(params, skip_unchanged=skip_unchanged,
+                           params_fingerprint=FeedURLCache.get_params_fingerprint(params, FINGERPRINT_PARAMS)))
     indicator_type = params.get('indicator_type')
     feedTags = argToList(params.get('feedTags'))
-    command = demisto.command()
     if prefix and not prefix.endswith('-'):
         prefix += '-'
     if command != 'fetch-indicators':
@@ -224,10 +478,18 @@ def feed_main(params, feed_name, prefix):
             return_outputs(test_module(client, params))
 
         elif command == 'fetch-indicators':
-            indicators = fetch_indicators_command(client, params.get('indicator_type'), feedTags,
-                                                  params.get('auto_detect_type'))
-            for b in batch(indicators, batch_size=2000):
+            indicators = iter_indicators(client, params.get('indicator_type'), feedTags,
+                                         params.get('auto_detect_type'))
+            # in delta mode only the indicators which were added or changed since the last fetch are submitted
+            delta = FeedIndicatorsDelta.from_integration_context(demisto.getIntegrationContext()) \
+                if params.get('delta_mode') else None
+            for b in batch(delta.filter(indicators) if delta else indicators, batch_size=2000):
                 demisto.createIndicators(b)
+            if client.url_cache:
+                demisto.setIntegrationContext(client.url_cache.update_integration_context(
+                    demisto.getIntegrationContext()))
+            if delta:
+                demisto.setIntegrationContext(delta.update_integration_context(demisto.getIntegrationContext()))
 
         elif command == f'{prefix}get-indicators':
             # dummy command for testing
@@ -1,6 +1,9 @@
-from JSONFeedApiModule import Client, fetch_indicators_command, jmespath
+from JSONFeedApiModule import Client, fetch_indicators_command, jmespath, get_streaming_prefix, \
+    test_module as run_test_module
 from CommonServerPython import *
 import requests_mock
+import hashlib
+import pytest
 
 
 def test_json_feed_no_config():
@@ -121,3 +124,172 @@ def test_list_of_indicators_with_no_json_object():
         assert indicators[0].get('value') == '1.1.1.1'
         assert indicators[0].get('type') == 'IP'
         assert indicators[1].get('rawJSON') == {'indicator': '2.2.2.2'}
+
+
+def test_json_feed_unchanged(mocker):
+    """
+    Given
+    - Two feeds sharing a URL whose ETag and content hash are saved in the integration context.
+
+    When
+    - Fetching indicators when the server answers 304, and when it returns the same content.
+
+    Then
+    - Ensure the URL is requested once, with the conditional request header, and no results are returned.
+    - Ensure a modified feed is parsed for both feeds and its new cache entry is kept.
+    """
+    url = 'https://ip-ranges.amazonaws.com/ip-ranges.json'
+    content = json.dumps({'prefixes': [{'ip_prefix': '1.1.1.0/24', 'service': 'AMAZON'}]}).encode()
+    url_cache_entry = {'etag': '"v1"', 'last_modified': None, 'hash': hashlib.sha256(content).hexdigest(),
+                       'params': 'fingerprint'}
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={'feed_url_cache': {url: url_cache_entry}})
+    feed_name_to_config = {
+        'AMAZON': {'url': url, 'extractor': "prefixes[?service=='AMAZON']", 'indicator': 'ip_prefix'},
+        'EC2': {'url': url, 'extractor': "prefixes[?service=='EC2']", 'indicator': 'ip_prefix'}
+    }
+    client = Client(url=url, feed_name_to_config=feed_name_to_config, skip_unchanged=True,
+                    params_fingerprint='fingerprint')
+
+    with requests_mock.Mocker() as m:
+        m.get(url, status_code=304)
+        assert client.build_iterator() == []
+        assert m.call_count == 1
+        assert m.last_request.headers['If-None-Match'] == '"v1"'
+
+        m.get(url, content=content)
+        assert client.build_iterator() == []
+
+        m.get(url, content=content.replace(b'1.1.1.0', b'2.2.2.0'), headers={'ETag': '"v2"'})
+        assert len(client.build_iterator()) == 2
+        assert client.url_cache.updates[url]['etag'] == '"v2"'
+
+
+def test_json_feed_multiple_urls():
+    """
+    Given
+    - Three feeds configured on two URLs.
+
+    When
+    - Fetching indicators.
+
+    Then
+    - Ensure each URL is requested once, and the indicators of all the feeds are returned.
+    """
+    feed_name_to_config = {
+        'A': {'url': 'https://a.com/feed.json', 'extractor': 'a', 'indicator': 'ip'},
+        'B': {'url': 'https://b.com/feed.json', 'extractor': 'b', 'indicator': 'ip'},
+        'A2': {'url': 'https://a.com/feed.json', 'extractor': 'a2', 'indicator': 'ip'}
+    }
+    client = Client(feed_name_to_config=feed_name_to_config)
+
+    with requests_mock.Mocker() as m:
+        m.get('https://a.com/feed.json', json={'a': [{'ip': '1.1.1.1'}], 'a2': [{'ip': '3.3.3.3'}]})
+        m.get('https://b.com/feed.json', json={'b': [{'ip': '2.2.2.2'}]})
+        indicators = fetch_indicators_command(client=client, indicator_type='IP', feedTags=[], auto_detect=False)
+
+    assert m.call_count == 2
+    assert sorted((indicator['rawJSON']['ip'], indicator['value']) for indicator in indicators) == \
+        [('1.1.1.1', '1.1.1.1'), ('2.2.2.2', '2.2.2.2'), ('3.3.3.3', '3.3.3.3')]
+
+
+@pytest.mark.parametrize('extractor, prefix', [
+    ('prefixes[*]', 'prefixes.item'),
+    ('data.ip_ranges[*]', 'data.ip_ranges.item'),
+    ('[*]', 'item'),
+    ("prefixes[?service=='AMAZON']", None),
+    ('prefixes[*].ip_prefix', None),
+    ('@', None),
+    (None, None),
+])
+def test_get_streaming_prefix(mocker, extractor, prefix):
+    mocker.patch('JSONFeedApiModule.ijson')
+    assert get_streaming_prefix(extractor) == prefix
+
+
+def test_json_feed_streaming():
+    """
+    Given
+    - A feed whose extractor selects all the items of a nested list.
+
+    When
+    - Fetching indicators with ijson available.
+
+    Then
+    - Ensure the items are parsed as a stream and match the items selected by JMESPath, without the null items.
+    """
+    pytest.importorskip('ijson')
+    url = 'https://ip-ranges.amazonaws.com/ip-ranges.json'
+    data = {'data': {'prefixes': [{'ip_prefix': '1.1.1.0/24', 'score': 1.5}, None, {'ip_prefix': '2.2.2.0/24'}]}}
+    client = Client(url=url, extractor='data.prefixes[*]', indicator='ip_prefix')
+
+    with requests_mock.Mocker() as m:
+        m.get(url, json=data)
+        results = client.build_iterator()
+        assert not isinstance(results[0]['JSON'], list)
+        assert list(results[0]['JSON']) == jmespath.search('data.prefixes[*]', data)
+
+
+def test_json_feed_streaming_without_ijson(mocker):
+    """
+    Given
+    - A feed whose extractor selects all the items of a nested list, after keys with nested values, strings with
+      escaped quotes and brackets, and numbers.
+
+    When
+    - Fetching indicators without ijson, with small chunks which split the tokens of the document.
+
+    Then
+    - Ensure the items are parsed as a stream and match the items selected by JMESPath, without the null items.
+    """
+    mocker.patch('JSONFeedApiModule.ijson', None)
+    mocker.patch('JSONFeedApiModule.STREAM_CHUNK_SIZE', 3)
+    url = 'https://ip-ranges.amazonaws.com/ip-ranges.json'
+    data = {
+        'syncToken': 12345.5,
+        'other': {'data': [{'prefixes': ['[{"\\']}], 'note': 'a "quoted" ] } string \\'},
+        'data': {
+            'count': [1, 2, {'x': None}],
+            'prefixes': [{'ip_prefix': '1.1.1.0/24', 'score': 1.5, 'name': 'caf\u00e9'}, None, 123456789,
+                         {'ip_prefix': '2.2.2.0/24', 'tags': ['a', 'b']}, 'text', True],
+            'after': 'ignored'
+        }
+    }
+    client = Client(url=url, extractor='data.prefixes[*]', indicator='ip_prefix')
+
+    with requests_mock.Mocker() as m:
+        m.get(url, text=json.dumps(data, indent=1))
+        results = client.build_iterator()
+        assert not isinstance(results[0]['JSON'], list)
+        assert list(results[0]['JSON']) == jmespath.search('data.prefixes[*]', data)
+
+        client = Client(url=url, extractor='missing[*]', indicator='ip_prefix')
+        assert list(client.build_iterator()[0]['JSON']) == []
+
+        m.get(url, text='{"data": {"prefixes": [{"ip_prefix": "1.1.1.0/24"} {"ip_prefix": "2.2.2.0/24"}]}}')
+        client = Client(url=url, extractor='data.prefixes[*]', indicator='ip_prefix')
+        with pytest.raises(ValueError, match='Could not parse returned data to Json'):
+            list(client.build_iterator()[0]['JSON'])
+
+
+def test_test_module_reads_items(mocker):
+    """
+    Given
+    - A streamed feed whose content is not valid JSON.
+
+    When
+    - Running test-module.
+
+    Then
+    - Ensure the parsing error is raised, although the items of the feed are parsed lazily.
+    """
+    mocker.patch('JSONFeedApiModule.ijson', None)
+    url = 'https://ip-ranges.amazonaws.com/ip-ranges.json'
+    client = Client(url=url, extractor='prefixes[*]', indicator='ip_prefix')
+
+    with requests_mock.Mocker() as m:
+        m.get(url, text='<html>Not Found</html>')
+        with pytest.raises(ValueError, match='Could not parse returned data to Json'):
+            run_test_module(client, {})
+
+        m.get(url, json={'prefixes': [{'ip_prefix': '1.1.1.0/24'}]})
+        assert run_test_module(client, {}) == 'ok'
@@ -5,6 +5,7 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 import requests
 import base64
+import threading
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from typing import Dict, Tuple, List, Optional
 
@@ -23,6 +24,16 @@ CLIENT_CREDENTIALS = 'client_credentials'
 AUTHORIZATION_CODE = 'authorization_code'
 REFRESH_TOKEN = 'refresh_token'  # guardrails-disable-line
 
+# seconds before its expiry in which an access token is refreshed
+TOKEN_REFRESH_MARGIN = 60
+
+# access tokens cached in memory as (access token, valid until), so that long running integrations and
+# multiple requests of a command don't read the integration context on every request
+ACCESS_TOKEN_CACHE: Dict[str, Tuple[str, int]] = {}
+# a lock per cached token, held while the token is refreshed so only a single refresh happens at a time
+TOKEN_LOCKS: Dict[str, threading.Lock] = {}
+TOKEN_LOCKS_LOCK = threading.Lock()
+
 
 class MicrosoftClient(BaseClient):
     def __init__(self, tenant_id: str = '',
@@ -138,12 +149,24 @@ class MicrosoftClient(BaseClient):
         except ValueError as exception:
             raise DemistoException('Failed to parse json object from response: {}'.format(response.content), exception)
 
+    def get_token_cache_key(self, token_keyword: str) -> str:
+        """
+        Returns the key of an access token in the in-memory cache, unique per application and token.
+        """
+        app_id = self.client_id if self.auth_type == SELF_DEPLOYED_AUTH_TYPE else self.auth_id
+        return f'{self.auth_type}|{self.token_retrieval_url}|{self.tenant_id}|{app_id}|{token_keyword}'
+
+    @staticmethod
+    def get_token_lock(token_key: str) -> threading.Lock:
+        with TOKEN_LOCKS_LOCK:
+            return TOKEN_LOCKS.setdefault(token_key, threading.Lock())
+
     def get_access_token(self, resource: str = '', scope: Optional[str] = None):
         """
         Obtains access and refresh token from oproxy server or just a token from a self deployed app.
-        Access token is used and stored in the integration context
-        until expiration time. After expiration, new refresh token and access token are obtained and stored in the
-        integration context.
+        Access token is cached in memory and stored in the integration context
+        until shortly before expiration time. Then, new refresh token and access token are obtained and stored in the
+        integration context. Only a single thread refreshes a token at a time.
 
         Args:
             scope: A scope to get instead of the default on the API.
@@ -151,12 +174,34 @@ class MicrosoftClient(BaseClient):
         Returns:
             str: Access token that will be added to authorization header.
         """
-        integration_context = demisto.getIntegrationContext()
-        refresh_token = integration_context.get('current_refresh_token', '')
         # Set keywords. Default without the scope prefix.
         access_token_keyword = f'{scope}_access_token' if scope else 'access_token'
         valid_until_keyword = f'{scope}_valid_until' if scope else 'valid_until'
 
+        token_key = self.get_token_cache_key(resource if self.multi_resource else access_token_keyword)
+        now = self.epoch_seconds()
+        cached_token = ACCESS_TOKEN_CACHE.get(token_key)
+        if cached_token and now < cached_token[1] - TOKEN_REFRESH_MARGIN:
+            return cached_token[0]
+
+        # in multi resource mode, the tokens of all the resources are refreshed together
+        with self.get_token_lock(self.get_token_cache_key('resources') if self.multi_resource else token_key):
+            # the token may have been refreshed by another thread while waiting for the lock
+            cached_token = ACCESS_TOKEN_CACHE.get(token_key)
+            if cached_token and now < cached_token[1] - TOKEN_REFRESH_MARGIN:
+                return cached_token[0]
+            return self._get_access_token_from_context(token_key, now, access_token_keyword, valid_until_keyword,
+                                                       resource=resource, scope=scope)
+
+    def _get_access_token_from_context(self, token_key: str, now: int, access_token_keyword: str,
+                                       valid_until_keyword: str, resource: str = '', scope: Optional[str] = None):
+        """
+        Gets the access token stored in the integration context, refreshing it if it is about to expire.
+        Should be called while holding the lock of the token.
+        """
+        integration_context = demisto.getIntegrationContext()
+        refresh_token = integration_context.get('current_refresh_token', '')
+
         if self.multi_resource:
             access_token = integration_context.get(resource)
         else:
@@ -165,7 +210,8 @@ class MicrosoftClient(BaseClient):
         valid_until = integration_context.get(valid_until_keyword)
 
         if access_token and valid_until:
-            if self.epoch_seconds() < valid_until:
+            if now < valid_until - TOKEN_REFRESH_MARGIN:
+                ACCESS_TOKEN_CACHE[token_key] = (access_token, valid_until)
                 return access_token
 
         auth_type = self.auth_type
@@ -199,8 +245,11 @@ class MicrosoftClient(BaseClient):
         demisto.setIntegrationContext(integration_context)
 
         if self.multi_resource:
+            for resource_str, resource_access_token in self.resource_to_access_token.items():
+                ACCESS_TOKEN_CACHE[self.get_token_cache_key(resource_str)] = (resource_access_token, valid_until)
             return self.resource_to_access_token[resource]
 
+        ACCESS_TOKEN_CACHE[token_key] = (access_token, valid_until)
         return access_token
 
     def _oproxy_authorize(self, resource: str = '', scope: Optional[str] = None) -> Tuple[str, int, str]:
@@ -1,8 +1,10 @@
 from requests import Response
-from MicrosoftApiModule import MicrosoftClient
+from MicrosoftApiModule import MicrosoftClient, ACCESS_TOKEN_CACHE
 import demistomock as demisto
 import pytest
 import datetime
+import threading
+import time
 
 
 TOKEN = 'dummy_token'
@@ -22,6 +24,11 @@ SCOPE = 'https://graph.microsoft.com/.default'
 RESOURCE = 'https://defender.windows.com/shtak'
 
 
+@pytest.fixture(autouse=True)
+def clear_access_token_cache():
+    ACCESS_TOKEN_CACHE.clear()
+
+
 def oproxy_client_tenant():
     tenant_id = TENANT
     auth_id = f'{AUTH_ID}@{TOKEN_URL}'
@@ -124,7 +131,7 @@ def test_get_access_token_with_context_valid(mocker, client, tokens, context):
 
     mocker.patch.object(client, '_oproxy_authorize', return_value=tokens)
     mocker.patch.object(client, '_get_self_deployed_token', return_value=tokens)
-    mocker.patch.object(client, 'epoch_seconds', return_value=3600)
+    mocker.patch.object(client, 'epoch_seconds', return_value=3000)
 
     # Arrange
     token = client.get_access_token()
@@ -238,3 +245,75 @@ def test_self_deployed_request(requests_mock):
     req_body = requests_mock._adapter.last_request._request.body
     assert req_body == urllib.parse.urlencode(body)
     assert req_res == (TOKEN, 3600, '')
+
+
+def test_get_access_token_from_memory(mocker):
+    """
+    Given:
+        - A self deployed client that already obtained an access token.
+    When:
+        - Getting the access token again, before it is about to expire.
+    Then:
+        - Ensure the token is returned from memory, without reading the integration context or refreshing it.
+    """
+    client = self_deployed_client()
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    mocker.patch.object(client, '_get_self_deployed_token', return_value=(TOKEN, 3600, ''))
+    mocker.patch.object(client, 'epoch_seconds', return_value=10)
+    client.get_access_token()
+
+    assert client.get_access_token() == TOKEN
+    assert demisto.getIntegrationContext.call_count == 1
+    assert client._get_self_deployed_token.call_count == 1
+
+
+def test_get_access_token_refresh_before_expiry(mocker):
+    """
+    Given:
+        - An access token in the integration context that expires in less than the refresh margin.
+    When:
+        - Getting the access token.
+    Then:
+        - Ensure the token is refreshed before it expires.
+    """
+    client = self_deployed_client()
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={'access_token': 'old_token',
+                                                                        'valid_until': 3605})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    mocker.patch.object(client, '_get_self_deployed_token', return_value=(TOKEN, 3600, ''))
+    mocker.patch.object(client, 'epoch_seconds', return_value=3580)
+
+    assert client.get_access_token() == TOKEN
+    assert demisto.setIntegrationContext.call_args[0][0]['valid_until'] == 7175
+
+
+def test_get_access_token_single_flight(mocker):
+    """
+    Given:
+        - A self deployed client without an access token.
+    When:
+        - Getting the access token from several threads at the same time.
+    Then:
+        - Ensure the token is obtained only once and all the threads get it.
+    """
+    client = self_deployed_client()
+
+    def get_token(*args, **kwargs):
+        time.sleep(0.1)
+        return TOKEN, 3600, ''
+
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    mocker.patch.object(client, '_get_self_deployed_token', side_effect=get_token)
+    mocker.patch.object(client, 'epoch_seconds', return_value=10)
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(client.get_access_token())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert tokens == [TOKEN] * 5
+    assert client._get_self_deployed_token.call_count == 1
+    assert demisto.setIntegrationContext.call_count == 1
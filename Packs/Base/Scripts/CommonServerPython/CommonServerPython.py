@@ -6,12 +6,16 @@ Note that adding code to CommonServerUserPython can override functions in Common
 from __future__ import print_function
 
 import base64
+import hashlib
+import itertools
 import json
 import logging
 import os
 import re
 import socket
 import sys
+import tempfile
+import threading
 import time
 import traceback
 from random import randint
@@ -277,6 +281,31 @@ class FeedIndicatorType(object):
             return None
 
 
+_tld_extractors = []  # type: list
+
+
+def _get_tld_extractor():
+    """
+      Gets the tldextract extractor used by auto_detect_indicator_type, which is created once per process since
+      creating it loads the whole public suffix list.
+
+      :return: The extractor.
+      :rtype: ``tldextract.TLDExtract``
+    """
+    if not _tld_extractors:
+        try:
+            import tldextract
+        except Exception:
+            raise Exception("Missing tldextract module, In order to use the auto detect function please use a docker"
+                            " image with it installed such as: demisto/jmespath")
+        try:
+            _tld_extractors.append(tldextract.TLDExtract(cache_file=False, suffix_list_urls=None))
+        except Exception:
+            # the domain detection is skipped, same as when the extraction fails
+            return None
+    return _tld_extractors[0]
+
+
 def auto_detect_indicator_type(indicator_value):
     """
       Infer the type of the indicator.
@@ -287,48 +316,51 @@ def auto_detect_indicator_type(indicator_value):
       :return: The type of the indicator.
       :rtype: ``str``
     """
-    try:
-        import tldextract
-    except Exception:
-        raise Exception("Missing tldextract module, In order to use the auto detect function please use a docker"
-                        " image with it installed such as: demisto/jmespath")
+    tld_extractor = _get_tld_extractor()
+
+    # the regexes are checked in a fixed order, and each one is skipped when a cheap check on the value shows it
+    # cannot match, so the result is the same as trying all of them one by one
+    has_slash = '/' in indicator_value
+    has_colon = ':' in indicator_value
+    starts_with_digit = indicator_value[:1].isdigit()
+    may_be_hash = len(indicator_value) >= 32 and indicator_value[:1] in '0123456789abcdefABCDEF'
 
-    if re.match(ipv4cidrRegex, indicator_value):
+    if has_slash and starts_with_digit and re.match(ipv4cidrRegex, indicator_value):
         return FeedIndicatorType.CIDR
 
-    if re.match(ipv6cidrRegex, indicator_value):
+    if has_slash and has_colon and re.match(ipv6cidrRegex, indicator_value):
         return FeedIndicatorType.IPv6CIDR
 
-    if re.match(ipv4Regex, indicator_value):
+    if starts_with_digit and re.match(ipv4Regex, indicator_value):
         return FeedIndicatorType.IP
 
-    if re.match(ipv6Regex, indicator_value):
+    if has_colon and re.match(ipv6Regex, indicator_value):
         return FeedIndicatorType.IPv6
 
-    if re.match(sha256Regex, indicator_value):
+    if may_be_hash and re.match(sha256Regex, indicator_value):
         return FeedIndicatorType.File
 
-    if re.match(urlRegex, indicator_value):
+    if ('://' in indicator_value or indicator_value.startswith(('www', 'ftp'))) and \
+            re.match(urlRegex, indicator_value):
         return FeedIndicatorType.URL
 
-    if re.match(md5Regex, indicator_value):
+    if may_be_hash and re.match(md5Regex, indicator_value):
         return FeedIndicatorType.File
 
-    if re.match(sha1Regex, indicator_value):
+    if may_be_hash and re.match(sha1Regex, indicator_value):
         return FeedIndicatorType.File
 
-    if re.match(emailRegex, indicator_value):
+    if '@' in indicator_value and re.match(emailRegex, indicator_value):
         return FeedIndicatorType.Email
 
-    if re.match(cveRegex, indicator_value):
+    if indicator_value[:1] in ('c', 'C') and re.match(cveRegex, indicator_value):
         return FeedIndicatorType.CVE
 
-    if re.match(sha512Regex, indicator_value):
+    if may_be_hash and re.match(sha512Regex, indicator_value):
         return FeedIndicatorType.File
 
     try:
-        no_cache_extract = tldextract.TLDExtract(cache_file=False, suffix_list_urls=None)
-        if no_cache_extract(indicator_value).suffix:
+        if tld_extractor(indicator_value).suffix:
             if '*' in indicator_value:
                 return FeedIndicatorType.DomainGlob
             return FeedIndicatorType.Domain
@@ -339,6 +371,25 @@ def auto_detect_indicator_type(indicator_value):
     return None
 
 
+def auto_detect_indicator_types(indicator_values):
+    """
+      Infer the types of a list of indicators. Repeating values are detected once.
+
+      :type indicator_values: ``list``
+      :param indicator_values: list or other iterable of the indicators whose types we want to check. (required)
+
+      :return: The types of the indicators, in the order of the given values.
+      :rtype: ``list``
+    """
+    detected_types = {}  # type: dict
+    indicator_types = []
+    for indicator_value in indicator_values:
+        if indicator_value not in detected_types:
+            detected_types[indicator_value] = auto_detect_indicator_type(indicator_value)
+        indicator_types.append(detected_types[indicator_value])
+    return indicator_types
+
+
 def handle_proxy(proxy_param_name='proxy', checkbox_default_value=False, handle_insecure=True,
                  insecure_param_name=None):
     """
@@ -1805,6 +1856,176 @@ def xml2json(xmlstring, options={}, strip_ns=1, strip=1):
     return elem2json(elem, options, strip_ns=strip_ns, strip=strip)
 
 
+XML_PARSE_CHUNK_SIZE = 64 * 1024
+
+
+class _XMLDictBuilder(object):
+    """An XMLParser target converting the parsed XML into the dicts ``json.loads(xml2json(xml))`` would return.
+
+    No element tree is built: every element is converted and merged into its parent as soon as its tail (the text
+    following its end tag) is parsed. If ``match_tag`` is given, the outermost elements with that tag are not merged
+    but added to ``matches`` (without their tail), so they can be consumed while the document is still parsed.
+    """
+
+    def __init__(self, strip_ns=1, strip=1, match_tag=None):
+        self.strip_ns = strip_ns
+        self.strip = strip
+        self.match_tag = match_tag
+        self.match_level = None  # type: Optional[int]
+        self.matches = []  # type: list
+        self.result = None  # type: Optional[dict]
+        # open elements, as [tag, value, text] lists. value is None until the element has attributes or children.
+        self._stack = []  # type: list
+        self._data = []  # type: list
+        self._ended = None  # type: Optional[list]
+        self._skip_tail = False
+
+    def _flush(self):
+        text = ''.join(self._data) if self._data else None
+        self._data = []
+        ended = self._ended
+        if ended is not None:
+            # text following an end tag is the tail of that element
+            self._ended = None
+            self._merge(ended, text)
+        elif self._skip_tail:
+            # the tail of a matched element, which was already handed out
+            self._skip_tail = False
+        elif text is not None and self._stack:
+            self._stack[-1][2] = text
+
+    def _get_value(self, frame, tail):
+        value, text = frame[1], frame[2]
+        if self.strip:
+            if text:
+                text = text.strip()
+            if tail:
+                tail = tail.strip()
+        if tail:
+            if value is None:
+                value = {}
+            value['#tail'] = tail
+        if value:
+            # use #text element if other attributes exist
+            if text:
+                value['#text'] = text
+            return value
+        # text is the value if no attributes
+        return text or None
+
+    def _merge(self, frame, tail):
+        value = self._get_value(frame, tail)
+        tag = frame[0]
+        if not self._stack:
+            self.result = {tag: value}
+            return
+        parent = self._stack[-1]
+        parent_value = parent[1]
+        if parent_value is None:
+            parent_value = parent[1] = {}
+        try:
+            # add to existing list for this tag
+            parent_value[tag].append(value)
+        except AttributeError:
+            # turn existing entry into a list
+            parent_value[tag] = [parent_value[tag], value]
+        except KeyError:
+            # add a new non-list entry
+            parent_value[tag] = value
+
+    def start(self, tag, attrib):
+        self._flush()
+        if self.strip_ns and tag[:1] == '{':
+            tag = strip_tag(tag)
+        if self.match_level is None and tag == self.match_tag:
+            self.match_level = len(self._stack)
+        value = dict(('@' + key, value) for key, value in attrib.items()) if attrib else None
+        self._stack.append([tag, value, None])
+
+    def data(self, data):
+        self._data.append(data)
+
+    def end(self, tag):
+        self._flush()
+        frame = self._stack.pop()
+        if len(self._stack) == self.match_level:
+            self.match_level = None
+            self.matches.append(self._get_value(frame, None))
+            self._skip_tail = True
+        else:
+            self._ended = frame
+
+    def close(self):
+        self._flush()
+        return self.result
+
+
+def _parse_xml_chunks(source, builder):
+    """Feeds an XML string, or an iterable of its chunks, to the builder. Yields after every chunk."""
+    if isinstance(source, STRING_TYPES):
+        # feed the parser in chunks, so streamed elements are handed out while the document is parsed
+        chunks = (source[i:i + XML_PARSE_CHUNK_SIZE] for i in range(0, len(source), XML_PARSE_CHUNK_SIZE))
+    else:
+        chunks = source
+    parser = ET.XMLParser(target=builder)
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield
+    parser.close()
+    yield
+
+
+def xml2dict(xmlstring, strip_ns=1, strip=1):
+    """
+       Convert an XML string into a dict.
+       The result equals ``json.loads(xml2json(xmlstring))``, without building the element tree and the JSON string.
+
+       :type xmlstring: ``str`` or ``bytes``
+       :param xmlstring: The string to be converted, or an iterable of its chunks (required)
+
+       :type strip_ns: ``int``
+       :param strip_ns: Whether to strip the namespaces from the tags
+
+       :type strip: ``int``
+       :param strip: Whether to strip the whitespace around texts
+
+       :return: The converted XML
+       :rtype: ``dict``
+    """
+    builder = _XMLDictBuilder(strip_ns=strip_ns, strip=strip)
+    for _ in _parse_xml_chunks(xmlstring, builder):
+        pass
+    return builder.result or {}
+
+
+def iter_xml_elements(source, tag, strip_ns=1, strip=1):
+    """
+       Stream the elements with the given tag out of an XML document, converted to dicts one by one.
+       Elements with the tag that are nested in another one are part of the outer element's dict.
+
+       :type source: ``str`` or ``bytes``
+       :param source: The XML string, or an iterable of its chunks such as ``response.iter_content()`` (required)
+
+       :type tag: ``str``
+       :param tag: The tag of the elements to yield, e.g. ``entry`` (required)
+
+       :type strip_ns: ``int``
+       :param strip_ns: Whether to strip the namespaces from the tags
+
+       :type strip: ``int``
+       :param strip: Whether to strip the whitespace around texts
+
+       :return: The converted elements, the same value the element would have in ``xml2dict``
+       :rtype: ``dict``
+    """
+    builder = _XMLDictBuilder(strip_ns=strip_ns, strip=strip, match_tag=tag)
+    for _ in _parse_xml_chunks(source, builder):
+        matches = builder.matches
+        builder.matches = []
+        for value in matches:
+            yield value
+
+
 def json2xml(json_data, factory=ET.Element):
     """Convert a JSON string into an XML string.
     Whatever Element implementation we could import will be used by
@@ -4076,6 +4297,9 @@ if 'requests' in sys.modules:
 
 def batch(iterable, batch_size=1):
     """Gets an iterable and yields slices of it.
+    Sliceable sequences (e.g. lists, tuples and strings) are yielded as slices of the same type, any other
+    iterable (e.g. a generator) is consumed lazily and yielded as lists. In both cases the iterable is
+    traversed only once, and at most ``batch_size`` items are held at a time for non sequence iterables.
 
     :type iterable: ``list``
     :param iterable: list or other iterable object.
@@ -4086,12 +4310,464 @@ def batch(iterable, batch_size=1):
     :rtype: ``list``
     :return:: Iterable slices of given
     """
-    current_batch = iterable[:batch_size]
-    not_batched = iterable[batch_size:]
+    batch_size = max(int(batch_size), 1)
+    if hasattr(iterable, '__getitem__') and hasattr(iterable, '__len__') and not isinstance(iterable, dict):
+        for start in range(0, len(iterable), batch_size):
+            yield iterable[start:start + batch_size]
+        return
+
+    iterator = iter(iterable)
+    current_batch = list(itertools.islice(iterator, batch_size))
     while current_batch:
         yield current_batch
-        current_batch = not_batched[:batch_size]
-        not_batched = not_batched[batch_size:]
+        current_batch = list(itertools.islice(iterator, batch_size))
+
+
+class FeedIndicatorsDelta(object):
+    """Filters the indicators of a feed fetch down to the ones which were added or changed since the previous fetch.
+    A compact fingerprint of each indicator pushed by the previous fetch is kept in the integration context:
+    a hash of its value and type, mapped to a hash of its full content (fields, rawJSON etc.).
+    Example:
+    >>> delta = FeedIndicatorsDelta.from_integration_context(demisto.getIntegrationContext())
+    >>> for b in batch(delta.filter(indicators), batch_size=2000):
+    >>>     demisto.createIndicators(b)
+    >>> integration_context = demisto.getIntegrationContext()
+    >>> delta.update_integration_context(integration_context)
+    >>> demisto.setIntegrationContext(integration_context)
+
+    :type fingerprints: ``dict``
+    :param fingerprints: The fingerprints of the indicators of the previous fetch.
+
+    :return: None
+    :rtype: ``None``
+    """
+    CONTEXT_KEY = 'feed_indicators_delta'
+
+    def __init__(self, fingerprints=None):
+        self.previous_fingerprints = fingerprints or {}
+        self.current_fingerprints = {}  # type: dict
+        self.added_count = 0
+        self.changed_count = 0
+
+    @classmethod
+    def from_integration_context(cls, integration_context):
+        """Creates the delta from the fingerprints saved in the integration context.
+
+        :type integration_context: ``dict``
+        :param integration_context: The integration context.
+
+        :rtype: ``FeedIndicatorsDelta``
+        :return: The delta of the feed.
+        """
+        return cls((integration_context or {}).get(cls.CONTEXT_KEY))
+
+    @staticmethod
+    def get_fingerprint(indicator):
+        """Gets the fingerprint of an indicator.
+
+        :type indicator: ``dict``
+        :param indicator: An indicator, as sent to ``demisto.createIndicators``.
+
+        :rtype: ``tuple``
+        :return: The hash of the indicator value and type, and the hash of the indicator content.
+        """
+        key = u'{}\0{}'.format(indicator.get('type'), indicator.get('value')).encode('utf-8')
+        content = json.dumps(indicator, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.md5(key).hexdigest()[:16], hashlib.md5(content).hexdigest()[:8]
+
+    def filter(self, indicators):
+        """Yields the indicators which are new or changed since the previous fetch, and records the
+        fingerprints of all the given indicators.
+
+        :type indicators: ``list``
+        :param indicators: list or other iterable of the indicators of the current fetch.
+
+        :rtype: ``generator``
+        :return: The new and changed indicators.
+        """
+        for indicator in indicators:
+            key, content = self.get_fingerprint(indicator)
+            self.current_fingerprints[key] = content
+            previous_content = self.previous_fingerprints.get(key)
+            if previous_content == content:
+                continue
+            if previous_content is None:
+                self.added_count += 1
+            else:
+                self.changed_count += 1
+            yield indicator
+
+    @property
+    def removed_count(self):
+        """The number of indicators of the previous fetch which are missing from the current one.
+
+        :rtype: ``int``
+        :return: The number of removed indicators.
+        """
+        return sum(1 for key in self.previous_fingerprints if key not in self.current_fingerprints)
+
+    def update_integration_context(self, integration_context):
+        """Saves the fingerprints of the current fetch in the given integration context.
+        Nothing is saved when the current fetch had no indicators, so an empty or skipped fetch does
+        not cause the whole feed to be pushed again in the next one.
+
+        :type integration_context: ``dict``
+        :param integration_context: The integration context to update.
+
+        :rtype: ``dict``
+        :return: The updated integration context.
+        """
+        demisto.info('Feed delta: {} added, {} changed, {} unchanged and {} removed indicators'.format(
+            self.added_count, self.changed_count,
+            len(self.current_fingerprints) - self.added_count - self.changed_count, self.removed_count))
+        if self.current_fingerprints:
+            integration_context[self.CONTEXT_KEY] = self.current_fingerprints
+        return integration_context
+
+
+FEED_MAX_CONCURRENT_DOWNLOADS = 8
+FEED_MAX_CONCURRENT_DOWNLOADS_PER_HOST = 4
+FEED_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# the body of a feed URL is spooled to a temporary file above this size
+FEED_SPOOL_MAX_MEMORY_SIZE = 16 * 1024 * 1024
+
+
+class FeedURLResponse(object):
+    """The response of a feed URL, whose body is read either from the streamed response or from the temporary
+    file it was spooled to by ``spool``. The body is read with the same methods as of ``requests.Response``.
+
+    :type url: ``str``
+    :param url: The feed URL.
+
+    :type response: ``requests.Response``
+    :param response: The response of the feed URL, requested with ``stream=True``.
+
+    :return: None
+    :rtype: ``None``
+    """
+
+    def __init__(self, url, response):
+        self.url = url
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.body = None
+        self.content_hash = None
+
+    def spool(self):
+        """Downloads the body in chunks into a temporary file, which stays in memory up to
+        FEED_SPOOL_MAX_MEMORY_SIZE, and hashes the chunks on the way. The body is then read from the file.
+
+        :rtype: ``str``
+        :return: The sha256 hash of the body.
+        """
+        if self.body is None:
+            sha256 = hashlib.sha256()
+            body = tempfile.SpooledTemporaryFile(max_size=FEED_SPOOL_MAX_MEMORY_SIZE)
+            for chunk in self.response.iter_content(FEED_DOWNLOAD_CHUNK_SIZE):
+                sha256.update(chunk)
+                body.write(chunk)
+            self.body = body
+            self.content_hash = sha256.hexdigest()
+        return self.content_hash
+
+    def iter_content(self, chunk_size=FEED_DOWNLOAD_CHUNK_SIZE):
+        """Iterates over the body in chunks of bytes.
+
+        :type chunk_size: ``int``
+        :param chunk_size: The size of the chunks.
+
+        :rtype: ``iterator``
+        :return: Iterator of the chunks of the body.
+        """
+        if self.body is None:
+            return self.response.iter_content(chunk_size)
+        self.body.seek(0)
+        return iter(lambda: self.body.read(chunk_size), b'')
+
+    def iter_lines(self, chunk_size=FEED_DOWNLOAD_CHUNK_SIZE):
+        """Iterates over the lines of the body, the same as ``requests.Response.iter_lines``.
+
+        :type chunk_size: ``int``
+        :param chunk_size: The size of the chunks the body is read in.
+
+        :rtype: ``iterator``
+        :return: Iterator of the lines of the body, in bytes.
+        """
+        pending = None
+        for chunk in self.iter_content(chunk_size):
+            if pending is not None:
+                chunk = pending + chunk
+            lines = chunk.splitlines()
+            pending = lines.pop() if lines and lines[-1] and lines[-1][-1] == chunk[-1] else None
+            for line in lines:
+                yield line
+        if pending is not None:
+            yield pending
+
+    @property
+    def content(self):
+        """The whole body, in bytes.
+
+        :rtype: ``bytes``
+        :return: The body.
+        """
+        if self.body is None:
+            return self.response.content
+        return b''.join(self.iter_content())
+
+    def json(self):
+        """Decodes the body as JSON.
+
+        :rtype: ``object``
+        :return: The decoded body.
+        """
+        if self.body is None:
+            return self.response.json()
+        return json.loads(self.content)
+
+
+class FeedURLCache(object):
+    """Keeps the validators (ETag and Last-Modified) and the body hash of each fetched feed URL in the integration
+    context, so a fetch can skip a feed whose URLs were not modified since the previous fetch.
+    The entries are saved with a fingerprint of the instance parameters, and are ignored once the parameters change.
+    Example:
+    >>> url_cache = FeedURLCache.from_integration_context(demisto.getIntegrationContext(), params_fingerprint)
+    >>> for feed_response in iter_feed_url_responses(get_url_response, urls, url_cache):
+    >>>     demisto.createIndicators(parse(feed_response))
+    >>> demisto.setIntegrationContext(url_cache.update_integration_context(demisto.getIntegrationContext()))
+
+    :type params_fingerprint: ``str``
+    :param params_fingerprint: The fingerprint of the instance parameters, see ``get_params_fingerprint``.
+
+    :type entries: ``dict``
+    :param entries: The saved cache entries of the URLs.
+
+    :return: None
+    :rtype: ``None``
+    """
+    CONTEXT_KEY = 'feed_url_cache'
+
+    def __init__(self, params_fingerprint, entries=None):
+        self.params_fingerprint = params_fingerprint
+        self.entries = {url: entry for url, entry in (entries or {}).items()
+                        if entry.get('params') == params_fingerprint}
+        # the entries of the URLs fetched by the current fetch
+        self.updates = {}  # type: dict
+
+    @classmethod
+    def from_integration_context(cls, integration_context, params_fingerprint):
+        """Creates the cache from the entries saved in the integration context.
+
+        :type integration_context: ``dict``
+        :param integration_context: The integration context.
+
+        :type params_fingerprint: ``str``
+        :param params_fingerprint: The fingerprint of the instance parameters.
+
+        :rtype: ``FeedURLCache``
+        :return: The URL cache of the feed.
+        """
+        return cls(params_fingerprint, (integration_context or {}).get(cls.CONTEXT_KEY))
+
+    @staticmethod
+    def get_params_fingerprint(params, fingerprint_params):
+        """Gets a hash of the instance parameters which affect the indicators created from the feed URLs.
+
+        :type params: ``dict``
+        :param params: The instance parameters.
+
+        :type fingerprint_params: ``tuple``
+        :param fingerprint_params: The names of the parameters which affect the indicators.
+
+        :rtype: ``str``
+        :return: The fingerprint of the parameters.
+        """
+        fingerprint_params = {key: params.get(key) for key in fingerprint_params}
+        return hashlib.sha256(json.dumps(fingerprint_params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def get_conditional_headers(self, url):
+        """Gets the headers of a conditional request of a URL, based on its saved validators.
+
+        :type url: ``str``
+        :param url: The feed URL.
+
+        :rtype: ``dict``
+        :return: The If-None-Match and If-Modified-Since headers.
+        """
+        entry = self.entries.get(url, {})
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def update(self, feed_response):
+        """Records the validators and the body hash of a fetched URL, spooling its body.
+
+        :type feed_response: ``FeedURLResponse``
+        :param feed_response: The response of the feed URL.
+
+        :rtype: ``dict``
+        :return: The cache entry of the URL.
+        """
+        entry = {
+            'etag': feed_response.headers.get('ETag'),
+            'last_modified': feed_response.headers.get('Last-Modified'),
+            'hash': feed_response.spool(),
+            'params': self.params_fingerprint
+        }
+        self.updates[feed_response.url] = entry
+        return entry
+
+    def is_unchanged(self, feed_response):
+        """Checks whether a URL was not modified since the previous fetch, either by a 304 response to the
+        conditional request or by the hash of its body.
+
+        :type feed_response: ``FeedURLResponse``
+        :param feed_response: The response of the feed URL.
+
+        :rtype: ``bool``
+        :return: True if the URL was not modified.
+        """
+        if feed_response.status_code == 304:
+            return True
+        return self.update(feed_response)['hash'] == self.entries.get(feed_response.url, {}).get('hash')
+
+    def update_integration_context(self, integration_context):
+        """Saves the entries of the URLs fetched by the current fetch in the given integration context.
+
+        :type integration_context: ``dict``
+        :param integration_context: The integration context to update.
+
+        :rtype: ``dict``
+        :return: The updated integration context.
+        """
+        if self.updates:
+            url_cache = dict(integration_context.get(self.CONTEXT_KEY) or {})
+            url_cache.update(self.updates)
+            integration_context[self.CONTEXT_KEY] = url_cache
+        return integration_context
+
+
+def create_feed_download_session():
+    """Creates a session whose connection pools are shared by the concurrent downloads of feed URLs.
+
+    :rtype: ``requests.Session``
+    :return: The session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=FEED_MAX_CONCURRENT_DOWNLOADS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def iter_feed_url_responses(get_url_response, urls, url_cache=None):
+    """Downloads feed URLs concurrently, at most FEED_MAX_CONCURRENT_DOWNLOADS at a time and
+    FEED_MAX_CONCURRENT_DOWNLOADS_PER_HOST for each host, and yields the response of each URL as soon as its body
+    was spooled, in the order in which the downloads complete. A single URL is requested in the calling thread,
+    and its body is streamed while it is parsed.
+    An error of a download is raised in the calling thread, so ``get_url_response`` should raise rather than
+    report errors with ``demisto`` functions.
+    With a URL cache, the URLs are requested conditionally and nothing is yielded if none of them was modified.
+    Otherwise all the URLs are yielded, so the indicators of the unchanged URLs are kept alive as well.
+
+    :type get_url_response: ``callable``
+    :param get_url_response: Function which gets a URL and the headers of a conditional request (which may be
+        empty), and sends its request with ``stream=True``.
+
+    :type urls: ``list``
+    :param urls: The URLs to download.
+
+    :type url_cache: ``FeedURLCache``
+    :param url_cache: The URL cache of the feed, to skip the feed if it was not modified since the previous fetch.
+
+    :rtype: ``iterator``
+    :return: Iterator of the ``FeedURLResponse`` of the URLs.
+    """
+    if url_cache is None:
+        for feed_response in _download_feed_urls(lambda url: get_url_response(url, {}), urls):
+            yield feed_response
+        return
+
+    url_to_response = OrderedDict((feed_response.url, feed_response) for feed_response in _download_feed_urls(
+        lambda url: get_url_response(url, url_cache.get_conditional_headers(url)), urls))
+    unchanged_urls = [url for url, feed_response in url_to_response.items() if url_cache.is_unchanged(feed_response)]
+    demisto.info('{} of {} feed URLs were not modified since the last fetch'.format(len(unchanged_urls), len(urls)))
+    if len(unchanged_urls) == len(urls):
+        demisto.info('Skipping the fetch, the feed was not modified')
+        return
+
+    not_modified_urls = [url for url, feed_response in url_to_response.items() if feed_response.status_code == 304]
+    for feed_response in _download_feed_urls(lambda url: get_url_response(url, {}), not_modified_urls):
+        url_cache.update(feed_response)
+        url_to_response[feed_response.url] = feed_response
+    for feed_response in url_to_response.values():
+        yield feed_response
+
+
+def _download_feed_urls(get_url_response, urls):
+    """Downloads the URLs for ``iter_feed_url_responses``, and yields their responses as their downloads complete.
+
+    :type get_url_response: ``callable``
+    :param get_url_response: Function which gets a URL and sends its request with ``stream=True``.
+
+    :type urls: ``list``
+    :param urls: The URLs to download.
+
+    :rtype: ``iterator``
+    :return: Iterator of the ``FeedURLResponse`` of the URLs.
+    """
+    if len(urls) <= 1:
+        for url in urls:
+            yield FeedURLResponse(url, get_url_response(url))
+        return
+
+    try:
+        from queue import Queue, Empty
+        from urllib.parse import urlparse
+    except ImportError:  # Python 2
+        from Queue import Queue, Empty  # type: ignore
+        from urlparse import urlparse  # type: ignore
+
+    host_semaphores = {}  # type: dict
+    pending_urls = Queue()  # type: ignore
+    for url in urls:
+        host_semaphores.setdefault(urlparse(url).netloc,
+                                   threading.BoundedSemaphore(FEED_MAX_CONCURRENT_DOWNLOADS_PER_HOST))
+        pending_urls.put(url)
+    results = Queue()  # type: ignore
+    stopped = threading.Event()
+
+    def download():
+        while not stopped.is_set():
+            try:
+                url = pending_urls.get_nowait()
+            except Empty:
+                return
+            try:
+                # the body is downloaded while holding the slot of the host
+                with host_semaphores[urlparse(url).netloc]:
+                    feed_response = FeedURLResponse(url, get_url_response(url))
+                    feed_response.spool()
+                results.put((feed_response, None))
+            except BaseException as e:  # raised in the calling thread
+                results.put((None, e))
+
+    for _ in range(min(FEED_MAX_CONCURRENT_DOWNLOADS, len(urls))):
+        worker = threading.Thread(target=download)
+        worker.daemon = True
+        worker.start()
+    try:
+        for _ in urls:
+            feed_response, error = results.get()
+            if error is not None:
+                raise error
+            yield feed_response
+    finally:
+        stopped.set()
 
 
 def dict_safe_get(dict_object, keys, default_return_value=None, return_type=None, raise_return_type=True):
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import demistomock as demisto
 import copy
+import hashlib
+import io
 import json
 import re
 import os
@@ -13,9 +15,10 @@ from CommonServerPython import xml2json, json2xml, entryTypes, formats, tableToM
     flattenCell, date_to_timestamp, datetime, camelize, pascalToSpace, argToList, \
     remove_nulls_from_dictionary, is_error, get_error, hash_djb2, fileResult, is_ip_valid, get_demisto_version, \
     IntegrationLogger, parse_date_string, IS_PY3, DebugLogger, b64_encode, parse_date_range, return_outputs, \
-    argToBoolean, ipv4Regex, ipv4cidrRegex, ipv6cidrRegex, ipv6Regex, batch, FeedIndicatorType, \
+    argToBoolean, ipv4Regex, ipv4cidrRegex, ipv6cidrRegex, ipv6Regex, batch, FeedIndicatorsDelta, FeedIndicatorType, \
     encode_string_results, safe_load_json, remove_empty_elements, aws_table_to_markdown, is_demisto_version_ge, \
-    appendContext, auto_detect_indicator_type, handle_proxy, get_demisto_version_as_str, get_x_content_info_headers
+    appendContext, auto_detect_indicator_type, auto_detect_indicator_types, handle_proxy, get_demisto_version_as_str, \
+    get_x_content_info_headers, FeedURLResponse, FeedURLCache, iter_feed_url_responses
 
 try:
     from StringIO import StringIO
@@ -65,6 +68,50 @@ def test_xml():
     assert xmlActual == xml, "expected:\n{}\nto equal:\n{}".format(xml, xmlActual)
 
 
+XML_WITH_ATTRIBUTES = b'<response status="success" xmlns:x="urn:x"><result total="2"><x:entry name="a">' \
+                      b'<member>1</member><member>2</member></x:entry>mixed tail<x:entry name="b"> text </x:entry>' \
+                      b'<empty/></result></response>'
+
+
+@pytest.mark.parametrize('strip_ns, strip', [(1, 1), (0, 0)])
+def test_xml2dict(strip_ns, strip):
+    """
+    Given
+        - An XML with attributes, namespaces, repeated tags, mixed content and an empty element.
+    When
+        - Converting it with xml2dict, as a whole and as an iterable of small chunks.
+    Then
+        - Ensure the result equals the xml2json JSON round-trip.
+    """
+    import json
+    from CommonServerPython import xml2dict
+    expected = json.loads(xml2json(XML_WITH_ATTRIBUTES, strip_ns=strip_ns, strip=strip))
+    assert xml2dict(XML_WITH_ATTRIBUTES, strip_ns=strip_ns, strip=strip) == expected
+    chunks = (XML_WITH_ATTRIBUTES[i:i + 5] for i in range(0, len(XML_WITH_ATTRIBUTES), 5))
+    assert xml2dict(chunks, strip_ns=strip_ns, strip=strip) == expected
+
+
+def test_iter_xml_elements():
+    """
+    Given
+        - A PAN-OS log query result with three log entries, one of them with a nested entry element.
+    When
+        - Streaming the entry elements with iter_xml_elements.
+    Then
+        - Ensure the outermost entries are yielded in order, as xml2dict would convert them.
+    """
+    from CommonServerPython import iter_xml_elements
+    xml = '<response status="success"><result><log><logs count="3">' \
+          '<entry logid="1"><src>1.1.1.1</src></entry>' \
+          '<entry logid="2"><src>2.2.2.2</src><entry>nested</entry></entry>' \
+          '<entry logid="3"/></logs></log></result></response>'
+    assert list(iter_xml_elements(xml, 'entry')) == [
+        {'@logid': '1', 'src': '1.1.1.1'},
+        {'@logid': '2', 'src': '2.2.2.2', 'entry': 'nested'},
+        {'@logid': '3'},
+    ]
+
+
 def toEntry(table):
     return {
 
@@ -2072,6 +2119,218 @@ def test_batch(iterable, sz, expected):
         assert expected[i] == item
 
 
+def test_batch_generator():
+    """
+    Given
+    - A generator of 5 items.
+
+    When
+    - Batching it to batches of 2.
+
+    Then
+    - Ensure the generator is consumed lazily and batched into lists.
+    """
+    consumed = []
+
+    def gen():
+        for i in range(5):
+            consumed.append(i)
+            yield i
+
+    batches = batch(gen(), 2)
+    assert next(batches) == [0, 1]
+    assert consumed == [0, 1]
+    assert list(batches) == [[2, 3], [4]]
+
+
+def test_batch_string():
+    assert list(batch('abcde', 2)) == ['ab', 'cd', 'e']
+
+
+def test_feed_indicators_delta():
+    """
+    Given
+    - The fingerprints of a previous fetch with the indicators 1.1.1.1, 2.2.2.2 and 3.3.3.3.
+
+    When
+    - Filtering a fetch in which 1.1.1.1 is unchanged, 2.2.2.2 changed, 3.3.3.3 was removed and 4.4.4.4 was added.
+
+    Then
+    - Ensure only the changed and added indicators are returned.
+    - Ensure the counts are correct and the fingerprints of the current fetch are saved.
+    """
+    def indicator(value, tags):
+        return {'value': value, 'type': 'IP', 'fields': {'tags': tags}, 'rawJSON': {'value': value}}
+
+    previous = FeedIndicatorsDelta()
+    list(previous.filter([indicator('1.1.1.1', ['a']), indicator('2.2.2.2', ['a']), indicator('3.3.3.3', ['a'])]))
+    integration_context = previous.update_integration_context({'other': 'value'})
+
+    delta = FeedIndicatorsDelta.from_integration_context(integration_context)
+    indicators = list(delta.filter([indicator('1.1.1.1', ['a']), indicator('2.2.2.2', ['b']),
+                                    indicator('4.4.4.4', ['a'])]))
+    assert [i['value'] for i in indicators] == ['2.2.2.2', '4.4.4.4']
+    assert (delta.added_count, delta.changed_count, delta.removed_count) == (1, 1, 1)
+
+    integration_context = delta.update_integration_context(integration_context)
+    assert integration_context['other'] == 'value'
+    assert len(integration_context[FeedIndicatorsDelta.CONTEXT_KEY]) == 3
+    assert FeedIndicatorsDelta().update_integration_context(integration_context) == integration_context
+
+
+def create_feed_response(body):
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    return response
+
+
+def test_feed_url_response_spool():
+    """
+    Given
+    - The streamed response of a feed URL.
+
+    When
+    - Spooling its body and reading it more than once.
+
+    Then
+    - Ensure the hash of the body is returned and the body is read from the spooled file, the same as from a
+      requests response.
+    """
+    body = b'{"a": [1, 2]}\r\nline 2\nline 3'
+    feed_response = FeedURLResponse('https://a.com', create_feed_response(body))
+    assert feed_response.spool() == hashlib.sha256(body).hexdigest()
+    assert feed_response.spool() == hashlib.sha256(body).hexdigest()
+    assert feed_response.content == body
+    assert list(feed_response.iter_lines(chunk_size=4)) == list(create_feed_response(body).iter_lines(chunk_size=4))
+    assert b''.join(feed_response.iter_content(3)) == body
+
+    feed_response = FeedURLResponse('https://a.com', create_feed_response(b'{"a": [1, 2]}'))
+    feed_response.spool()
+    assert feed_response.json() == {'a': [1, 2]}
+    assert FeedURLResponse('https://a.com', create_feed_response(b'{"a": [1, 2]}')).json() == {'a': [1, 2]}
+
+
+def test_iter_feed_url_responses():
+    """
+    Given
+    - Three feed URLs, two of them on the same host, where the first URL is the slowest to download.
+
+    When
+    - Downloading the URLs while each download waits for the others to start.
+
+    Then
+    - Ensure the URLs are downloaded concurrently and yielded in the order in which their downloads complete.
+    """
+    import threading
+    urls = ['https://a.com/1', 'https://a.com/2', 'https://b.com/1']
+    started_urls = []
+    lock = threading.Lock()
+    all_started = threading.Event()
+    other_urls_yielded = threading.Event()
+
+    def get_url_response(url, conditional_headers):
+        with lock:
+            started_urls.append(url)
+            if len(started_urls) == len(urls):
+                all_started.set()
+        assert all_started.wait(5)
+        if url == urls[0]:
+            other_urls_yielded.wait(5)
+        return create_feed_response(url.encode())
+
+    url_contents = []
+    for feed_response in iter_feed_url_responses(get_url_response, urls):
+        url_contents.append((feed_response.url, feed_response.content))
+        if len(url_contents) == len(urls) - 1:
+            other_urls_yielded.set()
+    assert url_contents[-1] == (urls[0], urls[0].encode())
+    assert sorted(url_contents) == sorted((url, url.encode()) for url in urls)
+
+
+def test_iter_feed_url_responses_error():
+    """
+    Given
+    - Two feed URLs, one of which fails to download.
+
+    When
+    - Downloading the URLs concurrently.
+
+    Then
+    - Ensure the error of the download is raised in the calling thread.
+    """
+    def get_url_response(url, conditional_headers):
+        if url == 'https://b.com':
+            raise ValueError('download failed')
+        return create_feed_response(b'content')
+
+    with raises(ValueError, match='download failed'):
+        list(iter_feed_url_responses(get_url_response, ['https://a.com', 'https://b.com']))
+
+
+def test_iter_feed_url_responses_unchanged(mocker):
+    """
+    Given
+    - A feed with two URLs, whose validators and body hashes were saved by the previous fetch.
+
+    When
+    - Fetching when one URL answers 304 and the other returns the same body.
+    - Fetching when the other URL was modified.
+    - Fetching after the instance parameters changed.
+
+    Then
+    - Ensure the conditional request headers are sent and nothing is yielded.
+    - Ensure both URLs are yielded, the 304 one is downloaded again without conditional headers, and the new
+      entries are saved.
+    - Ensure the saved entries are ignored.
+    """
+    mocker.patch.object(demisto, 'info')
+    bodies = {'https://a.com': b'a', 'https://b.com': b'b'}
+    integration_context = {'other': 'value', FeedURLCache.CONTEXT_KEY: {
+        'https://a.com': {'etag': '"a1"', 'last_modified': None, 'hash': hashlib.sha256(b'a').hexdigest(),
+                          'params': 'fingerprint'},
+        'https://b.com': {'etag': None, 'last_modified': 'Mon, 01 Jun 2020 00:00:00 GMT',
+                          'hash': hashlib.sha256(b'b').hexdigest(), 'params': 'fingerprint'}
+    }}
+    requests_headers = []
+
+    def get_url_response(url, conditional_headers):
+        requests_headers.append((url, conditional_headers))
+        response = create_feed_response(bodies[url])
+        if url == 'https://a.com' and conditional_headers:
+            response.status_code = 304
+            response.raw = io.BytesIO(b'')
+        response.headers['ETag'] = '"{}2"'.format(url[-5])
+        return response
+
+    url_cache = FeedURLCache.from_integration_context(integration_context, 'fingerprint')
+    assert list(iter_feed_url_responses(get_url_response, list(bodies), url_cache)) == []
+    assert sorted(requests_headers) == [('https://a.com', {'If-None-Match': '"a1"'}),
+                                        ('https://b.com', {'If-Modified-Since': 'Mon, 01 Jun 2020 00:00:00 GMT'})]
+
+    del requests_headers[:]
+    bodies['https://b.com'] = b'b2'
+    url_cache = FeedURLCache.from_integration_context(integration_context, 'fingerprint')
+    feed_responses = list(iter_feed_url_responses(get_url_response, list(bodies), url_cache))
+    assert sorted((r.url, r.content) for r in feed_responses) == [('https://a.com', b'a'), ('https://b.com', b'b2')]
+    assert requests_headers[-1] == ('https://a.com', {})
+    integration_context = url_cache.update_integration_context(integration_context)
+    assert integration_context['other'] == 'value'
+    assert integration_context[FeedURLCache.CONTEXT_KEY]['https://a.com']['etag'] == '"a2"'
+    assert integration_context[FeedURLCache.CONTEXT_KEY]['https://b.com']['hash'] == hashlib.sha256(b'b2').hexdigest()
+
+    del requests_headers[:]
+    url_cache = FeedURLCache.from_integration_context(integration_context, 'other fingerprint')
+    assert len(list(iter_feed_url_responses(get_url_response, list(bodies), url_cache))) == 2
+    assert sorted(requests_headers) == [('https://a.com', {}), ('https://b.com', {})]
+
+
+def test_feed_url_cache_params_fingerprint():
+    fingerprint = FeedURLCache.get_params_fingerprint({'url': 'https://a.com', 'other': 1}, ('url', 'tags'))
+    assert fingerprint == FeedURLCache.get_params_fingerprint({'url': 'https://a.com', 'other': 2}, ('url', 'tags'))
+    assert fingerprint != FeedURLCache.get_params_fingerprint({'url': 'https://b.com'}, ('url', 'tags'))
+
+
 regexes_test = [
     (ipv4Regex, '192.168.1.1', True),
     (ipv4Regex, '192.168.1.1/24', False),
@@ -2301,6 +2560,23 @@ def test_auto_detect_indicator_type(indicator_value, indicatory_type):
                              " use a docker image with it installed such as: demisto/jmespath"
 
 
+def test_auto_detect_indicator_types(mocker):
+    """
+        Given
+            - A list of indicator values, some of them repeating.
+
+        When
+        - Detecting the types of all the indicators at once.
+
+        Then
+        -  Validate the types match the ones detected for each value, and each distinct value is detected once.
+    """
+    import CommonServerPython
+    detect = mocker.patch.object(CommonServerPython, 'auto_detect_indicator_type', side_effect=lambda value: value[:2])
+    assert auto_detect_indicator_types(['1.1.1.1', 'a.com', '1.1.1.1']) == ['1.', 'a.', '1.']
+    assert detect.call_count == 2
+
+
 def test_handle_proxy(mocker):
     os.environ['REQUESTS_CA_BUNDLE'] = '/test1.pem'
     mocker.patch.object(demisto, 'params', return_value={'insecure': True})
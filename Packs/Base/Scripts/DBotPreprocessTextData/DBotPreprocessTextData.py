@@ -36,7 +36,7 @@ class Tokenizer:
     def __init__(self, clean_html=True, remove_new_lines=True, hash_seed=None, remove_non_english=True,
                  remove_stop_words=True, remove_punct=True, remove_non_alpha=True, replace_emails=True,
                  replace_numbers=True, lemma=True, replace_urls=True, language='English',
-                 tokenization_method='byWords'):
+                 tokenization_method='byWords', spacy_batch_size=1000, spacy_n_process=1):
         self.number_pattern = "NUMBER_PATTERN"
         self.url_pattern = "URL_PATTERN"
         self.email_pattern = "EMAIL_PATTERN"
@@ -73,8 +73,8 @@ class Tokenizer:
                                          'Italian': 'it_core_news_sm',
                                          'Dutch': 'nl_core_news_sm'
                                          }
-        self.spacy_count = 0
-        self.spacy_reset_count = 500
+        self.spacy_batch_size = spacy_batch_size
+        self.spacy_n_process = spacy_n_process
 
     def handle_long_text(self, t, input_length):
         if input_length == 1:
@@ -107,10 +107,10 @@ class Tokenizer:
             cleaned = pattern.sub(" ", cleaned)
         return unescape(cleaned).strip()
 
-    def handle_tokenizaion_method(self, text):
+    def handle_tokenizaion_method(self, text, doc=None):
         language = self.language
         if language in self.languages_to_model_names:
-            tokens_list, original_words_to_tokens = self.tokenize_text_spacy(text)
+            tokens_list, original_words_to_tokens = self.tokenize_text_spacy(text, doc)
         else:
             tokens_list, original_words_to_tokens = self.tokenize_text_other(text)
         tokenized_text = ' '.join(tokens_list).strip()
@@ -134,11 +134,11 @@ class Tokenizer:
             return_error('Unsupported tokenization method: when language is "Other" ({})'.format(tokenization_method))
         return tokens_list, original_words_to_tokens
 
-    def tokenize_text_spacy(self, text):
-        if self.nlp is None or self.spacy_count % self.spacy_reset_count == 0:
+    def tokenize_text_spacy(self, text, doc=None):
+        if self.nlp is None:
             self.init_spacy_model(self.language)
-        doc = self.nlp(text)  # type: ignore
-        self.spacy_count += 1
+        if doc is None:
+            doc = self.nlp(text)  # type: ignore
         original_text_indices_to_words = self.map_indices_to_words(text)
         tokens_list = []
         original_words_to_tokens = {}  # type: ignore
@@ -180,24 +180,46 @@ class Tokenizer:
                          "using this language, it's required to change this docker. Please check at the documentation "
                          "or contact us for help.")
 
-    def word_tokenize(self, text):
-        if not isinstance(text, list):
-            text = [text]
+    def pipe_spacy(self, texts):
+        """
+        Yields the spacy docs of the texts, processed in batches by nlp.pipe. Instead of reloading the model to
+        control memory growth, strings which are no longer used by the docs are pruned from the string store.
+        """
+        if self.nlp is None:
+            self.init_spacy_model(self.language)
+        pipe_kwargs = {'batch_size': self.spacy_batch_size, 'cleanup': True}
+        if self.spacy_n_process > 1:
+            pipe_kwargs['n_process'] = self.spacy_n_process
+        return self.nlp.pipe(texts, **pipe_kwargs)  # type: ignore
+
+    def clean_text(self, text):
+        if self.remove_new_lines:
+            text = self.remove_line_breaks(text)
+        if self.clean_html:
+            text = self.clean_html_from_text(text)
+        return self.remove_multiple_whitespaces(text)
+
+    def tokenize_texts(self, texts):
+        cleaned_texts = [self.clean_text(t) for t in texts]
+        docs = None
+        if self.language in self.languages_to_model_names and len(texts) > 1:
+            docs = self.pipe_spacy(t for t in cleaned_texts if len(t) < self.max_text_length)
         result = []
-        for t in text:
-            original_text = t
-            if self.remove_new_lines:
-                t = self.remove_line_breaks(t)
-            if self.clean_html:
-                t = self.clean_html_from_text(t)
-            t = self.remove_multiple_whitespaces(t)
+        for original_text, t in zip(texts, cleaned_texts):
             if len(t) < self.max_text_length:
-                tokenized_text, original_words_to_tokens = self.handle_tokenizaion_method(t)
+                doc = next(docs) if docs is not None else None
+                tokenized_text, original_words_to_tokens = self.handle_tokenizaion_method(t, doc)
             else:
-                tokenized_text, original_words_to_tokens = self.handle_long_text(t, input_length=len(text))
+                tokenized_text, original_words_to_tokens = self.handle_long_text(t, input_length=len(texts))
             text_result = create_text_result(original_text, tokenized_text, original_words_to_tokens,
                                              hash_seed=self.hash_seed)
             result.append(text_result)
+        return result
+
+    def word_tokenize(self, text):
+        if not isinstance(text, list):
+            text = [text]
+        result = self.tokenize_texts(text)
         if len(result) == 1:
             result = result[0]  # type: ignore
         return result
@@ -207,6 +229,8 @@ class Tokenizer:
 DBOT_TEXT_FIELD = 'dbot_text'
 DBOT_PROCESSED_TEXT_FIELD = 'dbot_processed_text'
 CONTEXT_KEY = 'DBotPreProcessTextData'
+# the maximal number of pairwise similarities computed at once while removing duplicates
+DEDUP_MAX_SIMILARITIES = 10 ** 7
 HTML_PATTERNS = [
     re.compile(r"(?is)<(script|style).*?>.*?(</\1>)"),
     re.compile(r"(?s)<!--(.*?)-->[\n]?"),
@@ -283,9 +307,12 @@ def pre_process_batch(data, source_text_field, target_text_field, remove_html_ta
     if remove_html_tags:
         raw_text_data = [clean_html(x) for x in raw_text_data]
     raw_text_data = [remove_line_breaks(x) for x in raw_text_data]
+    if pre_process_type == 'nlp':
+        tokenized_texts = get_tokenizer(hash_seed).tokenize_texts(raw_text_data)
+    else:
+        tokenized_texts = [pre_process_single_text(raw_text, hash_seed, pre_process_type) for raw_text in raw_text_data]
     tokenized_text_data = []
-    for raw_text in raw_text_data:
-        tokenized_text = pre_process_single_text(raw_text, hash_seed, pre_process_type)
+    for tokenized_text in tokenized_texts:
         if hash_seed is None:
             tokenized_text_data.append(tokenized_text['tokenizedText'])
         else:
@@ -301,12 +328,18 @@ def pre_process_single_text(raw_text, hash_seed, pre_process_type):
     return tokenized_text
 
 
-def pre_process_tokenizer(text, seed):
+def get_tokenizer(seed):
     global tokenizer
     if tokenizer is None:
         tokenizer = Tokenizer(tokenization_method=demisto.args()['tokenizationMethod'],
-                              language=demisto.args()['language'], hash_seed=seed)
-    processed_text = tokenizer.word_tokenize(text)
+                              language=demisto.args()['language'], hash_seed=seed,
+                              spacy_batch_size=int(demisto.args().get('tokenizationBatchSize', 1000)),
+                              spacy_n_process=int(demisto.args().get('tokenizationProcesses', 1)))
+    return tokenizer
+
+
+def pre_process_tokenizer(text, seed):
+    processed_text = get_tokenizer(seed).word_tokenize(text)
     return processed_text
 
 
@@ -334,20 +367,27 @@ def remove_short_text(data, text_field, target_text_field, remove_short_threshol
     return data, description
 
 
-def get_tf_idf_similarity_arr(documents):
-    tfidf = TfidfVectorizer(stop_words="english", min_df=1).fit_transform(documents)
-    pairwise_similarity = tfidf * tfidf.T
-    return pairwise_similarity.toarray()
-
-
-def find_duplicate_indices(texts, dedup_threshold):
-    similarity_arr = get_tf_idf_similarity_arr(texts)
-    indices_to_remove = []
-    for i in range(similarity_arr.shape[0]):
-        for j in range(similarity_arr.shape[1]):
-            if j > i and similarity_arr[i][j] > dedup_threshold:
-                indices_to_remove.append(j)
-    return set(indices_to_remove)
+def get_tf_idf_matrix(documents):
+    return TfidfVectorizer(stop_words="english", min_df=1).fit_transform(documents)
+
+
+def find_duplicate_indices(texts, dedup_threshold, max_similarities=DEDUP_MAX_SIMILARITIES):
+    """
+    Finds the indices of the texts which are similar to a text preceding them. The tf-idf rows are normalized, so
+    the pairwise cosine similarities are computed as sparse products of blocks of rows with the whole matrix,
+    keeping at most max_similarities similarities in memory at once.
+    """
+    tfidf = get_tf_idf_matrix(texts).tocsr()
+    transposed_tfidf = tfidf.T.tocsr()
+    texts_count = tfidf.shape[0]
+    block_size = max(1, max_similarities // max(texts_count, 1))
+    indices_to_remove = set()
+    for block_start in range(0, texts_count, block_size):
+        block_similarity = tfidf[block_start:block_start + block_size].dot(transposed_tfidf).tocoo()
+        is_duplicate = (block_similarity.data > dedup_threshold) & \
+                       (block_similarity.col > block_similarity.row + block_start)
+        indices_to_remove.update(block_similarity.col[is_duplicate].tolist())
+    return indices_to_remove
 
 
 def remove_duplicate_by_indices(data, duplicate_indices):
@@ -3,7 +3,7 @@ import unittest
 from CommonServerPython import *
 from DBotPreprocessTextData import clean_html, remove_line_breaks, hash_word, \
     concat_text_fields, whitelist_dict_fields, remove_short_text, remove_duplicate_by_indices, pre_process_batch, main, \
-    read_file, Tokenizer
+    read_file, Tokenizer, find_duplicate_indices, get_tf_idf_matrix
 import string
 
 from copy import deepcopy
@@ -124,6 +124,20 @@ def test_remove_dups():
     assert len(data) == 2
 
 
+def test_find_duplicate_indices():
+    texts = ['phishing mail asking to reset the account password {}'.format(i % 5) for i in range(20)]
+    texts += ['invoice attached please review the payment details',
+              'invoice attached please review the payment',
+              'malware detected on the endpoint by the scanner']
+    similarity_arr = (get_tf_idf_matrix(texts) * get_tf_idf_matrix(texts).T).toarray()
+    for dedup_threshold in [0.5, 0.8, 0.99]:
+        expected_indices = {j for i in range(len(texts)) for j in range(i + 1, len(texts))
+                            if similarity_arr[i][j] > dedup_threshold}
+        assert find_duplicate_indices(texts, dedup_threshold) == expected_indices
+        # a tiny memory budget computes the similarities row by row
+        assert find_duplicate_indices(texts, dedup_threshold, max_similarities=1) == expected_indices
+
+
 def test_pre_process():
     data = [
         {
@@ -401,6 +415,17 @@ I have 3 dogs
                     "don't": ['do', "n't"], 'live': ['live'], 'in': ['in'], 'Petach': ['petach'], 'Tikva': ['tikva']}
         assert res1['originalWordsToTokens'] == expected
 
+    def test_batch_tokenization(self):
+        args = deepcopy(neagative_initalization)
+        args['lemma'] = True
+        args['replace_numbers'] = True
+        texts = ["I'm 29 years old and I don't live in Petach Tikva", 'I have 3 dogs', 'x' * 10 ** 5, 'hello world']
+        t1 = Tokenizer(spacy_batch_size=2, **args)
+        res1 = t1.word_tokenize(texts)
+        t2 = Tokenizer(**args)
+        assert res1[:2] + res1[3:] == [t2.word_tokenize(text) for text in texts[:2] + texts[3:]]
+        assert res1[2]['tokenizedText'] == ''
+
 
 def test_read_file(mocker):
     mocker.patch.object(demisto, 'getFilePath', return_value={'path': './TestData/input_json_file_test'})
@@ -1,5 +1,6 @@
 from CommonServerPython import *
 
+import gzip
 import pickle
 import uuid
 
@@ -8,6 +9,7 @@ from dateutil import parser
 PREFIXES_TO_REMOVE = ['incident.']
 PAGE_SIZE = int(demisto.args().get('pageSize', 500))
 PYTHON_MAGIC = "$$##"
+OUTPUT_FORMAT_JSONL_GZ = 'jsonl.gz'
 
 
 def parse_datetime(datetime_str):
@@ -67,14 +69,14 @@ def build_incidents_query(extra_query, incident_types, time_field, from_date, to
     return query
 
 
-def handle_incident(inc, fields_to_populate, include_context):
+def handle_incident(inc, fields_to_populate, context=None):
     # we flat the custom field to the incident structure, like in the context
     custom_fields = inc.get('CustomFields', {}) or {}
     inc.update(custom_fields)
     if fields_to_populate and len(fields_to_populate) > 0:
         inc = {k: v for k, v in inc.items() if k in fields_to_populate}
-    if include_context:
-        inc['context'] = get_context(inc['id'])
+    if context is not None:
+        inc['context'] = context
     return inc
 
 
@@ -82,19 +84,27 @@ def is_incident_contains_python_magic(inc):
     return PYTHON_MAGIC in json.dumps(inc)
 
 
-def get_incidents_by_page(args, page, fields_to_populate, include_context):
-    args['page'] = page
+def get_incidents_page(args, page, include_context):
+    """
+    Gets a page of incidents, and the context of each incident if include_context is set.
+    :return: The incidents and their contexts (None when include_context is not set)
+    """
+    args = dict(args, page=page)
     res = demisto.executeCommand("getIncidents", args)
     if res[0]['Contents'].get('data') is None:
-        return []
+        return [], []
     if is_error(res):
         error_message = get_error(res)
         raise Exception("Failed to get incidents by query args: %s error: %s" % (args, error_message))
     incidents = res[0]['Contents'].get('data') or []
+    contexts = [get_context(inc['id']) if include_context else None for inc in incidents]
+    return incidents, contexts
+
 
+def handle_incidents_page(incidents, contexts, fields_to_populate):
     parsed_incidents = []
-    for inc in incidents:
-        new_incident = handle_incident(inc, fields_to_populate, include_context)
+    for inc, context in zip(incidents, contexts):
+        new_incident = handle_incident(inc, fields_to_populate, context)
         if is_incident_contains_python_magic(new_incident):
             demisto.debug("Warning: skip incident [id:%s] that contains python magic" % str(inc['id']))
             continue
@@ -102,7 +112,12 @@ def get_incidents_by_page(args, page, fields_to_populate, include_context):
     return parsed_incidents
 
 
-def get_incidents(query, time_field, size, from_date, fields_to_populate, include_context):
+def get_incidents_by_page(args, page, fields_to_populate, include_context):
+    incidents, contexts = get_incidents_page(args, page, include_context)
+    return handle_incidents_page(incidents, contexts, fields_to_populate)
+
+
+def iter_incidents(query, time_field, size, from_date, fields_to_populate, include_context):
     query_size = min(PAGE_SIZE, size)
     args = {"query": query, "size": query_size, "sort": time_field}
     if time_field == "created" and from_date:
@@ -115,15 +130,36 @@ def get_incidents(query, time_field, size, from_date, fields_to_populate, includ
             from_datetime = parse_relative_time(from_date)
         if from_datetime:
             args['from'] = from_datetime.isoformat()
-    incident_list = []  # type: ignore
+    incidents_count = 0
     page = 0
-    while len(incident_list) < size:
+    while incidents_count < size:
         incidents = get_incidents_by_page(args, page, fields_to_populate, include_context)
         if not incidents:
             break
-        incident_list += incidents
+        for inc in incidents[:size - incidents_count]:
+            yield inc
+        incidents_count += len(incidents)
         page += 1
-    return incident_list[:size]
+
+
+def get_incidents(query, time_field, size, from_date, fields_to_populate, include_context):
+    return list(iter_incidents(query, time_field, size, from_date, fields_to_populate, include_context))
+
+
+def write_incidents_jsonl_file(file_name, incidents):
+    """
+    Writes the incidents one by one to a gzip compressed JSON lines file entry, so they are not held in memory
+    :return: The file entry and the number of incidents written
+    """
+    temp = demisto.uniqueFile()
+    incidents_count = 0
+    with gzip.open(demisto.investigation()['id'] + '_' + temp, 'wt', encoding='utf-8') as f:
+        for inc in incidents:
+            f.write(json.dumps(inc) + '\n')
+            incidents_count += 1
+    entry = {'Contents': '', 'ContentsFormat': formats['text'], 'Type': entryTypes['file'], 'File': file_name,
+             'FileID': temp}
+    return entry, incidents_count
 
 
 def get_comma_sep_list(value):
@@ -161,25 +197,30 @@ def main():
             fields_to_populate.append('id')
             fields_to_populate = set([x for x in fields_to_populate if x])  # type: ignore
         include_context = d_args['includeContext'] == 'true'
-        incidents = get_incidents(query, d_args['timeField'],
-                                  int(d_args['limit']),
-                                  d_args.get('fromDate'),
-                                  fields_to_populate,
-                                  include_context)
+        incidents = iter_incidents(query, d_args['timeField'],
+                                   int(d_args['limit']),
+                                   d_args.get('fromDate'),
+                                   fields_to_populate,
+                                   include_context)
 
         # output
         file_name = str(uuid.uuid4())
         output_format = d_args['outputFormat']
-        if output_format == 'pickle':
-            data_encoded = pickle.dumps(incidents, protocol=2)
-        elif output_format == 'json':
-            data_encoded = json.dumps(incidents)  # type: ignore
+        if output_format == OUTPUT_FORMAT_JSONL_GZ:
+            entry, incidents_count = write_incidents_jsonl_file(file_name, incidents)
         else:
-            raise Exception("Invalid output format: %s" % output_format)
-
-        entry = fileResult(file_name, data_encoded)
-        entry['Contents'] = incidents
-        entry['HumanReadable'] = "Fetched %d incidents successfully by the query: %s" % (len(incidents), query)
+            incidents = list(incidents)
+            incidents_count = len(incidents)
+            if output_format == 'pickle':
+                data_encoded = pickle.dumps(incidents, protocol=2)
+            elif output_format == 'json':
+                data_encoded = json.dumps(incidents)  # type: ignore
+            else:
+                raise Exception("Invalid output format: %s" % output_format)
+
+            entry = fileResult(file_name, data_encoded)
+            entry['Contents'] = incidents
+        entry['HumanReadable'] = "Fetched %d incidents successfully by the query: %s" % (incidents_count, query)
         entry['EntryContext'] = {
             'GetIncidentsByQuery': {
                 'Filename': file_name,
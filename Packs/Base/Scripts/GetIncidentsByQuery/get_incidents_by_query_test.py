@@ -1,3 +1,6 @@
+import gzip
+import os
+
 from GetIncidentsByQuery import build_incidents_query, get_incidents, parse_relative_time, main, \
     preprocess_incidents_fields_list, PYTHON_MAGIC
 
@@ -160,3 +163,62 @@ def test_skip_python_magic(mocker):
 def test_preprocess_incidents_fields_list():
     incidents_fields = ['incident.emailbody', ' incident.emailsbuject']
     assert preprocess_incidents_fields_list(incidents_fields) == ['emailbody', 'emailsbuject']
+
+
+def execute_command_get_incidents_pages(command, args):
+    # 5 pages of 2 incidents, the incident ids are their position in the results
+    if args['page'] >= 5:
+        return [{'Type': entryTypes['note'], 'Contents': {'data': None}}]
+    data = [dict(incident1, id=args['page'] * 2 + index) for index in range(2)]
+    return [{'Type': entryTypes['note'], 'Contents': {'data': data}}]
+
+
+def test_get_incidents_pages(mocker):
+    execute_command = mocker.patch.object(demisto, 'executeCommand', side_effect=execute_command_get_incidents_pages)
+    incidents = get_incidents('query', 'modified', 7, None, None, False)
+    assert [inc['id'] for inc in incidents] == list(range(7))
+    assert [call_args[0][1]['page'] for call_args in execute_command.call_args_list] == list(range(4))
+
+    execute_command.reset_mock()
+    incidents = get_incidents('query', 'modified', 100, None, None, False)
+    assert [inc['id'] for inc in incidents] == list(range(10))
+    assert [call_args[0][1]['page'] for call_args in execute_command.call_args_list] == list(range(6))
+
+
+def test_get_incidents_pages_with_context(mocker):
+    """
+    Given:
+        - 5 pages of incidents, whose contexts are included.
+    When:
+        - Getting the incidents.
+    Then:
+        - Ensure the incidents are returned in order with their contexts.
+    """
+    def execute_command(command, args):
+        if command == 'getContext':
+            return [{'Type': entryTypes['note'], 'Contents': {'context': {'incident_id': args['id']}}}]
+        return execute_command_get_incidents_pages(command, args)
+
+    mocker.patch.object(demisto, 'executeCommand', side_effect=execute_command)
+    incidents = get_incidents('query', 'modified', 100, None, None, True)
+    assert [(inc['id'], inc['context']['incident_id']) for inc in incidents] == [(i, i) for i in range(10)]
+
+
+def test_main_jsonl_output(mocker):
+    args = dict(get_args())
+    args['outputFormat'] = 'jsonl.gz'
+    mocker.patch.object(demisto, 'args', return_value=args)
+    mocker.patch.object(demisto, 'executeCommand', side_effect=execute_command_get_incidents_pages)
+    mocker.patch.object(demisto, 'investigation', return_value={'id': 'test'})
+
+    entry = main()
+    file_path = 'test_' + entry['FileID']
+    try:
+        with gzip.open(file_path, 'rt') as f:
+            incidents = [json.loads(line) for line in f]
+    finally:
+        os.remove(file_path)
+    assert "Fetched 10 incidents successfully" in entry['HumanReadable']
+    assert [inc['id'] for inc in incidents] == list(range(10))
+    assert incidents[0]['testField'] == 'testValue'
+    assert entry['EntryContext']['GetIncidentsByQuery']['FileFormat'] == 'jsonl.gz'
@@ -9,6 +9,7 @@ reload(sys)
 sys.setdefaultencoding('utf-8')  # pylint: disable=no-member
 
 MAX_TEXT_LENGTH = 10 ** 5
+SPACY_BATCH_SIZE = 1000
 
 NUMBER_PATTERN = "NUMBER_PATTERN"
 URL_PATTERN = "URL_PATTERN"
@@ -77,14 +78,18 @@ def hash_word(word):
     return str(hash_djb2(word, int(HASH_SEED)))
 
 
-def tokenize_text(text):
+def to_unicode(text):
     try:
-        unicode_text = unicode(text)
+        return unicode(text)
     except Exception:
-        unicode_text = text
+        return text
+
+
+def tokenize_text(text, doc=None):
+    unicode_text = to_unicode(text)
     language = demisto.args()['language']
     if language in LANGUAGES_TO_MODEL_NAMES:
-        original_words_to_tokens, tokens_list = tokenize_text_spacy(unicode_text, language)
+        original_words_to_tokens, tokens_list = tokenize_text_spacy(unicode_text, language, doc)
     else:
         original_words_to_tokens, tokens_list = tokenize_text_other(unicode_text)
     hashed_tokens_list = []
@@ -119,11 +124,26 @@ def tokenize_text_other(unicode_text):
     return original_words_to_tokens, tokens_list
 
 
-def tokenize_text_spacy(unicode_text, language):
+def load_spacy_model(language):
     global nlp
     if nlp is None:
         nlp = spacy.load(LANGUAGES_TO_MODEL_NAMES[language], disable=['tagger', 'parser', 'ner', 'textcat'])
-    doc = nlp(unicode(unicode_text))
+    return nlp
+
+
+def pipe_spacy(texts, language):
+    """
+    Yields the spacy docs of the texts, processed in batches. Strings which are no longer used by the docs are
+    pruned from the string store while processing.
+    """
+    return load_spacy_model(language).pipe((to_unicode(t) for t in texts), batch_size=SPACY_BATCH_SIZE,
+                                           cleanup=True)
+
+
+def tokenize_text_spacy(unicode_text, language, doc=None):
+    load_spacy_model(language)
+    if doc is None:
+        doc = nlp(unicode(unicode_text))
     original_text_indices_to_words = map_indices_to_words(unicode_text)
     tokens_list = []
     original_words_to_tokens = {}  # type: ignore
@@ -189,14 +209,18 @@ def word_tokenize(text):
     if not isinstance(text, list):
         text = [text]
 
+    cleaned_texts = [remove_multiple_whitespaces(clean_html(remove_line_breaks(t))) for t in text]
+    docs = None
+    language = demisto.args()['language']
+    if language in LANGUAGES_TO_MODEL_NAMES and len(text) > 1:
+        docs = pipe_spacy((t for t in cleaned_texts if len(t) < MAX_TEXT_LENGTH), language)
+
     result = []
-    for t in text:
-        original_text = t
-        t = remove_line_breaks(t)
-        t = clean_html(t)
-        t = remove_multiple_whitespaces(t)
+    for original_text, t in zip(text, cleaned_texts):
         if len(t) < MAX_TEXT_LENGTH:
-            tokenized_text, hash_tokenized_text, original_words_to_tokens, words_to_hashed_tokens = tokenize_text(t)
+            doc = next(docs) if docs is not None else None
+            tokenized_text, hash_tokenized_text, original_words_to_tokens, words_to_hashed_tokens = \
+                tokenize_text(t, doc)
         else:
             tokenized_text, hash_tokenized_text, original_words_to_tokens, words_to_hashed_tokens =\
                 handle_long_text(t, input_length=len(text))
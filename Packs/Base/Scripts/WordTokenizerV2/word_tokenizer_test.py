@@ -45,6 +45,13 @@ def test_word_tokenize():
         'hashedTokenizedText']
 
 
+def test_word_tokenize_batch():
+    texts = ["test@demisto.com is 100 going to http://google.com bla bla", "bla bla", "Lemon pie is the best"]
+    entry = word_tokenize(json.dumps(texts))
+    assert [res['tokenizedText'] for res in entry['Contents']] == [tokenize_text(text)[0] for text in texts]
+    assert [res['hashedTokenizedText'] for res in entry['Contents']] == [tokenize_text(text)[1] for text in texts]
+
+
 def test_word_tokenize_words_to_tokens():
     words = ["let\'s", "gonna", "ain't", "we'll", "shouldn't", "will\\won't"]
     words_to_tokens = {w: tokenize_text(w)[0].split() for w in words}
@@ -1,13 +1,13 @@
 import demistomock as demisto
 from CommonServerPython import *
 
-from email import message_from_string
 from email.header import decode_header
 import base64
 from base64 import b64decode
 
 import email.utils
-from email.parser import HeaderParser
+from email.generator import Generator
+from email.parser import HeaderParser, Parser
 import traceback
 import tempfile
 import sys
@@ -3260,7 +3260,8 @@ def get_email_address(eml, entry):
         res (str) : string of all required email addresses.
     """
     gel_all_values_from_email_by_entry = eml.get_all(entry, [])
-    addresses = getaddresses(gel_all_values_from_email_by_entry)
+    # unfold the values, a folded line break inside a quoted display name breaks getaddresses
+    addresses = getaddresses([unfold(value) for value in gel_all_values_from_email_by_entry])
     if addresses:
         res = [item[1] for item in addresses]
         res = ', '.join(res)
@@ -3471,205 +3472,235 @@ def decode_content(mime):
         return payload
 
 
-def handle_eml(file_path, b64=False, file_name=None, parse_only_headers=False, max_depth=3, bom=False):
-    global ENCODINGS_TYPES
+def parse_eml_file(eml_file, b64=False, bom=False, headers_only=False):
+    """
+      Parses an eml file object in a single pass. The parser reads the file in chunks, so the raw file
+      is not held in memory next to the parsed message.
+    """
+    parser = HeaderParser() if headers_only else Parser()
+    if b64:
+        return parser.parsestr(b64decode(eml_file.read()))
+    if bom and eml_file.read(len(codecs.BOM_UTF8)) != codecs.BOM_UTF8:
+        eml_file.seek(0)
+    return parser.parse(eml_file)
+
+
+def get_file_result_path(file_entry):
+    return demisto.investigation()['id'] + '_' + file_entry['FileID']
+
+
+def message_file_result(filename, message):
+    """
+      Creates a file entry of a parsed message, streaming it to the file instead of building its string
+    """
+    temp = demisto.uniqueFile()
+    with open(demisto.investigation()['id'] + '_' + temp, 'wb') as f:
+        Generator(f).flatten(message)
+    return {'Contents': '', 'ContentsFormat': formats['text'], 'Type': entryTypes['file'], 'File': filename,
+            'FileID': temp}
+
 
+def handle_eml(file_path, b64=False, file_name=None, parse_only_headers=False, max_depth=3, bom=False):
     if max_depth == 0:
         return None, []
 
     with open(file_path, 'rb') as emlFile:
+        eml = parse_eml_file(emlFile, b64=b64, bom=bom, headers_only=parse_only_headers)
+    if not eml:
+        raise Exception("Could not parse eml file!")
 
-        file_data = emlFile.read()
-        if b64:
-            file_data = b64decode(file_data)
-        if bom:
-            # decode bytes taking into account BOM and re-encode to utf-8
-            file_data = file_data.decode("utf-8-sig").encode("utf-8")
-
-        parser = HeaderParser()
-        headers = parser.parsestr(file_data)
-
-        header_list = []
-        headers_map = {}  # type: dict
-        for item in headers.items():
-            value = unfold(convert_to_unicode(item[1]))
-            item_dict = {
-                "name": item[0],
-                "value": value
-            }
-
-            # old way to map headers
-            header_list.append(item_dict)
-
-            # new way to map headers - dictionary
-            if item[0] in headers_map:
-                # in case there is already such header
-                # then add that header value to value array
-                if not isinstance(headers_map[item[0]], list):
-                    # convert the existing value to array
-                    headers_map[item[0]] = [headers_map[item[0]]]
-
-                # add the new value to the value array
-                headers_map[item[0]].append(value)
-            else:
-                headers_map[item[0]] = value
+    return parse_eml(eml, file_name, parse_only_headers, max_depth)
 
-        eml = message_from_string(file_data)
-        if not eml:
-            raise Exception("Could not parse eml file!")
 
-        if parse_only_headers:
-            return {"HeadersMap": headers_map}, []
+def parse_eml(eml, file_name=None, parse_only_headers=False, max_depth=3):
+    global ENCODINGS_TYPES
 
-        html = ''
-        text = ''
-        attachment_names = []
+    if max_depth == 0:
+        return None, []
 
-        attached_emails = []
-        parts = [eml]
-
-        while parts:
-            part = parts.pop()
-            if (part.is_multipart() or part.get_content_type().startswith('multipart')) \
-                    and "attachment" not in part.get("Content-Disposition", ""):
-                parts += [part_ for part_ in part.get_payload() if isinstance(part_, email.message.Message)]
-
-            elif part.get_filename() or "attachment" in part.get("Content-Disposition", ""):
-
-                attachment_file_name = convert_to_unicode(part.get_filename())
-                if attachment_file_name is None and part.get('filename'):
-                    attachment_file_name = os.path.normpath(part.get('filename'))
-                    if os.path.isabs(attachment_file_name):
-                        attachment_file_name = os.path.basename(attachment_file_name)
-
-                if "message/rfc822" in part.get("Content-Type", "") \
-                        or ("application/octet-stream" in part.get("Content-Type", "")
-                            and attachment_file_name.endswith(".eml")):
-
-                    # .eml files
-                    file_content = ""  # type: str
-                    base64_encoded = "base64" in part.get("Content-Transfer-Encoding", "")
-
-                    if isinstance(part.get_payload(), list) and len(part.get_payload()) > 0:
-                        if attachment_file_name is None or attachment_file_name == "":
-                            # in case there is no filename for the eml
-                            # we will try to use mail subject as file name
-                            # Subject will be in the email headers
-                            attachment_name = part.get_payload()[0].get('Subject', "no_name_mail_attachment")
-                            attachment_file_name = convert_to_unicode(attachment_name) + '.eml'
+    header_list = []
+    headers_map = {}  # type: dict
+    for item in eml.items():
+        value = unfold(convert_to_unicode(item[1]))
+        item_dict = {
+            "name": item[0],
+            "value": value
+        }
 
-                        file_content = part.get_payload()[0].as_string()
-                        if base64_encoded:
-                            try:
-                                file_content = b64decode(file_content)
+        # old way to map headers
+        header_list.append(item_dict)
+
+        # new way to map headers - dictionary
+        if item[0] in headers_map:
+            # in case there is already such header
+            # then add that header value to value array
+            if not isinstance(headers_map[item[0]], list):
+                # convert the existing value to array
+                headers_map[item[0]] = [headers_map[item[0]]]
+
+            # add the new value to the value array
+            headers_map[item[0]].append(value)
+        else:
+            headers_map[item[0]] = value
 
-                            except TypeError:
-                                pass  # In case the file is a string, decode=True for get_payload is not working
+    if parse_only_headers:
+        return {"HeadersMap": headers_map}, []
+
+    html = ''
+    text = ''
+    attachment_names = []
+
+    attached_emails = []
+    parts = [eml]
+
+    while parts:
+        part = parts.pop()
+        if (part.is_multipart() or part.get_content_type().startswith('multipart')) \
+                and "attachment" not in part.get("Content-Disposition", ""):
+            parts += [part_ for part_ in part.get_payload() if isinstance(part_, email.message.Message)]
+
+        elif part.get_filename() or "attachment" in part.get("Content-Disposition", ""):
+
+            attachment_file_name = convert_to_unicode(part.get_filename())
+            if attachment_file_name is None and part.get('filename'):
+                attachment_file_name = os.path.normpath(part.get('filename'))
+                if os.path.isabs(attachment_file_name):
+                    attachment_file_name = os.path.basename(attachment_file_name)
+
+            if "message/rfc822" in part.get("Content-Type", "") \
+                    or ("application/octet-stream" in part.get("Content-Type", "")
+                        and attachment_file_name.endswith(".eml")):
+
+                # .eml files
+                file_entry = None
+                inner_message = None
+                base64_encoded = "base64" in part.get("Content-Transfer-Encoding", "")
+
+                if isinstance(part.get_payload(), list) and len(part.get_payload()) > 0:
+                    if attachment_file_name is None or attachment_file_name == "":
+                        # in case there is no filename for the eml
+                        # we will try to use mail subject as file name
+                        # Subject will be in the email headers
+                        attachment_name = part.get_payload()[0].get('Subject', "no_name_mail_attachment")
+                        attachment_file_name = convert_to_unicode(attachment_name) + '.eml'
+
+                    if base64_encoded:
+                        file_content = part.get_payload()[0].as_string()
+                        try:
+                            file_content = b64decode(file_content)
 
-                    elif isinstance(part.get_payload(), basestring) and base64_encoded:
-                        file_content = part.get_payload(decode=True)
+                        except TypeError:
+                            pass  # In case the file is a string, decode=True for get_payload is not working
+                        if file_content:
+                            file_entry = fileResult(attachment_file_name, file_content)
                     else:
-                        demisto.debug("found eml attachment with Content-Type=message/rfc822 but has no payload")
+                        # the attached email was already parsed as part of this email, reuse it instead of
+                        # serializing and parsing it again
+                        inner_message = part.get_payload()[0]
+                        file_entry = message_file_result(attachment_file_name, inner_message)
 
+                elif isinstance(part.get_payload(), basestring) and base64_encoded:
+                    file_content = part.get_payload(decode=True)
                     if file_content:
-                        # save the eml to war room as file entry
-                        demisto.results(fileResult(attachment_file_name, file_content))
+                        file_entry = fileResult(attachment_file_name, file_content)
+                else:
+                    demisto.debug("found eml attachment with Content-Type=message/rfc822 but has no payload")
 
-                    if file_content and max_depth - 1 > 0:
-                        f = tempfile.NamedTemporaryFile(delete=False)
+                if file_entry:
+                    # save the eml to war room as file entry
+                    demisto.results(file_entry)
+
+                if file_entry and max_depth - 1 > 0:
+                    if inner_message is not None:
+                        inner_eml, inner_attached_emails = parse_eml(inner_message, file_name=attachment_file_name,
+                                                                     max_depth=max_depth - 1)
+                    else:
+                        # parse the decoded email from the war room file instead of writing another copy of it
+                        inner_eml, inner_attached_emails = handle_eml(file_path=get_file_result_path(file_entry),
+                                                                      file_name=attachment_file_name,
+                                                                      max_depth=max_depth - 1)
+                    attached_emails.append(inner_eml)
+                    attached_emails.extend(inner_attached_emails)
+                    # if we are outter email is a singed attachment it is a wrapper and we don't return the output of
+                    # this inner email as it will be returned as part of the main result
+                    if 'multipart/signed' not in eml.get_content_type():
+                        return_outputs(readable_output=data_to_md(inner_eml, attachment_file_name, file_name),
+                                       outputs=None)
+                attachment_names.append(attachment_file_name)
+            else:
+                # .msg and other files (png, jpeg)
+                if part.is_multipart() and max_depth - 1 > 0:
+                    # email is DSN
+                    msgs = part.get_payload()  # human-readable section
+                    i = 0
+                    for indiv_msg in msgs:
+                        msg = indiv_msg.get_payload()
+                        attachment_file_name = indiv_msg.get_filename()
                         try:
-                            f.write(file_content)
-                            f.close()
-                            inner_eml, inner_attached_emails = handle_eml(file_path=f.name,
-                                                                          file_name=attachment_file_name,
-                                                                          max_depth=max_depth - 1)
-                            attached_emails.append(inner_eml)
-                            attached_emails.extend(inner_attached_emails)
-                            # if we are outter email is a singed attachment it is a wrapper and we don't return the output of
-                            # this inner email as it will be returned as part of the main result
-                            if 'multipart/signed' not in eml.get_content_type():
-                                return_outputs(readable_output=data_to_md(inner_eml, attachment_file_name, file_name),
-                                               outputs=None)
-                        finally:
-                            os.remove(f.name)
-                    attachment_names.append(attachment_file_name)
+                            # In some cases the body content is empty and cannot be decoded.
+                            msg_info = base64.b64decode(msg).decode('utf-8')
+                        except TypeError:
+                            msg_info = str(msg)
+                        attached_emails.append(msg_info)
+                        if attachment_file_name is None:
+                            attachment_file_name = "unknown_file_name{}".format(i)
+                        demisto.results(fileResult(attachment_file_name, msg_info))
+                        attachment_names.append(attachment_file_name)
+                        i += 1
+
                 else:
-                    # .msg and other files (png, jpeg)
-                    if part.is_multipart() and max_depth - 1 > 0:
-                        # email is DSN
-                        msgs = part.get_payload()  # human-readable section
-                        i = 0
-                        for indiv_msg in msgs:
-                            msg = indiv_msg.get_payload()
-                            attachment_file_name = indiv_msg.get_filename()
-                            try:
-                                # In some cases the body content is empty and cannot be decoded.
-                                msg_info = base64.b64decode(msg).decode('utf-8')
-                            except TypeError:
-                                msg_info = str(msg)
-                            attached_emails.append(msg_info)
-                            if attachment_file_name is None:
-                                attachment_file_name = "unknown_file_name{}".format(i)
-                            demisto.results(fileResult(attachment_file_name, msg_info))
-                            attachment_names.append(attachment_file_name)
-                            i += 1
+                    file_content = part.get_payload(decode=True)
+                    file_entry = None
+                    # fileResult will return an error if file_content is None.
+                    if file_content:
+                        file_entry = fileResult(attachment_file_name, file_content)
+                        demisto.results(file_entry)
 
-                    else:
-                        file_content = part.get_payload(decode=True)
-                        # fileResult will return an error if file_content is None.
-                        if file_content:
-                            demisto.results(fileResult(attachment_file_name, file_content))
-
-                        if attachment_file_name.endswith(".msg") and max_depth - 1 > 0:
-                            f = tempfile.NamedTemporaryFile(delete=False)
-                            try:
-                                f.write(file_content)
-                                f.close()
-                                inner_msg, inner_attached_emails = handle_msg(f.name, attachment_file_name, False,
-                                                                              max_depth - 1)
-                                attached_emails.append(inner_msg)
-                                attached_emails.extend(inner_attached_emails)
-
-                                # will output the inner email to the UI
-                                return_outputs(
-                                    readable_output=data_to_md(inner_msg, attachment_file_name, file_name),
-                                    outputs=None)
-                            finally:
-                                os.remove(f.name)
+                    if file_entry and attachment_file_name.endswith(".msg") and max_depth - 1 > 0:
+                        # parse the msg from the war room file instead of writing another copy of it
+                        inner_msg, inner_attached_emails = handle_msg(get_file_result_path(file_entry),
+                                                                      attachment_file_name, False, max_depth - 1)
+                        attached_emails.append(inner_msg)
+                        attached_emails.extend(inner_attached_emails)
 
-                        attachment_names.append(attachment_file_name)
-                demisto.setContext('AttachmentName', attachment_file_name)
-
-            elif part.get_content_type() == 'text/html':
-                # This line replaces a new line that starts with `..` to a newline that starts with `.`
-                # This is because SMTP duplicate dots for lines that start with `.` and get_payload() doesn't format
-                # this correctly
-                part._payload = part._payload.replace('=\r\n..', '=\r\n.')
-                html = get_utf_string(decode_content(part), 'HTML')
-
-            elif part.get_content_type() == 'text/plain':
-                text = get_utf_string(decode_content(part), 'TEXT')
-        email_data = None
-        # if we are parsing a signed attachment there can be one of two options:
-        # 1. it is 'multipart/signed' so it is probably a wrapper and we can ignore the outer "email"
-        # 2. if it is 'multipart/signed' but has 'to' address so it is actually a real mail.
-        if 'multipart/signed' not in eml.get_content_type() \
-                or ('multipart/signed' in eml.get_content_type() and extract_address_eml(eml, 'to')):
-            email_data = {
-                'To': extract_address_eml(eml, 'to'),
-                'CC': extract_address_eml(eml, 'cc'),
-                'From': extract_address_eml(eml, 'from'),
-                'Subject': convert_to_unicode(eml['Subject']),
-                'HTML': convert_to_unicode(html),
-                'Text': convert_to_unicode(text),
-                'Headers': header_list,
-                'HeadersMap': headers_map,
-                'Attachments': ','.join(attachment_names) if attachment_names else '',
-                'AttachmentNames': attachment_names if attachment_names else [],
-                'Format': eml.get_content_type(),
-                'Depth': MAX_DEPTH_CONST - max_depth
-            }
-        return email_data, attached_emails
+                        # will output the inner email to the UI
+                        return_outputs(
+                            readable_output=data_to_md(inner_msg, attachment_file_name, file_name),
+                            outputs=None)
+
+                    attachment_names.append(attachment_file_name)
+            demisto.setContext('AttachmentName', attachment_file_name)
+
+        elif part.get_content_type() == 'text/html':
+            # This line replaces a new line that starts with `..` to a newline that starts with `.`
+            # This is because SMTP duplicate dots for lines that start with `.` and get_payload() doesn't format
+            # this correctly
+            part._payload = part._payload.replace('=\r\n..', '=\r\n.')
+            html = get_utf_string(decode_content(part), 'HTML')
+
+        elif part.get_content_type() == 'text/plain':
+            text = get_utf_string(decode_content(part), 'TEXT')
+    email_data = None
+    # if we are parsing a signed attachment there can be one of two options:
+    # 1. it is 'multipart/signed' so it is probably a wrapper and we can ignore the outer "email"
+    # 2. if it is 'multipart/signed' but has 'to' address so it is actually a real mail.
+    if 'multipart/signed' not in eml.get_content_type() \
+            or ('multipart/signed' in eml.get_content_type() and extract_address_eml(eml, 'to')):
+        email_data = {
+            'To': extract_address_eml(eml, 'to'),
+            'CC': extract_address_eml(eml, 'cc'),
+            'From': extract_address_eml(eml, 'from'),
+            'Subject': convert_to_unicode(eml['Subject']),
+            'HTML': convert_to_unicode(html),
+            'Text': convert_to_unicode(text),
+            'Headers': header_list,
+            'HeadersMap': headers_map,
+            'Attachments': ','.join(attachment_names) if attachment_names else '',
+            'AttachmentNames': attachment_names if attachment_names else [],
+            'Format': eml.get_content_type(),
+            'Depth': MAX_DEPTH_CONST - max_depth
+        }
+    return email_data, attached_emails
 
 
 def create_email_output(email_data, attached_emails):
@@ -899,3 +899,43 @@ def test_only_parts_of_object_email_saved(mocker):
     assert len(results) == 1
     assert results[0]['Type'] == entryTypes['note']
     assert results[0]['EntryContext']['Email']['AttachmentNames'] == ['logo5.png', 'logo2.png']
+
+
+def test_attached_eml_parsed_once(mocker):
+    """
+    Given:
+        an eml file with an attached eml (message/rfc822) that is not base64 encoded.
+    When:
+        parsing the email.
+    Then:
+        the attached email is parsed from the already parsed message, without re-parsing it from a file,
+        and its folded CC display name is not split into a separate address.
+    """
+    import ParseEmailFiles
+    mocker.patch.object(demisto, 'args', return_value={'entryid': 'test'})
+    mocker.patch.object(demisto, 'executeCommand', side_effect=exec_command_for_file('ParseEmailFiles-test-emls.eml'))
+    mocker.patch.object(demisto, 'results')
+    handle_eml_spy = mocker.spy(ParseEmailFiles, 'handle_eml')
+
+    main()
+
+    assert handle_eml_spy.call_count == 1
+    emails = demisto.results.call_args[0][0]['EntryContext']['Email']
+    assert emails[1]['CC'] == 'momo@demisto.com, momo@demisto.com'
+
+
+def test_parse_eml_file_bom():
+    """
+    Given:
+        an eml file that starts with a UTF-8 BOM.
+    When:
+        parsing the file with bom=True.
+    Then:
+        the BOM is skipped and the first header is parsed correctly.
+    """
+    from ParseEmailFiles import parse_eml_file
+    with open('test_data/utf_8_with_bom.eml', 'rb') as eml_file:
+        eml = parse_eml_file(eml_file, bom=True)
+    with open('test_data/utf_8_with_bom.eml', 'rb') as eml_file:
+        first_header = eml_file.read()[3:].split(':', 1)[0]
+    assert eml.keys()[0] == first_header
@@ -3,13 +3,19 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 
 import re
+import gzip
+import zlib
+import hashlib
+import socket
+import struct
 from base64 import b64decode
+from functools import partial
 from multiprocessing import Process
 from gevent.pywsgi import WSGIServer
 from tempfile import NamedTemporaryFile
 from flask import Flask, Response, request
-from netaddr import IPAddress, iprange_to_cidrs
-from typing import Callable, List, Any, Dict, cast, Tuple
+from netaddr import IPAddress
+from typing import Callable, List, Any, Dict, cast, Tuple, Optional, Iterable, Iterator
 from ssl import SSLContext, SSLError, PROTOCOL_TLSv1_2
 
 
@@ -25,6 +31,14 @@ PAGE_SIZE: int = 200
 DEMISTO_LOGGER: Handler = Handler()
 APP: Flask = Flask('demisto-edl')
 EDL_VALUES_KEY: str = 'dmst_edl_values'
+SUPPORTED_ENCODINGS: List[str] = ['gzip', 'deflate']
+# the rendered list of the last request and its encoded variants, kept in memory by the long running server
+CACHED_OUTPUT: Dict[str, Any] = {}
+# the time the output saved in the integration context was rendered at, the version of the in-memory output
+EDL_OUTPUT_TIME_KEY: str = 'last_output_time'
+EDL_INDEX_KEY: str = 'ioc_index'
+EDL_MODIFIED_TIME_FORMAT: str = '%Y-%m-%dT%H:%M:%SZ'
+EDL_FULL_REFRESH_INTERVAL: timedelta = timedelta(days=1)
 EDL_LIMIT_ERR_MSG: str = 'Please provide a valid integer for EDL Size'
 EDL_OFFSET_ERR_MSG: str = 'Please provide a valid integer for Starting Index'
 EDL_COLLAPSE_ERR_MSG: str = 'The Collapse parameter can only get the following: 0 - Dont Collapse, ' \
@@ -40,6 +54,11 @@ _INVALID_TOKEN_REMOVAL = re.compile(r'(?:[^\./+=\?&]+\*[^\./+=\?&]*)|(?:[^\./+=\
 DONT_COLLAPSE = "Don't Collapse"
 COLLAPSE_TO_CIDR = "To CIDRS"
 COLLAPSE_TO_RANGES = "To Ranges"
+_inet_pton_ipv4 = partial(socket.inet_pton, socket.AF_INET)
+_pack_ipv4 = struct.Struct('!I').pack
+# the indicators index of the incremental refresh, kept in memory by the long running server so the integration context
+# holds only the rendered EDL
+INCREMENTAL_INDEX: Dict[str, Any] = {}
 
 '''Request Arguments Class'''
 
@@ -113,15 +132,19 @@ def get_params_port(params: dict = demisto.params()) -> int:
     return port
 
 
-def refresh_edl_context(request_args: RequestArguments) -> str:
+def refresh_edl_context(request_args: RequestArguments, incremental_refresh: bool = False) -> str:
     """
     Refresh the cache values and format using an indicator_query to call demisto.searchIndicators
 
     Parameters:
         request_args: Request arguments
+        incremental_refresh: Whether to fetch only the indicators modified since the last refresh
 
     Returns: List(IoCs in output format)
     """
+    if incremental_refresh:
+        return refresh_edl_context_incremental(request_args)
+
     now = datetime.now()
     # poll indicators into edl from demisto
     iocs = find_indicators_to_limit(request_args.query, request_args.limit, request_args.offset)
@@ -145,10 +168,192 @@ def refresh_edl_context(request_args: RequestArguments) -> str:
         # reformat the output
         out_dict, actual_indicator_amount = create_values_for_returned_dict(iocs, request_args)
 
+    set_edl_context(out_dict, request_args, now, iocs)
+    return out_dict[EDL_VALUES_KEY]
+
+
+def set_edl_context(out_dict: dict, request_args: RequestArguments, now: datetime, iocs: Optional[list] = None):
+    """
+    Saves the rendered EDL in the integration context, with the request arguments and the time it was refreshed at
+
+    Parameters:
+        out_dict: The rendered EDL values
+        request_args: Request arguments
+        now: The time of the refresh
+        iocs: The raw IoCs the EDL was rendered from, used to render it again for other request arguments
+    """
     out_dict["last_run"] = date_to_timestamp(now)
-    out_dict["current_iocs"] = iocs
+    out_dict["current_iocs"] = iocs or []
+    out_dict[EDL_OUTPUT_TIME_KEY] = get_output_time(now)
+    out_dict.update(create_request_context(request_args))
     demisto.setIntegrationContext(out_dict)
-    return out_dict[EDL_VALUES_KEY]
+
+
+def get_output_time(now: datetime) -> int:
+    """
+    Returns the time the output is rendered at in milliseconds, unlike date_to_timestamp it keeps the milliseconds
+    so outputs rendered in the same second get different versions
+    """
+    return int(now.timestamp() * 1000)
+
+
+def create_request_context(request_args: RequestArguments) -> dict:
+    """
+    Creates the request arguments saved in the integration context on refresh, to detect request changes
+    """
+    return {
+        'last_query': request_args.query,
+        'last_limit': request_args.limit,
+        'last_offset': request_args.offset,
+        'drop_invalids': request_args.drop_invalids,
+        'url_port_stripping': request_args.url_port_stripping,
+        'collapse_ips': request_args.collapse_ips
+    }
+
+
+def refresh_edl_context_incremental(request_args: RequestArguments) -> str:
+    """
+    Refresh the cache values by merging only the indicators matching the query which were modified since the last
+    refresh into the indicators index kept in memory, and re-rendering the EDL from the formatted values kept in the
+    index. Like a full refresh, the EDL holds the indicators the query returns.
+    The index is fully rebuilt on the first run, when the request arguments change, once a day, and when the total
+    amount of indicators matching the query shows that indicators stopped matching it.
+
+    Parameters:
+        request_args: Request arguments
+
+    Returns: List(IoCs in output format)
+    """
+    now = datetime.now()
+    modified_from = datetime.utcnow().strftime(EDL_MODIFIED_TIME_FORMAT)
+    request_context = create_request_context(request_args)
+
+    full_refresh = INCREMENTAL_INDEX.get('request') != request_context or \
+        date_to_timestamp(now - EDL_FULL_REFRESH_INTERVAL) > INCREMENTAL_INDEX.get('last_full_refresh', 0)
+
+    changed = False
+    if not full_refresh:
+        changed, added_amount = update_ioc_index(INCREMENTAL_INDEX[EDL_INDEX_KEY], request_args,
+                                                 INCREMENTAL_INDEX['last_modified'])
+        total = count_search_indicators(request_args.query)
+        # indicators which stopped matching the query are not returned by the search, but are not in the total
+        full_refresh = total != INCREMENTAL_INDEX['total'] + added_amount
+        INCREMENTAL_INDEX['total'] = total
+
+    if full_refresh:
+        INCREMENTAL_INDEX.clear()
+        INCREMENTAL_INDEX.update({
+            EDL_INDEX_KEY: build_ioc_index(request_args),
+            'total': count_search_indicators(request_args.query),
+            'last_full_refresh': date_to_timestamp(now),
+            'request': request_context
+        })
+        changed = True
+
+    INCREMENTAL_INDEX['last_modified'] = modified_from
+    INCREMENTAL_INDEX['last_run'] = date_to_timestamp(now)
+    if changed:
+        rendered_iocs = [(ioc_type, values) for ioc_type, values in INCREMENTAL_INDEX[EDL_INDEX_KEY].values() if values]
+        out_dict, _ = render_edl_values(
+            rendered_iocs[request_args.offset:request_args.offset + request_args.limit], request_args)
+        INCREMENTAL_INDEX[EDL_VALUES_KEY] = out_dict[EDL_VALUES_KEY]
+        set_edl_context(out_dict, request_args, now)
+
+    return INCREMENTAL_INDEX[EDL_VALUES_KEY]
+
+
+def build_ioc_index(request_args: RequestArguments) -> dict:
+    """
+    Builds the indicators index from the indicators matching the query, stopping once it holds the requested
+    amount of values
+
+    Parameters:
+        request_args: Request arguments
+
+    Returns:
+        dict: The index, mapping each indicator value to its type and formatted values
+    """
+    ioc_index: Dict[str, list] = {}
+    rendered_amount = 0
+    for ioc in iter_search_indicators(request_args.query):
+        value = ioc.get('value')
+        if not value:
+            continue
+
+        ioc_index[value] = create_ioc_index_entry(ioc, request_args)
+        if ioc_index[value][1]:
+            rendered_amount += 1
+            if rendered_amount >= request_args.limit + request_args.offset:
+                break
+
+    return ioc_index
+
+
+def update_ioc_index(ioc_index: dict, request_args: RequestArguments, modified_from: str) -> Tuple[bool, int]:
+    """
+    Merges the indicators matching the query which were modified since the given time into the index
+
+    Parameters:
+        ioc_index: The indicators index
+        request_args: Request arguments
+        modified_from: The time (in EDL_MODIFIED_TIME_FORMAT) to fetch the modified indicators from
+
+    Returns:
+        (tuple): Whether the index was changed, and the amount of indicators added to it
+    """
+    changed = False
+    added_amount = 0
+    for ioc in iter_search_indicators(get_modified_query(request_args.query, modified_from)):
+        value = ioc.get('value')
+        if not value:
+            continue
+
+        entry = create_ioc_index_entry(ioc, request_args)
+        if value not in ioc_index:
+            added_amount += 1
+
+        if ioc_index.get(value) != entry:
+            ioc_index[value] = entry
+            changed = True
+
+    return changed, added_amount
+
+
+def get_modified_query(indicator_query: str, modified_from: str) -> str:
+    """
+    Returns the query of the indicators matching the indicator query which were modified since the given time
+    """
+    modified_query = f'modified:>="{modified_from}"'
+    return f'({indicator_query}) and {modified_query}' if indicator_query else modified_query
+
+
+def create_ioc_index_entry(ioc: dict, request_args: RequestArguments) -> list:
+    """
+    Creates the index entry of an indicator: [indicator type, formatted values]
+    """
+    return [ioc.get('indicator_type'), format_indicator(ioc, request_args)]
+
+
+def count_search_indicators(indicator_query: str) -> int:
+    """
+    Returns the total amount of indicators matching the query, fetching a single indicator
+    """
+    return demisto.searchIndicators(query=indicator_query, page=0, size=1).get('total') or 0
+
+
+def iter_search_indicators(indicator_query: str) -> Iterator[dict]:
+    """
+    Yields all the indicators matching the query using demisto.searchIndicators, page by page
+    """
+    next_page = 0
+    while True:
+        fetched_iocs = demisto.searchIndicators(query=indicator_query, page=next_page, size=PAGE_SIZE).get('iocs')
+        # In case the result from searchIndicators includes the key `iocs` but it's value is None
+        fetched_iocs = fetched_iocs or []
+        yield from fetched_iocs
+        if len(fetched_iocs) < PAGE_SIZE:
+            return
+        next_page += 1
 
 
 def find_indicators_to_limit(indicator_query: str, limit: int, offset: int = 0) -> list:
@@ -214,155 +419,195 @@ def find_indicators_to_limit_loop(indicator_query: str, limit: int, total_fetche
     return iocs, next_page
 
 
-def ip_groups_to_cidrs(ip_range_groups: list):
-    """Collapse ip groups list to CIDRs
+def ip_to_int(ip: Any) -> Tuple[int, int]:
+    """Converts an IP to its version and integer value.
 
     Args:
-        ip_range_groups (list): a list of lists containing connected IPs
+        ip (str/IPAddress): an IP string or a netaddr IPAddress.
 
     Returns:
-        list. a list of CIDRs.
+        tuple. the IP version (4 or 6) and the integer value of the IP.
     """
-    ip_ranges = []  # type:List
-    for group in ip_range_groups:
-        # handle single ips
-        if len(group) == 1:
-            ip_ranges.append(str(group[0]))
-            continue
+    if isinstance(ip, str):
+        try:
+            if ':' in ip:
+                return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), 'big')
+            return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+        except (OSError, ValueError):
+            # fallback to netaddr for the less common IP notations it supports
+            pass
 
-        min_ip = group[0]
-        max_ip = group[-1]
-        moved_ip = False
-        # CIDR must begin with an even LSB
-        # if the first ip does not - separate it from the rest of the range
-        if (int(str(min_ip).split('.')[-1]) % 2) != 0:
-            ip_ranges.append(str(min_ip))
-            min_ip = group[1]
-            moved_ip = True
-
-        # CIDR must end with uneven LSB
-        # if the last ip does not - separate it from the rest of the range
-        if (int(str(max_ip).split('.')[-1]) % 2) == 0:
-            ip_ranges.append(str(max_ip))
-            max_ip = group[-2]
-            moved_ip = True
-
-        # if both min and max ips were shifted and there are only 2 ips in the range
-        # we added both ips by the shift and now we move to the next  range
-        if moved_ip and len(group) == 2:
-            continue
+    ip = IPAddress(ip)
+    return ip.version, int(ip)
 
-        else:
-            ip_ranges.append(str(iprange_to_cidrs(min_ip, max_ip)[0].cidr))
 
-    return ip_ranges
+def int_to_ip(version: int, value: int) -> str:
+    """Converts an integer value of an IP back to its string representation.
+
+    Args:
+        version (int): the IP version (4 or 6).
+        value (int): the integer value of the IP.
+
+    Returns:
+        str. the IP string.
+    """
+    if version == 4:
+        return socket.inet_ntoa(_pack_ipv4(value))
+    return str(IPAddress(value, 6))
 
 
-def ip_groups_to_ranges(ip_range_groups: list):
-    """Collapse ip groups list to ranges.
+def ips_to_int_ranges(ips: list) -> Dict[int, List[Tuple[int, int]]]:
+    """Sorts the IPs once and merges consecutive IPs to ranges of integers.
 
     Args:
-        ip_range_groups (list): a list of lists containing connected IPs
+        ips (list): a list of IP strings or netaddr IPAddresses.
 
     Returns:
-        list. a list of Ranges.
+        dict. a mapping of IP version to a sorted list of disjoint (start, end) integer ranges.
     """
-    ip_ranges = []  # type:List
-    for group in ip_range_groups:
-        # handle single ips
-        if len(group) == 1:
-            ip_ranges.append(str(group[0]))
-            continue
+    values_by_version = {4: [], 6: []}  # type:Dict[int, List[int]]
+    try:
+        # fast path - the IPs are usually all IPv4 strings, convert them at once
+        values_by_version[4].extend(struct.unpack(f'!{len(ips)}I', b''.join(map(_inet_pton_ipv4, ips))))
+        other_ips = []  # type:List
+    except (OSError, TypeError):
+        ipv4_ips = []
+        other_ips = []
+        for ip in ips:
+            (ipv4_ips if isinstance(ip, str) and ':' not in ip else other_ips).append(ip)
+        try:
+            values_by_version[4].extend(struct.unpack(f'!{len(ipv4_ips)}I', b''.join(map(_inet_pton_ipv4, ipv4_ips))))
+        except OSError:
+            other_ips.extend(ipv4_ips)
+
+    for ip in other_ips:
+        version, value = ip_to_int(ip)
+        values_by_version[version].append(value)
+
+    ranges_by_version = {}  # type:Dict[int, List[Tuple[int, int]]]
+    for version, values in values_by_version.items():
+        ranges = []  # type:List[Tuple[int, int]]
+        if values:
+            values.sort()
+            start = end = values[0]
+            for value in values:
+                if value > end + 1:
+                    ranges.append((start, end))
+                    start = value
+                end = value
+            ranges.append((start, end))
+        ranges_by_version[version] = ranges
+
+    return ranges_by_version
+
+
+def int_range_to_cidrs(version: int, start: int, end: int) -> List[str]:
+    """Covers a range of IPs with the minimal amount of CIDRs.
+
+    Args:
+        version (int): the IP version (4 or 6).
+        start (int): the integer value of the first IP in the range.
+        end (int): the integer value of the last IP in the range.
+
+    Returns:
+        list. a list of CIDRs, single IPs are returned without a prefix length.
+    """
+    max_prefix_len = 32 if version == 4 else 128
+    cidrs = []
+    while start <= end:
+        # the largest block which is aligned to the start of the range and does not exceed its end
+        block_size = (start & -start) or (1 << max_prefix_len)
+        while block_size > end - start + 1:
+            block_size >>= 1
 
-        min_ip = group[0]
-        max_ip = group[-1]
-        ip_ranges.append(str(min_ip) + "-" + str(max_ip))
+        prefix_len = max_prefix_len - block_size.bit_length() + 1
+        ip = int_to_ip(version, start)
+        cidrs.append(ip if prefix_len == max_prefix_len else f'{ip}/{prefix_len}')
+        start += block_size
 
-    return ip_ranges
+    return cidrs
 
 
 def ips_to_ranges(ips: list, collapse_ips):
     """Collapse IPs to Ranges or CIDRs.
 
     Args:
-        ips (list): a list of IP strings.
+        ips (list): a list of IP strings or netaddr IPAddresses.
         collapse_ips (str): Whether to collapse to Ranges or CIDRs.
 
     Returns:
         list. a list to Ranges or CIDRs.
     """
-    ips_range_groups = []  # type:List
-    ips = sorted(ips)
-
-    if len(ips) > 0:
-        ips_range_groups.append([ips[0]])
-
-    if len(ips) > 1:
-        for ip in ips[1:]:
-            appended = False
-
-            for group in ips_range_groups:
-                if IPAddress(int(ip) + 1) in group or IPAddress(int(ip) - 1) in group:
-                    group.append(ip)
-                    sorted(group)
-                    appended = True
+    ip_ranges = []  # type:List
+    inet_ntoa = socket.inet_ntoa
+    for version, ranges in ips_to_int_ranges(ips).items():
+        for start, end in ranges:
+            if start == end:
+                # inlined for IPv4 - most of the IPs of a large list are not collapsed
+                ip_ranges.append(inet_ntoa(_pack_ipv4(start)) if version == 4 else int_to_ip(version, start))
 
-            if not appended:
-                ips_range_groups.append([ip])
+            elif collapse_ips == COLLAPSE_TO_RANGES:
+                ip_ranges.append(int_to_ip(version, start) + "-" + int_to_ip(version, end))
 
-    if collapse_ips == COLLAPSE_TO_RANGES:
-        return ip_groups_to_ranges(ips_range_groups)
+            else:
+                ip_ranges.extend(int_range_to_cidrs(version, start, end))
 
-    else:
-        return ip_groups_to_cidrs(ips_range_groups)
+    return ip_ranges
 
 
-def create_values_for_returned_dict(iocs: list, request_args: RequestArguments) -> Tuple[dict, int]:
+def format_indicator(ioc: dict, request_args: RequestArguments) -> List[str]:
     """
-    Create a dictionary for output values
+    Formats a single IoC to its EDL values, returns an empty list if the IoC should be dropped
+    """
+    indicator = ioc.get('value')
+    if not indicator:
+        return []
+    # protocol stripping
+    indicator = _PROTOCOL_REMOVAL.sub('', indicator)
+
+    # Port stripping
+    indicator_with_port = indicator
+    # remove port from indicator - from demisto.com:369/rest/of/path -> demisto.com/rest/of/path
+    indicator = _PORT_REMOVAL.sub(_URL_WITHOUT_PORT, indicator)
+    # check if removing the port changed something about the indicator
+    if indicator != indicator_with_port and not request_args.url_port_stripping:
+        # if port was in the indicator and url_port_stripping param not set - ignore the indicator
+        return []
+    # Reformatting to to PAN-OS URL format
+    with_invalid_tokens_indicator = indicator
+    # mix of text and wildcard in domain field handling
+    indicator = _INVALID_TOKEN_REMOVAL.sub('*', indicator)
+    # check if the indicator held invalid tokens
+    if with_invalid_tokens_indicator != indicator:
+        # invalid tokens in indicator- if drop_invalids is set - ignore the indicator
+        if request_args.drop_invalids:
+            return []
+    # for PAN-OS *.domain.com does not match domain.com
+    # we should provide both
+    # this could generate more than num entries according to PAGE_SIZE
+    if indicator.startswith('*.'):
+        return [indicator.lstrip('*.'), indicator]
+
+    return [indicator]
+
+
+def render_edl_values(formatted_iocs: Iterable[Tuple[str, List[str]]],
+                      request_args: RequestArguments) -> Tuple[dict, int]:
+    """
+    Create a dictionary for output values from the indicator types and formatted values of the IoCs
     """
     formatted_indicators = []
     ipv4_formatted_indicators = []
     ipv6_formatted_indicators = []
-    for ioc in iocs:
-        indicator = ioc.get('value')
-        if not indicator:
-            continue
-        ioc_type = ioc.get('indicator_type')
-        # protocol stripping
-        indicator = _PROTOCOL_REMOVAL.sub('', indicator)
-
-        # Port stripping
-        indicator_with_port = indicator
-        # remove port from indicator - from demisto.com:369/rest/of/path -> demisto.com/rest/of/path
-        indicator = _PORT_REMOVAL.sub(_URL_WITHOUT_PORT, indicator)
-        # check if removing the port changed something about the indicator
-        if indicator != indicator_with_port and not request_args.url_port_stripping:
-            # if port was in the indicator and url_port_stripping param not set - ignore the indicator
-            continue
-        # Reformatting to to PAN-OS URL format
-        with_invalid_tokens_indicator = indicator
-        # mix of text and wildcard in domain field handling
-        indicator = _INVALID_TOKEN_REMOVAL.sub('*', indicator)
-        # check if the indicator held invalid tokens
-        if with_invalid_tokens_indicator != indicator:
-            # invalid tokens in indicator- if drop_invalids is set - ignore the indicator
-            if request_args.drop_invalids:
-                continue
-        # for PAN-OS *.domain.com does not match domain.com
-        # we should provide both
-        # this could generate more than num entries according to PAGE_SIZE
-        if indicator.startswith('*.'):
-            formatted_indicators.append(indicator.lstrip('*.'))
-
+    for ioc_type, values in formatted_iocs:
         if request_args.collapse_ips != DONT_COLLAPSE and ioc_type == 'IP':
-            ipv4_formatted_indicators.append(IPAddress(indicator))
+            ipv4_formatted_indicators.extend(values)
 
         elif request_args.collapse_ips != DONT_COLLAPSE and ioc_type == 'IPv6':
-            ipv6_formatted_indicators.append(IPAddress(indicator))
+            ipv6_formatted_indicators.extend(values)
 
         else:
-            formatted_indicators.append(indicator)
+            formatted_indicators.extend(values)
 
     if len(ipv4_formatted_indicators) > 0:
         ipv4_formatted_indicators = ips_to_ranges(ipv4_formatted_indicators, request_args.collapse_ips)
@@ -374,10 +619,19 @@ def create_values_for_returned_dict(iocs: list, request_args: RequestArguments)
     return {EDL_VALUES_KEY: list_to_str(formatted_indicators, '\n')}, len(formatted_indicators)
 
 
+def create_values_for_returned_dict(iocs: list, request_args: RequestArguments) -> Tuple[dict, int]:
+    """
+    Create a dictionary for output values
+    """
+    return render_edl_values(((ioc.get('indicator_type'), format_indicator(ioc, request_args)) for ioc in iocs),
+                             request_args)
+
+
 def get_edl_ioc_values(on_demand: bool,
                        request_args: RequestArguments,
                        integration_context: dict,
-                       cache_refresh_rate: str = None) -> str:
+                       cache_refresh_rate: str = None,
+                       incremental_refresh: bool = False) -> str:
     """
     Get the ioc list to return in the edl
 
@@ -386,34 +640,54 @@ def get_edl_ioc_values(on_demand: bool,
         request_args: the request arguments
         integration_context: The integration context
         cache_refresh_rate: The cache_refresh_rate configuration value
+        incremental_refresh: Whether to refresh only the indicators modified since the last refresh
 
     Returns:
         string representation of the iocs
     """
-    last_run = integration_context.get('last_run')
-    last_query = integration_context.get('last_query')
-    current_iocs = integration_context.get('current_iocs')
-
     # on_demand ignores cache
     if on_demand:
         if request_args.is_request_change(integration_context):
+            current_iocs = integration_context.get('current_iocs')
             values_str = get_ioc_values_str_from_context(integration_context, request_args=request_args, iocs=current_iocs)
 
         else:
             values_str = get_ioc_values_str_from_context(integration_context, request_args=request_args)
     else:
-        if last_run:
-            cache_time, _ = parse_date_range(cache_refresh_rate, to_timestamp=True)
-            if last_run <= cache_time or request_args.is_request_change(integration_context) or \
-                    request_args.query != last_query:
-                values_str = refresh_edl_context(request_args)
-            else:
-                values_str = get_ioc_values_str_from_context(integration_context, request_args=request_args)
+        if is_edl_stale(integration_context, request_args, cache_refresh_rate, incremental_refresh):
+            values_str = refresh_edl_context(request_args, incremental_refresh)
         else:
-            values_str = refresh_edl_context(request_args)
+            values_str = get_ioc_values_str_from_context(integration_context, request_args=request_args)
     return values_str
 
 
+def is_edl_stale(integration_context: dict, request_args: RequestArguments, cache_refresh_rate: Optional[str],
+                 incremental_refresh: bool = False) -> bool:
+    """
+    Checks whether the EDL should be refreshed
+
+    Args:
+        integration_context: The integration context, or the part of it kept with the in-memory output
+        request_args: the request arguments
+        cache_refresh_rate: The cache_refresh_rate configuration value
+        incremental_refresh: Whether the EDL is refreshed incrementally
+
+    Returns:
+        Whether the refresh rate elapsed since the last refresh or the request arguments changed
+    """
+    last_run = integration_context.get('last_run')
+    if not last_run or request_args.is_request_change(integration_context) or \
+            request_args.query != integration_context.get('last_query'):
+        return True
+
+    if incremental_refresh:
+        # an incremental refresh with no changes does not update the integration context
+        last_run = max(last_run, INCREMENTAL_INDEX.get('last_run', 0))
+
+    cache_time, _ = parse_date_range(cache_refresh_rate, to_timestamp=True)
+    return last_run <= cache_time
+
+
 def get_ioc_values_str_from_context(integration_context: dict,
                                     request_args: RequestArguments,
                                     iocs: list = None) -> str:
@@ -434,10 +708,12 @@ def get_ioc_values_str_from_context(integration_context: dict,
         iocs = iocs[request_args.offset: request_args.limit + request_args.offset]
         returned_dict, _ = create_values_for_returned_dict(iocs, request_args=request_args)
         integration_context['last_output'] = returned_dict
+        integration_context[EDL_OUTPUT_TIME_KEY] = get_output_time(datetime.now())
         demisto.setIntegrationContext(integration_context)
 
     else:
-        returned_dict = integration_context.get('last_output', {})
+        # a full refresh saves the values at the top level of the integration context
+        returned_dict = integration_context.get('last_output') or integration_context
 
     return returned_dict.get(EDL_VALUES_KEY, '')
 
@@ -475,6 +751,120 @@ def validate_basic_authentication(headers: dict, username: str, password: str) -
     return user == username and pwd == password
 
 
+def get_cached_output(values: str, integration_context: dict) -> dict:
+    """
+    Returns the in-memory cache of the rendered list. The cache is versioned by the time the values were rendered at,
+    saved in the integration context, and is reset when the values are rendered again.
+
+    Args:
+        values: The rendered list values
+        integration_context: The integration context the values were read from
+
+    Returns:
+        The cached output, holding the values, their ETag, their modification time, their encoded variants and the
+        integration context keys needed to check whether the EDL should be refreshed
+    """
+    output_time = integration_context.get(EDL_OUTPUT_TIME_KEY)
+    # the values are the version of a context saved without the output time
+    version = output_time or values
+    if CACHED_OUTPUT.get('version') != version:
+        CACHED_OUTPUT.clear()
+        CACHED_OUTPUT.update({
+            'version': version,
+            'values': values,
+            'etag': hashlib.sha1(values.encode('utf-8')).hexdigest(),  # nosec
+            'last_modified': datetime.utcfromtimestamp(output_time // 1000) if output_time else
+            datetime.utcnow().replace(microsecond=0),
+            'encoded': {}
+        })
+    CACHED_OUTPUT['context'] = {key: integration_context.get(key) for key in
+                                ['last_run', 'last_query', 'last_limit', 'last_offset', 'drop_invalids',
+                                 'url_port_stripping', 'collapse_ips']}
+    return CACHED_OUTPUT
+
+
+def get_edl_output(params: dict, request_args: RequestArguments) -> dict:
+    """
+    Returns the in-memory cached output of the EDL, refreshing the EDL when needed. The integration context is read
+    only when the EDL may need a refresh, or in On-Demand mode, where the EDL is updated by another process.
+
+    Args:
+        params: The integration parameters
+        request_args: the request arguments
+
+    Returns:
+        The cached output
+    """
+    on_demand = params.get('on_demand')
+    cache_refresh_rate = params.get('cache_refresh_rate')
+    incremental_refresh = argToBoolean(params.get('incremental_refresh', False))
+    if not on_demand and CACHED_OUTPUT and not is_edl_stale(CACHED_OUTPUT['context'], request_args,
+                                                            cache_refresh_rate, incremental_refresh):
+        return CACHED_OUTPUT
+
+    integration_context = demisto.getIntegrationContext()
+    values = get_edl_ioc_values(
+        on_demand=on_demand,
+        request_args=request_args,
+        integration_context=integration_context,
+        cache_refresh_rate=cache_refresh_rate,
+        incremental_refresh=incremental_refresh,
+    )
+    if not on_demand:
+        # a refresh saves a new integration context
+        integration_context = demisto.getIntegrationContext()
+    return get_cached_output(values, integration_context)
+
+
+def get_encoded_values(cached_output: dict, encoding: str) -> bytes:
+    """
+    Returns the cached values in the given content encoding, encoding them once per values change
+
+    Args:
+        cached_output: The cached output
+        encoding: The content encoding - identity, gzip or deflate
+
+    Returns:
+        The encoded values
+    """
+    encoded = cached_output['encoded']
+    if encoding not in encoded:
+        data = cached_output['values'].encode('utf-8')
+        if encoding == 'gzip':
+            data = gzip.compress(data)
+
+        elif encoding == 'deflate':
+            data = zlib.compress(data)
+
+        encoded[encoding] = data
+    return encoded[encoding]
+
+
+def create_values_response(cached_output: dict, mimetype: str) -> Response:
+    """
+    Creates the response of the list values, compressed according to the client's Accept-Encoding header.
+    Conditional (If-None-Match, If-Modified-Since) requests are answered with 304 when the values did not change,
+    and Range requests are answered with the requested part of the values.
+
+    Args:
+        cached_output: The cached output of the list
+        mimetype: The mimetype of the values
+
+    Returns:
+        The flask response
+    """
+    encoding = request.accept_encodings.best_match(SUPPORTED_ENCODINGS) or 'identity'
+    data = get_encoded_values(cached_output, encoding)
+    response = Response(data, status=200, mimetype=mimetype)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f'{cached_output["etag"]}-{encoding}')
+    response.last_modified = cached_output['last_modified']
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+
 ''' ROUTE FUNCTIONS '''
 
 
@@ -496,14 +886,7 @@ def route_edl_values() -> Response:
             return Response(err_msg, status=401)
 
     request_args = get_request_args(request.args, params)
-
-    values = get_edl_ioc_values(
-        on_demand=params.get('on_demand'),
-        request_args=request_args,
-        integration_context=demisto.getIntegrationContext(),
-        cache_refresh_rate=params.get('cache_refresh_rate'),
-    )
-    return Response(values, status=200, mimetype='text/plain')
+    return create_values_response(get_edl_output(params, request_args), mimetype='text/plain')
 
 
 def get_request_args(request_args: dict, params: dict) -> RequestArguments:
@@ -654,6 +1037,7 @@ def update_edl_command(args, params):
     drop_invalids = args.get('drop_invalids', '').lower() == 'true'
     offset = try_parse_integer(args.get('offset', 0), EDL_OFFSET_ERR_MSG)
     request_args = RequestArguments(query, limit, offset, url_port_stripping, drop_invalids, collapse_ips)
+    # every command runs in its own process, where the in-memory index of an incremental refresh is never reused
     indicators = refresh_edl_context(request_args)
     hr = tableToMarkdown('EDL was updated successfully with the following values', indicators,
                          ['Indicators']) if print_indicators == 'true' else 'EDL was updated successfully'
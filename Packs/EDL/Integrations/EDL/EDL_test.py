@@ -2,6 +2,7 @@
 import json
 import pytest
 import demistomock as demisto
+from CommonServerPython import date_to_timestamp, datetime
 from netaddr import IPAddress
 
 IOC_RES_LEN = 38
@@ -272,3 +273,293 @@ class TestHelperFunctions:
         assert "1.1.1.3" not in ip_range_list
         assert "2.2.2.2" in ip_range_list
         assert "25.24.23.22" in ip_range_list
+
+    @pytest.mark.ips_to_cidrs
+    def test_ips_to_ranges_minimal_cidr_cover(self):
+        """
+        Given
+            - A range of IPs which can not be covered by a single CIDR.
+        When
+            - Collapsing the IPs to CIDRs.
+        Then
+            - Ensure the range is covered by the minimal set of CIDRs.
+        """
+        from EDL import ips_to_ranges, COLLAPSE_TO_CIDR
+        ip_list = [f'1.1.1.{i}' for i in range(1, 19)] + ['1.1.1.5', '10.0.0.0']
+
+        ip_range_list = ips_to_ranges(ip_list, COLLAPSE_TO_CIDR)
+        assert ip_range_list == ['1.1.1.1', '1.1.1.2/31', '1.1.1.4/30', '1.1.1.8/29', '1.1.1.16/31', '1.1.1.18',
+                                 '10.0.0.0']
+
+    @pytest.mark.ips_to_cidrs
+    def test_ips_to_ranges_cidr_matches_netaddr(self):
+        """
+        Given
+            - Random blocks of consecutive IPv4 and IPv6 addresses.
+        When
+            - Collapsing the IPs to CIDRs.
+        Then
+            - Ensure the result is the same as merging the IPs with netaddr.
+        """
+        import random
+        from netaddr import cidr_merge
+        from EDL import ips_to_ranges, COLLAPSE_TO_CIDR
+        random.seed(0)
+        ip_list = []
+        for _ in range(50):
+            start = random.randrange(0, 2 ** 32 - 100)
+            ip_list.extend(str(IPAddress(start + i, 4)) for i in range(random.randrange(1, 100)))
+            start = random.randrange(0, 2 ** 128 - 100)
+            ip_list.extend(str(IPAddress(start + i, 6)) for i in range(random.randrange(1, 100)))
+
+        expected = [str(cidr.ip) if cidr.size == 1 else str(cidr) for cidr in cidr_merge(ip_list)]
+        assert sorted(ips_to_ranges(ip_list, COLLAPSE_TO_CIDR)) == sorted(expected)
+
+    @pytest.mark.ips_to_ranges
+    def test_ips_to_ranges_large_list(self):
+        """
+        Given
+            - 200k shuffled IPv4 addresses of random blocks and single IPs, a few of them as netaddr IPAddresses.
+        When
+            - Collapsing the IPs to Ranges and to CIDRs.
+        Then
+            - Ensure the ranges are exactly the runs of consecutive IPs and the CIDRs cover the same runs.
+        """
+        import random
+        import socket
+        import struct
+        from EDL import ips_to_ranges, COLLAPSE_TO_RANGES, COLLAPSE_TO_CIDR
+        random.seed(0)
+        values = set()  # type: set
+        while len(values) < 200000:
+            start = random.randrange(0, 2 ** 32 - 300)
+            values.update(range(start, start + random.choice([1, 1, 1, random.randrange(2, 300)])))
+        ip_list = [socket.inet_ntoa(struct.pack('!I', value)) for value in values]
+        random.shuffle(ip_list)
+        ip_list[:10] = [IPAddress(ip) for ip in ip_list[:10]]
+
+        expected_runs = []
+        for value in sorted(values):
+            if expected_runs and value == expected_runs[-1][1] + 1:
+                expected_runs[-1][1] = value
+            else:
+                expected_runs.append([value, value])
+
+        def ip_value(ip):
+            return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+        runs = []
+        for ip_range in ips_to_ranges(ip_list, COLLAPSE_TO_RANGES):
+            start, _, end = ip_range.partition('-')
+            runs.append([ip_value(start), ip_value(end or start)])
+        assert runs == expected_runs
+
+        runs = []
+        for cidr in ips_to_ranges(ip_list, COLLAPSE_TO_CIDR):
+            ip, _, prefix_len = cidr.partition('/')
+            start = ip_value(ip)
+            end = start + 2 ** (32 - int(prefix_len or 32)) - 1
+            if runs and start == runs[-1][1] + 1:
+                runs[-1][1] = end
+            else:
+                runs.append([start, end])
+        assert runs == expected_runs
+
+    @pytest.mark.ips_to_ranges
+    def test_ips_to_ranges_ipv6(self):
+        from EDL import ips_to_ranges, COLLAPSE_TO_RANGES, COLLAPSE_TO_CIDR
+        ip_list = ['2001:db8::1', '2001:db8::3', '2001:db8::2', '2001:db8::4', '2001:db8::10']
+
+        assert ips_to_ranges(ip_list, COLLAPSE_TO_RANGES) == ['2001:db8::1-2001:db8::4', '2001:db8::10']
+        assert ips_to_ranges(ip_list, COLLAPSE_TO_CIDR) == ['2001:db8::1', '2001:db8::2/127', '2001:db8::4',
+                                                            '2001:db8::10']
+
+    @pytest.mark.refresh_edl_context
+    def test_refresh_edl_context_incremental_full_refresh(self, mocker):
+        """
+        Given
+            - No indicators index in memory.
+        When
+            - Running an incremental refresh.
+        Then
+            - Ensure the indicators index is built from the indicators the query returns, the EDL is rendered from it
+              and only the rendered EDL is saved in the integration context.
+        """
+        import EDL as edl
+        iocs = [{'value': '1.1.1.1', 'indicator_type': 'IP'},
+                {'value': 'https://www.demisto.com:8080/cool', 'indicator_type': 'URL'},
+                {'value': '2.2.2.2', 'indicator_type': 'IP', 'expirationStatus': 'expired'}]
+        mocker.patch.object(edl, 'INCREMENTAL_INDEX', {})
+        mocker.patch.object(demisto, 'searchIndicators', return_value={'iocs': iocs, 'total': 3})
+        set_context = mocker.patch.object(demisto, 'setIntegrationContext')
+        request_args = edl.RequestArguments(query='type:IP', limit=10)
+
+        edl_vals = edl.refresh_edl_context(request_args, incremental_refresh=True)
+
+        assert edl_vals == '1.1.1.1\n2.2.2.2'
+        assert list(edl.INCREMENTAL_INDEX[edl.EDL_INDEX_KEY].keys()) == ['1.1.1.1', 'https://www.demisto.com:8080/cool',
+                                                                         '2.2.2.2']
+        assert edl.INCREMENTAL_INDEX['total'] == 3
+        integration_context = set_context.call_args[0][0]
+        assert integration_context[edl.EDL_VALUES_KEY] == edl_vals
+        assert integration_context['last_query'] == 'type:IP'
+        assert edl.EDL_INDEX_KEY not in integration_context
+
+    @pytest.mark.refresh_edl_context
+    def test_refresh_edl_context_incremental_matches_full(self, mocker):
+        """
+        Given
+            - Indicators matching the query, some of which are added, stop matching it or start matching it.
+        When
+            - Running incremental refreshes after each change.
+        Then
+            - Ensure every search is scoped to the query, the EDL equals the EDL of a full refresh after each change,
+              and the index is rebuilt only when indicators stopped matching the query.
+        """
+        import EDL as edl
+        mocker.patch.object(edl, 'INCREMENTAL_INDEX', {})
+        mocker.patch.object(edl, 'PAGE_SIZE', 200)
+        mocker.patch.object(demisto, 'setIntegrationContext')
+        indicators = {value: {'value': value, 'indicator_type': 'IP', 'score': 3, 'modified': '2020-01-01T00:00:00Z'}
+                      for value in ['1.1.1.1', '2.2.2.2', '3.3.3.3']}
+        indicators['4.4.4.4'] = {'value': '4.4.4.4', 'indicator_type': 'IP', 'score': 1,
+                                 'modified': '2020-01-01T00:00:00Z'}
+
+        def search_indicators(query, page, size):
+            assert query.startswith('score:3') or query.startswith('(score:3) and modified:>="')
+            modified_from = query.split('"')[1] if 'modified' in query else ''
+            iocs = [ioc for ioc in indicators.values() if ioc['score'] == 3 and ioc['modified'] >= modified_from]
+            return {'iocs': iocs[page * size:(page + 1) * size], 'total': len(iocs)}
+
+        def modify(value, score):
+            indicators[value] = {'value': value, 'indicator_type': 'IP', 'score': score,
+                                 'modified': '2099-01-01T00:00:00Z'}
+
+        def assert_matches_full_refresh():
+            incremental_vals = edl.refresh_edl_context(request_args, incremental_refresh=True)
+            full_vals = edl.refresh_edl_context(request_args)
+            assert sorted(incremental_vals.split('\n')) == sorted(full_vals.split('\n'))
+
+        mocker.patch.object(demisto, 'searchIndicators', side_effect=search_indicators)
+        build_ioc_index = mocker.spy(edl, 'build_ioc_index')
+        request_args = edl.RequestArguments(query='score:3', limit=10)
+        assert_matches_full_refresh()
+
+        modify('5.5.5.5', 3)
+        assert_matches_full_refresh()
+        assert build_ioc_index.call_count == 1
+
+        modify('2.2.2.2', 1)
+        modify('4.4.4.4', 3)
+        assert_matches_full_refresh()
+        assert build_ioc_index.call_count == 2
+        assert '2.2.2.2' not in edl.INCREMENTAL_INDEX[edl.EDL_INDEX_KEY]
+
+    @pytest.mark.refresh_edl_context
+    def test_refresh_edl_context_incremental_no_changes(self, mocker):
+        """
+        Given
+            - An indicators index in memory.
+        When
+            - Running an incremental refresh where no indicator was modified.
+        Then
+            - Ensure the integration context is not rewritten and the rendered values are returned.
+        """
+        import EDL as edl
+        request_args = edl.RequestArguments(query='', limit=10)
+        mocker.patch.object(edl, 'INCREMENTAL_INDEX', {
+            edl.EDL_INDEX_KEY: {'1.1.1.1': ['IP', ['1.1.1.1']]},
+            edl.EDL_VALUES_KEY: '1.1.1.1',
+            'total': 1,
+            'last_full_refresh': date_to_timestamp(datetime.now()),
+            'last_modified': '2020-01-01T00:00:00Z',
+            'request': edl.create_request_context(request_args)
+        })
+        mocker.patch.object(demisto, 'searchIndicators', return_value={'iocs': [], 'total': 1})
+        set_context = mocker.patch.object(demisto, 'setIntegrationContext')
+
+        assert edl.refresh_edl_context(request_args, incremental_refresh=True) == '1.1.1.1'
+        assert not set_context.called
+
+    @pytest.mark.route_edl_values
+    def test_route_edl_values_conditional_and_compressed(self, mocker):
+        """
+        Given
+            - A rendered list which does not change between requests.
+        When
+            - Requesting the list with gzip encoding, then conditionally with its ETag and then with a Range.
+        Then
+            - Ensure the list is compressed, a 304 is returned for the unchanged list and a 206 for the range.
+        """
+        import gzip
+        import EDL as module
+        mocker.patch.object(demisto, 'params', return_value={})
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+        mocker.patch.object(module, 'get_edl_ioc_values', return_value='1.1.1.1\n2.2.2.2')
+        client = module.APP.test_client()
+
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data) == b'1.1.1.1\n2.2.2.2'
+        etag = response.headers['ETag']
+        last_modified = response.headers['Last-Modified']
+
+        response = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert not response.data
+
+        response = client.get('/', headers={'If-Modified-Since': last_modified})
+        assert response.status_code == 304
+
+        response = client.get('/', headers={'Range': 'bytes=0-6'})
+        assert response.status_code == 206
+        assert response.data == b'1.1.1.1'
+
+        mocker.patch.object(module, 'get_edl_ioc_values', return_value='3.3.3.3')
+        response = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert response.status_code == 200
+        assert gzip.decompress(response.data) == b'3.3.3.3'
+
+    @pytest.mark.route_edl_values
+    def test_route_edl_values_cached_by_output_time(self, mocker):
+        """
+        Given
+            - An EDL with a refresh rate of 5 minutes.
+        When
+            - Requesting the EDL twice, and again after the refresh rate elapsed.
+        Then
+            - Ensure the second request is served from memory without reading the integration context, the
+              Last-Modified header is the time of the refresh and the output is rendered again on the next refresh.
+        """
+        import EDL as edl
+        integration_context: dict = {}
+        mocker.patch.object(edl, 'CACHED_OUTPUT', {})
+        mocker.patch.object(edl, 'PAGE_SIZE', 200)
+        mocker.patch.object(demisto, 'params', return_value={'edl_size': '10', 'cache_refresh_rate': '5 minutes'})
+        get_context = mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: json.loads(json.dumps(
+            integration_context)))
+        mocker.patch.object(demisto, 'setIntegrationContext', side_effect=lambda ctx: integration_context.update(ctx))
+        search = mocker.patch.object(demisto, 'searchIndicators', return_value={
+            'iocs': [{'value': '1.1.1.1', 'indicator_type': 'IP'}]})
+        client = edl.APP.test_client()
+
+        response = client.get('/')
+        assert response.data == b'1.1.1.1'
+        search_calls = search.call_count
+        output_time = integration_context[edl.EDL_OUTPUT_TIME_KEY]
+        assert response.last_modified.timestamp() == output_time // 1000
+        context_reads = get_context.call_count
+
+        response = client.get('/')
+        assert response.data == b'1.1.1.1'
+        assert get_context.call_count == context_reads
+        assert search.call_count == search_calls
+
+        integration_context['last_run'] -= 10 * 60 * 1000
+        edl.CACHED_OUTPUT['context']['last_run'] -= 10 * 60 * 1000
+        search.return_value = {'iocs': [{'value': '2.2.2.2', 'indicator_type': 'IP'}]}
+        response = client.get('/')
+        assert response.data == b'2.2.2.2'
+        assert search.call_count > search_calls
+        assert edl.CACHED_OUTPUT['version'] == integration_context[edl.EDL_OUTPUT_TIME_KEY]
@@ -3,16 +3,23 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 
 import re
+import gzip
+import zlib
+import hashlib
+import socket
+import struct
 import json
 import traceback
+import itertools
 from base64 import b64decode
+from functools import partial
 from multiprocessing import Process
 from gevent.pywsgi import WSGIServer
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, TemporaryFile
 from flask import Flask, Response, request
-from netaddr import IPAddress, iprange_to_cidrs
+from netaddr import IPAddress
 from ssl import SSLContext, SSLError, PROTOCOL_TLSv1_2
-from typing import Callable, List, Any, cast, Dict, Tuple
+from typing import Callable, List, Any, cast, Dict, Tuple, Optional, Iterable, Iterator
 
 
 class Handler:
@@ -24,10 +31,17 @@ class Handler:
 ''' GLOBAL VARIABLES '''
 INTEGRATION_NAME: str = 'Export Indicators Service'
 PAGE_SIZE: int = 200
+STREAM_CHUNK_SIZE: int = 64 * 1024
 DEMISTO_LOGGER: Handler = Handler()
 APP: Flask = Flask('demisto-export_iocs')
 CTX_VALUES_KEY: str = 'dmst_export_iocs_values'
 CTX_MIMETYPE_KEY: str = 'dmst_export_iocs_mimetype'
+CTX_LISTS_KEY: str = 'lists'
+# the time the output saved in the list context was rendered at, the version of the in-memory output
+CTX_OUTPUT_TIME_KEY: str = 'last_output_time'
+SUPPORTED_ENCODINGS: List[str] = ['gzip', 'deflate']
+# the rendered lists of the last requests and their encoded variants, kept in memory by the long running server
+CACHED_OUTPUTS: Dict[str, Dict[str, Any]] = {}
 
 FORMAT_CSV: str = 'csv'
 FORMAT_TEXT: str = 'text'
@@ -59,6 +73,10 @@ CTX_COLLAPSE_ERR_MSG: str = 'The Collapse parameter can only get the following:
 CTX_MISSING_REFRESH_ERR_MSG: str = 'Refresh Rate must be "number date_range_unit", examples: (2 hours, 4 minutes, ' \
                                    '6 months, 1 day, etc.)'
 CTX_NO_URLS_IN_PROXYSG_FORMAT = 'ProxySG format only outputs URLs - no URLs found in the current query'
+CTX_LISTS_ERR_MSG: str = 'Lists must be a JSON object mapping each list name to its parameters, ' \
+                         'for example: {"blocked-ips": {"indicators_query": "type:IP and score:3"}}'
+CTX_LISTS_ON_DEMAND_ERR_MSG: str = 'The Lists parameter is not supported in On-Demand mode, as the named lists are ' \
+                                   'refreshed by their requests. Clear the Lists parameter or turn On-Demand off.'
 
 MIMETYPE_JSON_SEQ: str = 'application/json-seq'
 MIMETYPE_JSON: str = 'application/json'
@@ -68,6 +86,8 @@ MIMETYPE_TEXT: str = 'text/plain'
 DONT_COLLAPSE = "Don't Collapse"
 COLLAPSE_TO_CIDR = "To CIDRs"
 COLLAPSE_TO_RANGES = "To Ranges"
+_inet_pton_ipv4 = partial(socket.inet_pton, socket.AF_INET)
+_pack_ipv4 = struct.Struct('!I').pack
 
 _PROTOCOL_REMOVAL = re.compile(r'^(?:[a-z]+:)*//')
 _PORT_REMOVAL = re.compile(r'^([a-z0-9\-\.]+)(?:\:[0-9]+)*')
@@ -169,14 +189,33 @@ def get_params_port(params: dict = demisto.params()) -> int:
     return port
 
 
-def refresh_outbound_context(request_args: RequestArguments) -> str:
+def refresh_outbound_context(request_args: RequestArguments, list_name: Optional[str] = None) -> str:
     """
     Refresh the cache values and format using an indicator_query to call demisto.searchIndicators
+    Named lists are saved under the lists key of the integration context
     Returns: List(IoCs in output format)
     """
+    list_context = create_refreshed_list_context(request_args, list_name=list_name)
+    set_list_context(list_context, list_name)
+    return list_context['last_output'][CTX_VALUES_KEY]
+
+
+def create_refreshed_list_context(request_args: RequestArguments, shared_pages: Optional[dict] = None,
+                                  list_name: Optional[str] = None) -> dict:
+    """
+    Fetches the indicators of a list and creates its refreshed context, holding its output in the requested format
+
+    Args:
+        request_args: The request arguments of the list
+        shared_pages: The search pages fetched for the lists refreshed in the same pass
+        list_name: The name of the list, empty for the list of the instance
+
+    Returns:
+        The list context
+    """
     now = datetime.now()
     # poll indicators into list from demisto
-    iocs = find_indicators_with_limit(request_args.query, request_args.limit, request_args.offset)
+    iocs = find_indicators_with_limit(request_args.query, request_args.limit, request_args.offset, shared_pages)
     out_dict, actual_indicator_amount = create_values_for_returned_dict(iocs, request_args)
 
     # if in CSV format - the "indicator" header
@@ -190,7 +229,7 @@ def refresh_outbound_context(request_args: RequestArguments) -> str:
         new_limit = request_args.limit - actual_indicator_amount
 
         # poll additional indicators into list from demisto
-        new_iocs = find_indicators_with_limit(request_args.query, new_limit, new_offset)
+        new_iocs = find_indicators_with_limit(request_args.query, new_limit, new_offset, shared_pages)
 
         # in case no additional indicators exist - exit
         if len(new_iocs) == 0:
@@ -205,30 +244,46 @@ def refresh_outbound_context(request_args: RequestArguments) -> str:
         if request_args.out_format == FORMAT_CSV:
             actual_indicator_amount = actual_indicator_amount - 1
 
-    if request_args.out_format == FORMAT_JSON:
-        out_dict[CTX_MIMETYPE_KEY] = MIMETYPE_JSON
+    out_dict[CTX_MIMETYPE_KEY] = get_format_mimetype(request_args)
+    # the fetched indicators are reformatted by On-Demand requests, which only the list of the instance supports
+    return create_list_context(request_args, out_dict, now, None if list_name else iocs)
 
-    elif request_args.out_format in [FORMAT_CSV, FORMAT_XSOAR_CSV]:
-        if request_args.csv_text:
-            out_dict[CTX_MIMETYPE_KEY] = MIMETYPE_TEXT
 
-        else:
-            out_dict[CTX_MIMETYPE_KEY] = MIMETYPE_CSV
+def iter_streamed_output(request_args: RequestArguments) -> Iterator[str]:
+    """
+    Refreshes the list like refresh_outbound_context, yielding the output in chunks while the indicators are fetched.
+    The output is saved in the integration context once fully streamed, without the fetched indicators, so the
+    following requests are served from the context until the refresh rate elapses. The streamed chunks are spooled to
+    a temporary file rather than kept in memory, and read back only when the output is saved.
+    Unlike refresh_outbound_context, the indicators dropped by the formatting or merged by the IP collapse are not
+    re-polled, so the list may hold fewer entries than the limit.
+    """
+    now = datetime.now()
+    iocs = iter_indicators_with_limit(request_args.query, request_args.limit, request_args.offset)
+    with TemporaryFile('w+', encoding='utf-8') as output_file:
+        for chunk in iter_formatted_output(iocs, request_args):
+            output_file.write(chunk)
+            yield chunk
 
-    elif request_args.out_format in [FORMAT_JSON_SEQ, FORMAT_XSOAR_JSON_SEQ]:
-        out_dict[CTX_MIMETYPE_KEY] = MIMETYPE_JSON_SEQ
+        output_file.seek(0)
+        out_dict = {CTX_VALUES_KEY: output_file.read(), CTX_MIMETYPE_KEY: get_format_mimetype(request_args)}
+    set_list_context(create_list_context(request_args, out_dict, now, []))
 
-    else:
-        out_dict[CTX_MIMETYPE_KEY] = MIMETYPE_TEXT
 
-    demisto.setIntegrationContext({
+def create_list_context(request_args: RequestArguments, out_dict: dict, now: datetime,
+                        iocs: Optional[list] = None) -> dict:
+    """
+    Creates the context of a refreshed list, which is used to check whether the list should be refreshed.
+    The fetched indicators are kept in the context only when given.
+    """
+    list_context = {
         "last_output": out_dict,
         'last_run': date_to_timestamp(now),
+        CTX_OUTPUT_TIME_KEY: get_output_time(now),
         'last_limit': request_args.limit,
         'last_offset': request_args.offset,
         'last_format': request_args.out_format,
         'last_query': request_args.query,
-        'current_iocs': iocs,
         'mwg_type': request_args.mwg_type,
         'drop_invalids': request_args.drop_invalids,
         'strip_port': request_args.strip_port,
@@ -236,11 +291,85 @@ def refresh_outbound_context(request_args: RequestArguments) -> str:
         'category_attribute': request_args.category_attribute,
         'collapse_ips': request_args.collapse_ips,
         'csv_text': request_args.csv_text
-    })
-    return out_dict[CTX_VALUES_KEY]
+    }
+    if iocs is not None:
+        list_context['current_iocs'] = iocs
+    return list_context
+
+
+def get_output_time(now: datetime) -> int:
+    """
+    Returns the time the output is rendered at in milliseconds, unlike date_to_timestamp it keeps the milliseconds
+    so outputs rendered in the same second get different versions
+    """
+    return int(now.timestamp() * 1000)
+
+
+def get_format_mimetype(request_args: RequestArguments) -> str:
+    """Returns the mimetype of the requested output format"""
+    if request_args.out_format == FORMAT_JSON:
+        return MIMETYPE_JSON
+
+    if request_args.out_format in [FORMAT_CSV, FORMAT_XSOAR_CSV]:
+        return MIMETYPE_TEXT if request_args.csv_text else MIMETYPE_CSV
+
+    if request_args.out_format in [FORMAT_JSON_SEQ, FORMAT_XSOAR_JSON_SEQ]:
+        return MIMETYPE_JSON_SEQ
 
+    return MIMETYPE_TEXT
 
-def find_indicators_with_limit(indicator_query: str, limit: int, offset: int) -> list:
+
+def set_list_context(list_context: dict, list_name: Optional[str] = None):
+    """
+    Saves the context of a list, keeping the contexts of the other lists
+    """
+    if list_name:
+        set_lists_context({list_name: list_context})
+
+    else:
+        lists_context = demisto.getIntegrationContext().get(CTX_LISTS_KEY, {})
+        if lists_context:
+            list_context[CTX_LISTS_KEY] = lists_context
+        demisto.setIntegrationContext(list_context)
+
+
+def set_lists_context(lists_context: Dict[str, dict]):
+    """
+    Saves the contexts of named lists in a single write, keeping the contexts of the other lists. The integration
+    context is read right before it is written, so lists refreshed by concurrent requests are not overwritten.
+    """
+    integration_context = demisto.getIntegrationContext()
+    integration_context[CTX_LISTS_KEY] = {**integration_context.get(CTX_LISTS_KEY, {}), **lists_context}
+    demisto.setIntegrationContext(integration_context)
+
+
+def refresh_lists_context(lists_request_args: Dict[str, RequestArguments]):
+    """
+    Refresh several named lists in a single pass, lists with the same query share the fetched indicators
+    """
+    # the pages are shared by the lists of this pass only, concurrent requests refresh with their own pages
+    shared_pages: Dict[Tuple[str, int], list] = {}
+    set_lists_context({list_name: create_refreshed_list_context(request_args, shared_pages, list_name)
+                       for list_name, request_args in lists_request_args.items()})
+
+
+def search_indicators_page(indicator_query: str, page: int, shared_pages: Optional[dict] = None) -> list:
+    """
+    Fetches a page of indicators using demisto.searchIndicators, during a lists refresh pass the page is fetched
+    once for all the lists
+    """
+    if shared_pages is not None and (indicator_query, page) in shared_pages:
+        return shared_pages[(indicator_query, page)]
+
+    # In case the result from searchIndicators includes the key `iocs` but it's value is None
+    fetched_iocs = demisto.searchIndicators(query=indicator_query, page=page, size=PAGE_SIZE).get('iocs') or []
+    if shared_pages is not None:
+        shared_pages[(indicator_query, page)] = fetched_iocs
+    return fetched_iocs
+
+
+def find_indicators_with_limit(indicator_query: str, limit: int, offset: int,
+                               shared_pages: Optional[dict] = None) -> list:
     """
     Finds indicators using demisto.searchIndicators
     """
@@ -255,7 +384,7 @@ def find_indicators_with_limit(indicator_query: str, limit: int, offset: int) ->
         next_page = 0
         offset_in_page = 0
 
-    iocs, _ = find_indicators_with_limit_loop(indicator_query, limit, next_page=next_page)
+    iocs, _ = find_indicators_with_limit_loop(indicator_query, limit, next_page=next_page, shared_pages=shared_pages)
 
     # if offset in page is bigger than the amount of results returned return empty list
     if len(iocs) <= offset_in_page:
@@ -264,8 +393,26 @@ def find_indicators_with_limit(indicator_query: str, limit: int, offset: int) ->
     return iocs[offset_in_page:limit + offset_in_page]
 
 
+def iter_indicators_with_limit(indicator_query: str, limit: int, offset: int) -> Iterator[dict]:
+    """
+    Yields up to limit indicators starting from offset, fetching a single page at a time
+    """
+    next_page, offset_in_page = divmod(offset, PAGE_SIZE)
+    remaining = limit
+    while remaining > 0:
+        fetched_iocs = search_indicators_page(indicator_query, next_page)
+        page_iocs = fetched_iocs[offset_in_page:offset_in_page + remaining]
+        yield from page_iocs
+        remaining -= len(page_iocs)
+        if len(fetched_iocs) < PAGE_SIZE:
+            break
+
+        next_page += 1
+        offset_in_page = 0
+
+
 def find_indicators_with_limit_loop(indicator_query: str, limit: int, total_fetched: int = 0, next_page: int = 0,
-                                    last_found_len: int = PAGE_SIZE):
+                                    last_found_len: int = PAGE_SIZE, shared_pages: Optional[dict] = None):
     """
     Finds indicators using while loop with demisto.searchIndicators, and returns result and last page
     """
@@ -273,7 +420,7 @@ def find_indicators_with_limit_loop(indicator_query: str, limit: int, total_fetc
     if not last_found_len:
         last_found_len = total_fetched
     while last_found_len == PAGE_SIZE and limit and total_fetched < limit:
-        fetched_iocs = demisto.searchIndicators(query=indicator_query, page=next_page, size=PAGE_SIZE).get('iocs')
+        fetched_iocs = search_indicators_page(indicator_query, next_page, shared_pages)
         iocs.extend(fetched_iocs)
         last_found_len = len(fetched_iocs)
         total_fetched += last_found_len
@@ -281,158 +428,192 @@ def find_indicators_with_limit_loop(indicator_query: str, limit: int, total_fetc
     return iocs, next_page
 
 
-def ip_groups_to_cidrs(ip_range_groups: list):
-    """Collapse ip groups list to CIDRs
+def ip_to_int(ip: Any) -> Tuple[int, int]:
+    """Converts an IP to its version and integer value.
 
     Args:
-        ip_range_groups (list): a list of lists containing connected IPs
+        ip (str/IPAddress): an IP string or a netaddr IPAddress.
 
     Returns:
-        list. a list of CIDRs.
+        tuple. the IP version (4 or 6) and the integer value of the IP.
     """
-    ip_ranges = []  # type:List
-    for group in ip_range_groups:
-        # handle single ips
-        if len(group) == 1:
-            ip_ranges.append(str(group[0]))
-            continue
-
-        min_ip = group[0]
-        max_ip = group[-1]
-        moved_ip = False
-        # CIDR must begin with an even LSB
-        # if the first ip does not - separate it from the rest of the range
-        if (int(str(min_ip).split('.')[-1]) % 2) != 0:
-            ip_ranges.append(str(min_ip))
-            min_ip = group[1]
-            moved_ip = True
-
-        # CIDR must end with uneven LSB
-        # if the last ip does not - separate it from the rest of the range
-        if (int(str(max_ip).split('.')[-1]) % 2) == 0:
-            ip_ranges.append(str(max_ip))
-            max_ip = group[-2]
-            moved_ip = True
-
-        # if both min and max ips were shifted and there are only 2 ips in the range
-        # we added both ips by the shift and now we move to the next  range
-        if moved_ip and len(group) == 2:
-            continue
+    if isinstance(ip, str):
+        try:
+            if ':' in ip:
+                return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), 'big')
+            return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+        except (OSError, ValueError):
+            # fallback to netaddr for the less common IP notations it supports
+            pass
 
-        else:
-            ip_ranges.append(str(iprange_to_cidrs(min_ip, max_ip)[0].cidr))
+    ip = IPAddress(ip)
+    return ip.version, int(ip)
 
-    return ip_ranges
 
+def int_to_ip(version: int, value: int) -> str:
+    """Converts an integer value of an IP back to its string representation.
+
+    Args:
+        version (int): the IP version (4 or 6).
+        value (int): the integer value of the IP.
+
+    Returns:
+        str. the IP string.
+    """
+    if version == 4:
+        return socket.inet_ntoa(_pack_ipv4(value))
+    return str(IPAddress(value, 6))
 
-def ip_groups_to_ranges(ip_range_groups: list):
-    """Collapse ip groups list to ranges
+
+def ips_to_int_ranges(ips: list) -> Dict[int, List[Tuple[int, int]]]:
+    """Sorts the IPs once and merges consecutive IPs to ranges of integers.
 
     Args:
-        ip_range_groups (list): a list of lists containing connected IPs
+        ips (list): a list of IP strings or netaddr IPAddresses.
 
     Returns:
-        list. a list of Ranges.
+        dict. a mapping of IP version to a sorted list of disjoint (start, end) integer ranges.
     """
-    ip_ranges = []  # type:List
-    for group in ip_range_groups:
-        # handle single ips
-        if len(group) == 1:
-            ip_ranges.append(str(group[0]))
-            continue
+    values_by_version = {4: [], 6: []}  # type:Dict[int, List[int]]
+    try:
+        # fast path - the IPs are usually all IPv4 strings, convert them at once
+        values_by_version[4].extend(struct.unpack(f'!{len(ips)}I', b''.join(map(_inet_pton_ipv4, ips))))
+        other_ips = []  # type:List
+    except (OSError, TypeError):
+        ipv4_ips = []
+        other_ips = []
+        for ip in ips:
+            (ipv4_ips if isinstance(ip, str) and ':' not in ip else other_ips).append(ip)
+        try:
+            values_by_version[4].extend(struct.unpack(f'!{len(ipv4_ips)}I', b''.join(map(_inet_pton_ipv4, ipv4_ips))))
+        except OSError:
+            other_ips.extend(ipv4_ips)
+
+    for ip in other_ips:
+        version, value = ip_to_int(ip)
+        values_by_version[version].append(value)
+
+    ranges_by_version = {}  # type:Dict[int, List[Tuple[int, int]]]
+    for version, values in values_by_version.items():
+        ranges = []  # type:List[Tuple[int, int]]
+        if values:
+            values.sort()
+            start = end = values[0]
+            for value in values:
+                if value > end + 1:
+                    ranges.append((start, end))
+                    start = value
+                end = value
+            ranges.append((start, end))
+        ranges_by_version[version] = ranges
+
+    return ranges_by_version
+
+
+def int_range_to_cidrs(version: int, start: int, end: int) -> List[str]:
+    """Covers a range of IPs with the minimal amount of CIDRs.
 
-        min_ip = group[0]
-        max_ip = group[-1]
-        ip_ranges.append(str(min_ip) + "-" + str(max_ip))
+    Args:
+        version (int): the IP version (4 or 6).
+        start (int): the integer value of the first IP in the range.
+        end (int): the integer value of the last IP in the range.
 
-    return ip_ranges
+    Returns:
+        list. a list of CIDRs, single IPs are returned without a prefix length.
+    """
+    max_prefix_len = 32 if version == 4 else 128
+    cidrs = []
+    while start <= end:
+        # the largest block which is aligned to the start of the range and does not exceed its end
+        block_size = (start & -start) or (1 << max_prefix_len)
+        while block_size > end - start + 1:
+            block_size >>= 1
+
+        prefix_len = max_prefix_len - block_size.bit_length() + 1
+        ip = int_to_ip(version, start)
+        cidrs.append(ip if prefix_len == max_prefix_len else f'{ip}/{prefix_len}')
+        start += block_size
+
+    return cidrs
 
 
 def ips_to_ranges(ips: list, collapse_ips):
     """Collapse IPs to Ranges or CIDRs.
 
     Args:
-        ips (list): a list of IP strings.
+        ips (list): a list of IP strings or netaddr IPAddresses.
         collapse_ips (str): Whether to collapse to Ranges or CIDRs.
 
     Returns:
         list. a list to Ranges or CIDRs.
     """
-    ips_range_groups = []  # type:List
-    ips = sorted(ips)
-    if len(ips) > 0:
-        ips_range_groups.append([ips[0]])
+    ip_ranges = []  # type:List
+    inet_ntoa = socket.inet_ntoa
+    for version, ranges in ips_to_int_ranges(ips).items():
+        for start, end in ranges:
+            if start == end:
+                # inlined for IPv4 - most of the IPs of a large list are not collapsed
+                ip_ranges.append(inet_ntoa(_pack_ipv4(start)) if version == 4 else int_to_ip(version, start))
 
-    if len(ips) > 1:
-        for ip in ips[1:]:
-            appended = False
+            elif collapse_ips == COLLAPSE_TO_RANGES:
+                ip_ranges.append(int_to_ip(version, start) + "-" + int_to_ip(version, end))
 
-            if len(ips_range_groups) == 0:
-                ips_range_groups.append([ip])
-                continue
+            else:
+                ip_ranges.extend(int_range_to_cidrs(version, start, end))
 
-            for group in ips_range_groups:
-                if IPAddress(int(ip) + 1) in group or IPAddress(int(ip) - 1) in group:
-                    group.append(ip)
-                    sorted(group)
-                    appended = True
+    return ip_ranges
 
-            if not appended:
-                ips_range_groups.append([ip])
 
-    for group in ips_range_groups:
-        sorted(group)
+def panos_url_format_single_indicator(indicator_data: dict, drop_invalids: bool, strip_port: bool) -> List[str]:
+    """
+    Formats a single indicator to PAN-OS URL format, returns an empty list if the indicator should be ignored
+    """
+    # only format URLs and Domains
+    indicator = indicator_data.get('value')
+    if indicator_data.get('indicator_type') in ['URL', 'Domain', 'DomainGlob']:
+        indicator = indicator.lower()
 
-    if collapse_ips == COLLAPSE_TO_RANGES:
-        return ip_groups_to_ranges(ips_range_groups)
+        # remove initial protocol - http/https/ftp/ftps etc
+        indicator = _PROTOCOL_REMOVAL.sub('', indicator)
 
-    else:
-        return ip_groups_to_cidrs(ips_range_groups)
+        indicator_with_port = indicator
+        # remove port from indicator - from demisto.com:369/rest/of/path -> demisto.com/rest/of/path
+        indicator = _PORT_REMOVAL.sub(r'\g<1>', indicator)
+        # check if removing the port changed something about the indicator
+        if indicator != indicator_with_port and not strip_port:
+            # if port was in the indicator and strip_port param not set - ignore the indicator
+            return []
 
+        with_invalid_tokens_indicator = indicator
+        # remove invalid tokens from indicator
+        indicator = _INVALID_TOKEN_REMOVAL.sub('*', indicator)
 
-def panos_url_formatting(iocs: list, drop_invalids: bool, strip_port: bool):
-    formatted_indicators = []  # type:List
-    for indicator_data in iocs:
-        # only format URLs and Domains
-        indicator = indicator_data.get('value')
-        if indicator_data.get('indicator_type') in ['URL', 'Domain', 'DomainGlob']:
-            indicator = indicator.lower()
-
-            # remove initial protocol - http/https/ftp/ftps etc
-            indicator = _PROTOCOL_REMOVAL.sub('', indicator)
-
-            indicator_with_port = indicator
-            # remove port from indicator - from demisto.com:369/rest/of/path -> demisto.com/rest/of/path
-            indicator = _PORT_REMOVAL.sub(r'\g<1>', indicator)
-            # check if removing the port changed something about the indicator
-            if indicator != indicator_with_port and not strip_port:
-                # if port was in the indicator and strip_port param not set - ignore the indicator
-                continue
+        # check if the indicator held invalid tokens
+        if with_invalid_tokens_indicator != indicator:
+            # invalid tokens in indicator- if drop_invalids is set - ignore the indicator
+            if drop_invalids:
+                return []
 
-            with_invalid_tokens_indicator = indicator
-            # remove invalid tokens from indicator
-            indicator = _INVALID_TOKEN_REMOVAL.sub('*', indicator)
+            # check if after removing the tokens the indicator is too broad if so - ignore
+            # example of too broad terms: "*.paloalto", "*.*.paloalto", "*.paloalto:60"
+            hostname = indicator
+            if '/' in hostname:
+                hostname, _ = hostname.split('/', 1)
 
-            # check if the indicator held invalid tokens
-            if with_invalid_tokens_indicator != indicator:
-                # invalid tokens in indicator- if drop_invalids is set - ignore the indicator
-                if drop_invalids:
-                    continue
+            if _BROAD_PATTERN.match(hostname) is not None:
+                return []
 
-                # check if after removing the tokens the indicator is too broad if so - ignore
-                # example of too broad terms: "*.paloalto", "*.*.paloalto", "*.paloalto:60"
-                hostname = indicator
-                if '/' in hostname:
-                    hostname, _ = hostname.split('/', 1)
+        # for PAN-OS "*.domain.com" does not match "domain.com" - we should provide both
+        if indicator.startswith('*.'):
+            return [indicator[2:], indicator]
 
-                if _BROAD_PATTERN.match(hostname) is not None:
-                    continue
+    return [indicator]
 
-            # for PAN-OS "*.domain.com" does not match "domain.com" - we should provide both
-            if indicator.startswith('*.'):
-                formatted_indicators.append(indicator[2:])
 
-        formatted_indicators.append(indicator)
+def panos_url_formatting(iocs: list, drop_invalids: bool, strip_port: bool):
+    formatted_indicators = []  # type:List
+    for indicator_data in iocs:
+        formatted_indicators.extend(panos_url_format_single_indicator(indicator_data, drop_invalids, strip_port))
     return {CTX_VALUES_KEY: list_to_str(formatted_indicators, '\n')}, len(formatted_indicators)
 
 
@@ -497,25 +678,29 @@ def create_proxysg_out_format(iocs: list, category_attribute: list, category_def
     return {CTX_VALUES_KEY: formatted_indicators}, num_of_returned_indicators
 
 
-def create_mwg_out_format(iocs: list, mwg_type: str) -> dict:
-    formatted_indicators = []  # type:List
-    for indicator in iocs:
-        value = "\"" + indicator.get('value') + "\""
-        sources = indicator.get('sourceBrands')
-        if sources:
-            sources_string = "\"" + ','.join(sources) + "\""
+def mwg_format_single_indicator(indicator: dict) -> str:
+    value = "\"" + indicator.get('value') + "\""
+    sources = indicator.get('sourceBrands')
+    if sources:
+        sources_string = "\"" + ','.join(sources) + "\""
 
-        else:
-            sources_string = "\"from CORTEX XSOAR\""
+    else:
+        sources_string = "\"from CORTEX XSOAR\""
 
-        formatted_indicators.append(value + " " + sources_string)
+    return value + " " + sources_string
 
-    string_formatted_indicators = list_to_str(formatted_indicators, '\n')
 
+def mwg_format_header(mwg_type: Any) -> str:
     if isinstance(mwg_type, list):
         mwg_type = mwg_type[0]
 
-    string_formatted_indicators = "type=" + mwg_type + "\n" + string_formatted_indicators
+    return "type=" + mwg_type + "\n"
+
+
+def create_mwg_out_format(iocs: list, mwg_type: str) -> dict:
+    formatted_indicators = [mwg_format_single_indicator(indicator) for indicator in iocs]
+    string_formatted_indicators = list_to_str(formatted_indicators, '\n')
+    string_formatted_indicators = mwg_format_header(mwg_type) + string_formatted_indicators
 
     return {CTX_VALUES_KEY: string_formatted_indicators}
 
@@ -542,56 +727,115 @@ def create_values_for_returned_dict(iocs: list, request_args: RequestArguments)
         return {CTX_VALUES_KEY: json.dumps(iocs_list)}, len(iocs)
 
     else:
-        ipv4_formatted_indicators = []
-        ipv6_formatted_indicators = []
-        formatted_indicators = []
-        if request_args.out_format == FORMAT_XSOAR_CSV and len(iocs) > 0:  # add csv keys as first item
-            headers = list(iocs[0].keys())
-            formatted_indicators.append(list_to_str(headers))
-
-        elif request_args.out_format == FORMAT_CSV and len(iocs) > 0:
-            formatted_indicators.append('indicator')
-
-        for ioc in iocs:
-            value = ioc.get('value')
-            type = ioc.get('indicator_type')
-            if value:
-                if request_args.out_format in [FORMAT_TEXT, FORMAT_CSV]:
-                    if type == 'IP' and request_args.collapse_ips != DONT_COLLAPSE:
-                        ipv4_formatted_indicators.append(IPAddress(value))
-
-                    elif type == 'IPv6' and request_args.collapse_ips != DONT_COLLAPSE:
-                        ipv6_formatted_indicators.append(IPAddress(value))
-
-                    else:
-                        formatted_indicators.append(value)
-
-                elif request_args.out_format == FORMAT_XSOAR_JSON_SEQ:
-                    formatted_indicators.append(json.dumps(ioc))
-
-                elif request_args.out_format == FORMAT_JSON_SEQ:
-                    json_format_indicator = json_format_single_indicator(ioc)
-                    formatted_indicators.append(json.dumps(json_format_indicator))
-
-                elif request_args.out_format == FORMAT_XSOAR_CSV:
-                    # wrap csv values with " to escape them
-                    values = list(ioc.values())
-                    formatted_indicators.append(list_to_str(values, map_func=lambda val: f'"{val}"'))
-
-        if len(ipv4_formatted_indicators) > 0:
-            ipv4_formatted_indicators = ips_to_ranges(ipv4_formatted_indicators, request_args.collapse_ips)
-            formatted_indicators.extend(ipv4_formatted_indicators)
-
-        if len(ipv6_formatted_indicators) > 0:
-            ipv6_formatted_indicators = ips_to_ranges(ipv6_formatted_indicators, request_args.collapse_ips)
-            formatted_indicators.extend(ipv6_formatted_indicators)
+        formatted_indicators = list(iter_text_format_entries(iocs, request_args))
 
     return {CTX_VALUES_KEY: list_to_str(formatted_indicators, '\n')}, len(formatted_indicators)
 
 
-def get_outbound_mimetype() -> str:
+def iter_text_format_entries(iocs: Iterable[dict], request_args: RequestArguments) -> Iterator[str]:
+    """
+    Yields the entries of the text, csv, json-seq, XSOAR json-seq and XSOAR csv formats one by one,
+    IPs which are collapsed to ranges or CIDRs are yielded after all the other entries
+    """
+    ipv4_formatted_indicators = []
+    ipv6_formatted_indicators = []
+    is_first = True
+    for ioc in iocs:
+        if is_first:
+            is_first = False
+            if request_args.out_format == FORMAT_XSOAR_CSV:  # add csv keys as first item
+                headers = list(ioc.keys())
+                yield list_to_str(headers)
+
+            elif request_args.out_format == FORMAT_CSV:
+                yield 'indicator'
+
+        value = ioc.get('value')
+        type = ioc.get('indicator_type')
+        if value:
+            if request_args.out_format in [FORMAT_TEXT, FORMAT_CSV]:
+                if type == 'IP' and request_args.collapse_ips != DONT_COLLAPSE:
+                    ipv4_formatted_indicators.append(value)
+
+                elif type == 'IPv6' and request_args.collapse_ips != DONT_COLLAPSE:
+                    ipv6_formatted_indicators.append(value)
+
+                else:
+                    yield value
+
+            elif request_args.out_format == FORMAT_XSOAR_JSON_SEQ:
+                yield json.dumps(ioc)
+
+            elif request_args.out_format == FORMAT_JSON_SEQ:
+                json_format_indicator = json_format_single_indicator(ioc)
+                yield json.dumps(json_format_indicator)
+
+            elif request_args.out_format == FORMAT_XSOAR_CSV:
+                # wrap csv values with " to escape them
+                values = list(ioc.values())
+                yield list_to_str(values, map_func=lambda val: f'"{val}"')
+
+    if len(ipv4_formatted_indicators) > 0:
+        yield from ips_to_ranges(ipv4_formatted_indicators, request_args.collapse_ips)
+
+    if len(ipv6_formatted_indicators) > 0:
+        yield from ips_to_ranges(ipv6_formatted_indicators, request_args.collapse_ips)
+
+
+def iter_formatted_output(iocs: Iterable[dict], request_args: RequestArguments) -> Iterator[str]:
+    """
+    Yields the output of the IoCs in the requested format in chunks, formatting the IoCs as they are consumed.
+    The chunks add up to the same output created by create_values_for_returned_dict.
+    The Symantec ProxySG format groups the IoCs by category, so it is yielded as a single chunk.
+    """
+    if request_args.out_format == FORMAT_PROXYSG:
+        out_dict, _ = create_proxysg_out_format(list(iocs), request_args.category_attribute,
+                                                request_args.category_default)
+        yield out_dict[CTX_VALUES_KEY]
+        return
+
+    prefix, delimiter, suffix = '', '\n', ''
+    entries: Iterable[str]
+    if request_args.out_format == FORMAT_PANOSURL:
+        entries = (entry for ioc in iocs for entry in panos_url_format_single_indicator(
+            ioc, request_args.drop_invalids, request_args.strip_port))
+
+    elif request_args.out_format == FORMAT_MWG:
+        prefix = mwg_format_header(request_args.mwg_type)
+        entries = (mwg_format_single_indicator(ioc) for ioc in iocs)
+
+    elif request_args.out_format == FORMAT_JSON:
+        prefix, delimiter, suffix = '[', ', ', ']'
+        entries = (json.dumps(json_format_single_indicator(ioc)) for ioc in iocs)
+
+    elif request_args.out_format == FORMAT_XSOAR_JSON:
+        prefix, delimiter, suffix = '[', ', ', ']'
+        entries = (json.dumps(ioc) for ioc in iocs)
+
+    else:
+        entries = iter_text_format_entries(iocs, request_args)
+
+    chunk = [prefix]
+    chunk_size = len(prefix)
+    for index, entry in enumerate(entries):
+        if index > 0:
+            entry = delimiter + entry
+
+        chunk.append(entry)
+        chunk_size += len(entry)
+        if chunk_size >= STREAM_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk, chunk_size = [], 0
+
+    chunk.append(suffix)
+    yield ''.join(chunk)
+
+
+def get_outbound_mimetype(integration_context: Optional[dict] = None) -> str:
     """Returns the mimetype of the export_iocs"""
-    ctx = demisto.getIntegrationContext().get('last_output', {})
+    if integration_context is None:
+        integration_context = demisto.getIntegrationContext()
+    ctx = integration_context.get('last_output', {})
     return ctx.get(CTX_MIMETYPE_KEY, 'text/plain')
 
 
@@ -637,8 +881,10 @@ def get_ioc_values_str_from_context(request_args: RequestArguments, iocs=None) -
 
         iocs = iocs[request_args.offset: request_args.limit + request_args.offset]
         returned_dict, _ = create_values_for_returned_dict(iocs, request_args=request_args)
+        returned_dict[CTX_MIMETYPE_KEY] = get_format_mimetype(request_args)
         current_cache = demisto.getIntegrationContext()
         current_cache['last_output'] = returned_dict
+        current_cache[CTX_OUTPUT_TIME_KEY] = get_output_time(datetime.now())
         demisto.setIntegrationContext(current_cache)
 
     else:
@@ -647,6 +893,75 @@ def get_ioc_values_str_from_context(request_args: RequestArguments, iocs=None) -
     return returned_dict.get(CTX_VALUES_KEY, '')
 
 
+def get_lists_params(params: dict) -> Dict[str, dict]:
+    """
+    Parses the named lists configuration, the parameters of each list override the integration parameters
+
+    Args:
+        params: Integration configuration parameters
+
+    Returns:
+        A mapping of each list name to its parameters
+    """
+    lists_config = params.get('lists') or '{}'
+    try:
+        lists = json.loads(lists_config) if isinstance(lists_config, str) else lists_config
+    except ValueError:
+        raise DemistoException(CTX_LISTS_ERR_MSG)
+
+    if not isinstance(lists, dict) or not all(isinstance(list_params, dict) for list_params in lists.values()):
+        raise DemistoException(CTX_LISTS_ERR_MSG)
+
+    return {list_name: {**params, **list_params} for list_name, list_params in lists.items()}
+
+
+def is_list_stale(list_context: dict, request_args: RequestArguments, cache_refresh_rate: str) -> bool:
+    """
+    Checks whether a named list should be refreshed
+    """
+    last_run = list_context.get('last_run')
+    if not last_run or request_args.is_request_change(list_context) or request_args.query != list_context.get(
+            'last_query'):
+        return True
+
+    cache_time, _ = parse_date_range(cache_refresh_rate, to_timestamp=True)
+    return last_run <= cache_time
+
+
+def get_named_list_context(list_name: str, request_args: RequestArguments,
+                           lists_params: Dict[str, dict]) -> dict:
+    """
+    Get the context of a named list, refreshing it when needed. When the list is refreshed, the other stale lists
+    with the same query are refreshed with it, sharing a single indicators fetch.
+
+    Args:
+        list_name: The name of the list
+        request_args: The request arguments of the list
+        lists_params: The parameters of all the named lists
+
+    Returns:
+        The list context
+    """
+    lists_context = demisto.getIntegrationContext().get(CTX_LISTS_KEY, {})
+    if is_list_stale(lists_context.get(list_name, {}), request_args,
+                     lists_params[list_name].get('cache_refresh_rate')):
+        lists_to_refresh = {list_name: request_args}
+        for other_list_name, other_list_params in lists_params.items():
+            if other_list_name == list_name:
+                continue
+
+            other_request_args = get_request_args(other_list_params, url_args={})
+            if other_request_args.query == request_args.query and \
+                    is_list_stale(lists_context.get(other_list_name, {}), other_request_args,
+                                  other_list_params.get('cache_refresh_rate')):
+                lists_to_refresh[other_list_name] = other_request_args
+
+        refresh_lists_context(lists_to_refresh)
+        lists_context = demisto.getIntegrationContext().get(CTX_LISTS_KEY, {})
+
+    return lists_context.get(list_name, {})
+
+
 def try_parse_integer(int_to_parse: Any, err_msg: str) -> int:
     """
     Tries to parse an integer, and if fails will throw DemistoException with given err_msg
@@ -680,21 +995,189 @@ def validate_basic_authentication(headers: dict, username: str, password: str) -
     return user == username and pwd == password
 
 
+def get_cached_output(values: str, mimetype: str, list_context: dict, list_name: str = '') -> dict:
+    """
+    Returns the in-memory cache of the rendered list. The cache is versioned by the time the values were rendered at,
+    saved in the list context, and is reset when the values are rendered again.
+
+    Args:
+        values: The rendered list values
+        mimetype: The mimetype of the values
+        list_context: The context of the list the values were read from
+        list_name: The name of the list, empty for the list of the instance
+
+    Returns:
+        The cached output, holding the values, their mimetype, ETag, modification time and encoded variants and the
+        list context keys needed to check whether the list should be refreshed
+    """
+    cached_output = CACHED_OUTPUTS.setdefault(list_name, {})
+    output_time = list_context.get(CTX_OUTPUT_TIME_KEY)
+    # the values are the version of a context saved without the output time
+    version = output_time or values
+    if cached_output.get('version') != version:
+        cached_output.clear()
+        cached_output.update({
+            'version': version,
+            'values': values,
+            'etag': hashlib.sha1(values.encode('utf-8')).hexdigest(),  # nosec
+            'last_modified': datetime.utcfromtimestamp(output_time // 1000) if output_time else
+            datetime.utcnow().replace(microsecond=0),
+            'encoded': {}
+        })
+    cached_output['mimetype'] = mimetype
+    cached_output['context'] = {key: list_context.get(key) for key in
+                                ['last_run', 'last_query', 'last_limit', 'last_offset', 'last_format', 'mwg_type',
+                                 'drop_invalids', 'strip_port', 'category_default', 'category_attribute',
+                                 'collapse_ips', 'csv_text']}
+    return cached_output
+
+
+def get_fresh_cached_output(request_args: RequestArguments, cache_refresh_rate: Optional[str],
+                            list_name: str = '') -> Optional[dict]:
+    """
+    Returns the in-memory cached output of the list if the list does not need a refresh, which is checked without
+    reading the integration context
+
+    Args:
+        request_args: The request arguments of the list
+        cache_refresh_rate: The cache_refresh_rate configuration value of the list
+        list_name: The name of the list, empty for the list of the instance
+
+    Returns:
+        The cached output, or None if the list may need a refresh
+    """
+    cached_output = CACHED_OUTPUTS.get(list_name)
+    if cached_output and 'context' in cached_output and \
+            not is_list_stale(cached_output['context'], request_args, cache_refresh_rate):
+        return cached_output
+    return None
+
+
+def get_list_output(params: dict, request_args: RequestArguments, integration_context: dict) -> dict:
+    """
+    Returns the in-memory cached output of the list of the instance, refreshing the list when needed
+
+    Args:
+        params: The integration parameters
+        request_args: The request arguments
+        integration_context: The integration context
+
+    Returns:
+        The cached output
+    """
+    on_demand = params.get('on_demand')
+    values = get_outbound_ioc_values(
+        on_demand=on_demand,
+        last_update_data=integration_context,
+        cache_refresh_rate=params.get('cache_refresh_rate'),
+        request_args=request_args
+    )
+    if not integration_context and on_demand:
+        values = 'You are running in On-Demand mode - please run !eis-update command to initialize the ' \
+                 'export process'
+
+    elif not values:
+        values = "No Results Found For the Query"
+
+    if not on_demand or request_args.is_request_change(integration_context):
+        # the values were rendered and saved in a new integration context
+        integration_context = demisto.getIntegrationContext()
+    return get_cached_output(values, get_outbound_mimetype(integration_context), integration_context)
+
+
+def get_encoded_values(cached_output: dict, encoding: str) -> bytes:
+    """
+    Returns the cached values in the given content encoding, encoding them once per values change
+
+    Args:
+        cached_output: The cached output
+        encoding: The content encoding - identity, gzip or deflate
+
+    Returns:
+        The encoded values
+    """
+    encoded = cached_output['encoded']
+    if encoding not in encoded:
+        data = cached_output['values'].encode('utf-8')
+        if encoding == 'gzip':
+            data = gzip.compress(data)
+
+        elif encoding == 'deflate':
+            data = zlib.compress(data)
+
+        encoded[encoding] = data
+    return encoded[encoding]
+
+
+def create_values_response(cached_output: dict) -> Response:
+    """
+    Creates the response of the list values, compressed according to the client's Accept-Encoding header.
+    Conditional (If-None-Match, If-Modified-Since) requests are answered with 304 when the values did not change,
+    and Range requests are answered with the requested part of the values.
+
+    Args:
+        cached_output: The cached output of the list
+
+    Returns:
+        The flask response
+    """
+    encoding = request.accept_encodings.best_match(SUPPORTED_ENCODINGS) or 'identity'
+    data = get_encoded_values(cached_output, encoding)
+    response = Response(data, status=200, mimetype=cached_output['mimetype'])
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f'{cached_output["etag"]}-{encoding}')
+    response.last_modified = cached_output['last_modified']
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+
+def authenticate_request(params: dict) -> Optional[Response]:
+    """
+    Validates the basic authentication of the request if credentials are configured
+    :param params: The integration's parameters
+    :return: A 401 response if the authentication failed, otherwise None
+    """
+    credentials = params.get('credentials') if params.get('credentials') else {}
+    username: str = credentials.get('identifier', '')
+    password: str = credentials.get('password', '')
+    if username and password:
+        headers: dict = cast(Dict[Any, Any], request.headers)
+        if not validate_basic_authentication(headers, username, password):
+            err_msg: str = 'Basic authentication failed. Make sure you are using the right credentials.'
+            demisto.debug(err_msg)
+            return Response(err_msg, status=401)
+    return None
+
+
 ''' ROUTE FUNCTIONS '''
 
 
-def get_request_args(params):
-    limit = try_parse_integer(request.args.get('n', params.get('list_size', 10000)), CTX_LIMIT_ERR_MSG)
-    offset = try_parse_integer(request.args.get('s', 0), CTX_OFFSET_ERR_MSG)
-    out_format = request.args.get('v', params.get('format', 'text'))
-    query = request.args.get('q', params.get('indicators_query'))
-    mwg_type = request.args.get('t', params.get('mwg_type', "string"))
-    strip_port = request.args.get('sp', params.get('strip_port', False))
-    drop_invalids = request.args.get('di', params.get('drop_invalids', False))
-    category_default = request.args.get('cd', params.get('category_default', 'bc_category'))
-    category_attribute = request.args.get('ca', params.get('category_attribute', ''))
-    collapse_ips = request.args.get('tr', params.get('collapse_ips', DONT_COLLAPSE))
-    csv_text = request.args.get('tx', params.get('csv_text', False))
+def get_request_args(params, url_args: Optional[dict] = None):
+    """
+    Processing the list parameters and the flask request arguments overriding them, and generates a
+    RequestArguments instance from them.
+    Args:
+        params: Integration configuration parameters, or the parameters of a named list
+        url_args: The arguments overriding the parameters, defaults to the flask request arguments
+
+    Returns:
+        RequestArguments instance with processed arguments
+    """
+    if url_args is None:
+        url_args = request.args
+    limit = try_parse_integer(url_args.get('n', params.get('list_size', 10000)), CTX_LIMIT_ERR_MSG)
+    offset = try_parse_integer(url_args.get('s', 0), CTX_OFFSET_ERR_MSG)
+    out_format = url_args.get('v', params.get('format', 'text'))
+    query = url_args.get('q', params.get('indicators_query'))
+    mwg_type = url_args.get('t', params.get('mwg_type', "string"))
+    strip_port = url_args.get('sp', params.get('strip_port', False))
+    drop_invalids = url_args.get('di', params.get('drop_invalids', False))
+    category_default = url_args.get('cd', params.get('category_default', 'bc_category'))
+    category_attribute = url_args.get('ca', params.get('category_attribute', ''))
+    collapse_ips = url_args.get('tr', params.get('collapse_ips', DONT_COLLAPSE))
+    csv_text = url_args.get('tx', params.get('csv_text', False))
 
     # handle flags
     if strip_port is not None and strip_port == '':
@@ -764,34 +1247,64 @@ def route_list_values() -> Response:
     try:
         params = demisto.params()
 
-        credentials = params.get('credentials') if params.get('credentials') else {}
-        username: str = credentials.get('identifier', '')
-        password: str = credentials.get('password', '')
-        if username and password:
-            headers: dict = cast(Dict[Any, Any], request.headers)
-            if not validate_basic_authentication(headers, username, password):
-                err_msg: str = 'Basic authentication failed. Make sure you are using the right credentials.'
-                demisto.debug(err_msg)
-                return Response(err_msg, status=401)
+        auth_error_response = authenticate_request(params)
+        if auth_error_response:
+            return auth_error_response
 
         request_args = get_request_args(params)
+        on_demand = params.get('on_demand')
+        cache_refresh_rate = params.get('cache_refresh_rate')
+
+        # in On-Demand mode the list is updated by another process, so its integration context is always read
+        cached_output = None if on_demand else get_fresh_cached_output(request_args, cache_refresh_rate)
+        if cached_output is None:
+            integration_context = demisto.getIntegrationContext()
+            if argToBoolean(params.get('stream_output', False)) and not on_demand and \
+                    is_list_stale(integration_context, request_args, cache_refresh_rate):
+                output_chunks = iter_streamed_output(request_args)
+                # the first chunk is formatted before responding, so a failing query is still answered with an error
+                first_chunk = next(output_chunks)
+                return Response(itertools.chain([first_chunk], output_chunks), status=200,
+                                mimetype=get_format_mimetype(request_args))
+
+            cached_output = get_list_output(params, request_args, integration_context)
+
+        return create_values_response(cached_output)
+
+    except Exception:
+        return Response(traceback.format_exc(), status=400, mimetype='text/plain')
+
+
+@APP.route('/lists/<list_name>', methods=['GET'])
+def route_named_list_values(list_name: str) -> Response:
+    """
+    Handler for the named lists configured in the Lists parameter
+    """
+    try:
+        params = demisto.params()
+
+        auth_error_response = authenticate_request(params)
+        if auth_error_response:
+            return auth_error_response
 
-        values = get_outbound_ioc_values(
-            on_demand=params.get('on_demand'),
-            last_update_data=demisto.getIntegrationContext(),
-            cache_refresh_rate=params.get('cache_refresh_rate'),
-            request_args=request_args
-        )
+        if params.get('on_demand'):
+            return Response(CTX_LISTS_ON_DEMAND_ERR_MSG, status=400, mimetype='text/plain')
 
-        if not demisto.getIntegrationContext() and params.get('on_demand'):
-            values = 'You are running in On-Demand mode - please run !eis-update command to initialize the ' \
-                     'export process'
+        lists_params = get_lists_params(params)
+        if list_name not in lists_params:
+            return Response(f'List {list_name} is not configured', status=404, mimetype='text/plain')
 
-        elif not values:
-            values = "No Results Found For the Query"
+        request_args = get_request_args(lists_params[list_name])
+        cached_output = get_fresh_cached_output(request_args, lists_params[list_name].get('cache_refresh_rate'),
+                                                list_name)
+        if cached_output is None:
+            list_context = get_named_list_context(list_name, request_args, lists_params)
+            last_output = list_context.get('last_output', {})
+            values = last_output.get(CTX_VALUES_KEY) or "No Results Found For the Query"
+            cached_output = get_cached_output(values, last_output.get(CTX_MIMETYPE_KEY, MIMETYPE_TEXT), list_context,
+                                              list_name)
 
-        mimetype = get_outbound_mimetype()
-        return Response(values, status=200, mimetype=mimetype)
+        return create_values_response(cached_output)
 
     except Exception:
         return Response(traceback.format_exc(), status=400, mimetype='text/plain')
@@ -826,6 +1339,13 @@ def test_module(args, params):
             raise ValueError(
                 'Invalid time unit for the Refresh Rate. Must be minutes, hours, days, months, or years.')
         parse_date_range(cache_refresh_rate, to_timestamp=True)
+    lists_params = get_lists_params(params)
+    if on_demand and lists_params:
+        raise ValueError(CTX_LISTS_ON_DEMAND_ERR_MSG)
+    for list_params in lists_params.values():
+        # validate the parameters of each named list
+        get_request_args(list_params, url_args={})
+        parse_date_range(list_params.get('cache_refresh_rate'), to_timestamp=True)
     run_long_running(params, is_test=True)
     return 'ok', {}, {}
 
@@ -196,11 +196,13 @@ class TestHelperFunctions:
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
             mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            set_context = mocker.patch.object(demisto, 'setIntegrationContext')
             request_args = ei.RequestArguments(query='', out_format='text', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             for ioc in iocs_json:
                 ip = ioc.get('value')
                 assert ip in ei_vals
+            assert set_context.call_args[0][0]['current_iocs'] == iocs_json
 
     @pytest.mark.refresh_outbound_context
     def test_refresh_outbound_context_2(self, mocker):
@@ -567,8 +569,380 @@ class TestHelperFunctions:
         assert "2.2.2.2" in ip_range_list
         assert "25.24.23.22" in ip_range_list
 
+    @pytest.mark.ips_to_cidrs
+    def test_ips_to_ranges_minimal_cidr_cover(self):
+        """
+        Given
+            - A range of IPs which can not be covered by a single CIDR.
+        When
+            - Collapsing the IPs to CIDRs.
+        Then
+            - Ensure the range is covered by the minimal set of CIDRs.
+        """
+        from ExportIndicators import ips_to_ranges, COLLAPSE_TO_CIDR
+        ip_list = [f'1.1.1.{i}' for i in range(1, 19)] + ['1.1.1.5', '10.0.0.0']
+
+        ip_range_list = ips_to_ranges(ip_list, COLLAPSE_TO_CIDR)
+        assert ip_range_list == ['1.1.1.1', '1.1.1.2/31', '1.1.1.4/30', '1.1.1.8/29', '1.1.1.16/31', '1.1.1.18',
+                                 '10.0.0.0']
+
+    @pytest.mark.ips_to_cidrs
+    def test_ips_to_ranges_cidr_matches_netaddr(self):
+        """
+        Given
+            - Random blocks of consecutive IPv4 and IPv6 addresses.
+        When
+            - Collapsing the IPs to CIDRs.
+        Then
+            - Ensure the result is the same as merging the IPs with netaddr.
+        """
+        import random
+        from netaddr import cidr_merge
+        from ExportIndicators import ips_to_ranges, COLLAPSE_TO_CIDR
+        random.seed(0)
+        ip_list = []
+        for _ in range(50):
+            start = random.randrange(0, 2 ** 32 - 100)
+            ip_list.extend(str(IPAddress(start + i, 4)) for i in range(random.randrange(1, 100)))
+            start = random.randrange(0, 2 ** 128 - 100)
+            ip_list.extend(str(IPAddress(start + i, 6)) for i in range(random.randrange(1, 100)))
+
+        expected = [str(cidr.ip) if cidr.size == 1 else str(cidr) for cidr in cidr_merge(ip_list)]
+        assert sorted(ips_to_ranges(ip_list, COLLAPSE_TO_CIDR)) == sorted(expected)
+
+    @pytest.mark.ips_to_ranges
+    def test_ips_to_ranges_large_list(self):
+        """
+        Given
+            - 200k shuffled IPv4 addresses of random blocks and single IPs, a few of them as netaddr IPAddresses.
+        When
+            - Collapsing the IPs to Ranges and to CIDRs.
+        Then
+            - Ensure the ranges are exactly the runs of consecutive IPs and the CIDRs cover the same runs.
+        """
+        import random
+        import socket
+        import struct
+        from ExportIndicators import ips_to_ranges, COLLAPSE_TO_RANGES, COLLAPSE_TO_CIDR
+        random.seed(0)
+        values = set()  # type: set
+        while len(values) < 200000:
+            start = random.randrange(0, 2 ** 32 - 300)
+            values.update(range(start, start + random.choice([1, 1, 1, random.randrange(2, 300)])))
+        ip_list = [socket.inet_ntoa(struct.pack('!I', value)) for value in values]
+        random.shuffle(ip_list)
+        ip_list[:10] = [IPAddress(ip) for ip in ip_list[:10]]
+
+        expected_runs = []
+        for value in sorted(values):
+            if expected_runs and value == expected_runs[-1][1] + 1:
+                expected_runs[-1][1] = value
+            else:
+                expected_runs.append([value, value])
+
+        def ip_value(ip):
+            return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+        runs = []
+        for ip_range in ips_to_ranges(ip_list, COLLAPSE_TO_RANGES):
+            start, _, end = ip_range.partition('-')
+            runs.append([ip_value(start), ip_value(end or start)])
+        assert runs == expected_runs
+
+        runs = []
+        for cidr in ips_to_ranges(ip_list, COLLAPSE_TO_CIDR):
+            ip, _, prefix_len = cidr.partition('/')
+            start = ip_value(ip)
+            end = start + 2 ** (32 - int(prefix_len or 32)) - 1
+            if runs and start == runs[-1][1] + 1:
+                runs[-1][1] = end
+            else:
+                runs.append([start, end])
+        assert runs == expected_runs
+
+    @pytest.mark.ips_to_ranges
+    def test_ips_to_ranges_ipv6(self):
+        from ExportIndicators import ips_to_ranges, COLLAPSE_TO_RANGES, COLLAPSE_TO_CIDR
+        ip_list = ['2001:db8::1', '2001:db8::3', '2001:db8::2', '2001:db8::4', '2001:db8::10']
+
+        assert ips_to_ranges(ip_list, COLLAPSE_TO_RANGES) == ['2001:db8::1-2001:db8::4', '2001:db8::10']
+        assert ips_to_ranges(ip_list, COLLAPSE_TO_CIDR) == ['2001:db8::1', '2001:db8::2/127', '2001:db8::4',
+                                                            '2001:db8::10']
+
     def test_empty_integartion_context_mimtype(self, mocker):
         from ExportIndicators import get_outbound_mimetype
         mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
         mimtype = get_outbound_mimetype()
         assert mimtype == 'text/plain'
+
+    @pytest.mark.route_list_values
+    def test_route_list_values_conditional_and_compressed(self, mocker):
+        """
+        Given
+            - A rendered list which does not change between requests.
+        When
+            - Requesting the list with gzip encoding, then conditionally with its ETag and then with a Range.
+        Then
+            - Ensure the list is compressed, a 304 is returned for the unchanged list and a 206 for the range.
+        """
+        import gzip
+        import ExportIndicators as module
+        mocker.patch.object(demisto, 'params', return_value={'indicators_query': 'type:IP'})
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+        mocker.patch.object(module, 'get_outbound_ioc_values', return_value='1.1.1.1\n2.2.2.2')
+        mocker.patch.object(module, 'get_outbound_mimetype', return_value='text/plain')
+        client = module.APP.test_client()
+
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data) == b'1.1.1.1\n2.2.2.2'
+        etag = response.headers['ETag']
+        last_modified = response.headers['Last-Modified']
+
+        response = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert not response.data
+
+        response = client.get('/', headers={'If-Modified-Since': last_modified})
+        assert response.status_code == 304
+
+        response = client.get('/', headers={'Range': 'bytes=0-6'})
+        assert response.status_code == 206
+        assert response.data == b'1.1.1.1'
+
+        mocker.patch.object(module, 'get_outbound_ioc_values', return_value='3.3.3.3')
+        response = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert response.status_code == 200
+        assert gzip.decompress(response.data) == b'3.3.3.3'
+
+    def test_get_lists_params(self):
+        """
+        Given
+            - The Lists parameter with a valid and an invalid configuration.
+        When
+            - Parsing the named lists parameters.
+        Then
+            - Ensure the list parameters override the integration parameters, and an error is raised when invalid.
+        """
+        from ExportIndicators import get_lists_params, DemistoException
+        params = {'indicators_query': 'type:IP', 'format': 'text',
+                  'lists': '{"urls": {"indicators_query": "type:URL"}}'}
+        lists_params = get_lists_params(params)
+        assert lists_params['urls']['indicators_query'] == 'type:URL'
+        assert lists_params['urls']['format'] == 'text'
+        assert get_lists_params({}) == {}
+
+        with pytest.raises(DemistoException):
+            get_lists_params({'lists': '["urls"]'})
+
+    def test_route_named_list_values(self, mocker):
+        """
+        Given
+            - Three named lists, two of which have the same query.
+        When
+            - Requesting the named lists.
+        Then
+            - Ensure the lists with the same query are refreshed together with a single indicators fetch, each in
+              its own format, a repeated request is served from memory with the time of the refresh as its
+              Last-Modified, and that an unknown list returns 404.
+        """
+        import ExportIndicators as ei
+        params = {
+            'indicators_query': 'type:IP',
+            'format': 'text',
+            'list_size': '10',
+            'cache_refresh_rate': '5 minutes',
+            'lists': json.dumps({
+                'ips': {},
+                'ips-json': {'format': 'json'},
+                'urls': {'indicators_query': 'type:URL'}
+            })
+        }
+        integration_context: dict = {}
+        mocker.patch.object(ei, 'PAGE_SIZE', 200)
+        mocker.patch.object(ei, 'CACHED_OUTPUTS', {})
+        mocker.patch.object(demisto, 'params', return_value=params)
+        get_context = mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: json.loads(json.dumps(
+            integration_context)))
+        mocker.patch.object(demisto, 'setIntegrationContext', side_effect=lambda ctx: integration_context.update(ctx))
+        search = mocker.patch.object(demisto, 'searchIndicators', side_effect=lambda query, page, size: {
+            'iocs': [{'value': '1.1.1.1' if query == 'type:IP' else 'demisto.com', 'indicator_type': 'IP'}]})
+        client = ei.APP.test_client()
+
+        response = client.get('/lists/ips')
+        assert response.status_code == 200
+        assert response.data == b'1.1.1.1'
+        assert search.call_count == 1
+        output_time = integration_context['lists']['ips'][ei.CTX_OUTPUT_TIME_KEY]
+        assert response.last_modified.timestamp() == output_time // 1000
+
+        context_reads = get_context.call_count
+        assert client.get('/lists/ips').data == b'1.1.1.1'
+        assert get_context.call_count == context_reads
+
+        response = client.get('/lists/ips-json')
+        assert json.loads(response.data) == [{'indicator': '1.1.1.1', 'value': {'indicator_type': 'IP'}}]
+        assert response.mimetype == 'application/json'
+        assert search.call_count == 1
+
+        response = client.get('/lists/urls')
+        assert response.data == b'demisto.com'
+        assert search.call_count == 2
+        assert set(integration_context['lists'].keys()) == {'ips', 'ips-json', 'urls'}
+
+        assert client.get('/lists/unknown').status_code == 404
+
+        params['on_demand'] = True
+        response = client.get('/lists/ips')
+        assert response.status_code == 400
+        assert response.data.decode() == ei.CTX_LISTS_ON_DEMAND_ERR_MSG
+
+    def test_refresh_lists_context_concurrent(self, mocker):
+        """
+        Given
+            - Two named lists with the same query, and another list saved by a concurrent request while they refresh.
+        When
+            - Refreshing the two lists in a pass, and then again in a second pass.
+        Then
+            - Ensure each pass fetches the indicators once for both lists without saving them in the lists contexts,
+              and the list saved concurrently is kept.
+        """
+        import ExportIndicators as ei
+        integration_context: dict = {'lists': {}}
+        mocker.patch.object(ei, 'PAGE_SIZE', 200)
+        mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: json.loads(json.dumps(
+            integration_context)))
+        mocker.patch.object(demisto, 'setIntegrationContext', side_effect=lambda ctx: integration_context.update(ctx))
+
+        def search_indicators(query, page, size):
+            integration_context['lists']['concurrent'] = {'last_run': 1}
+            return {'iocs': [{'value': '1.1.1.1', 'indicator_type': 'IP'}]}
+
+        search = mocker.patch.object(demisto, 'searchIndicators', side_effect=search_indicators)
+        lists_request_args = {'ips': ei.RequestArguments(query='type:IP', limit=10),
+                              'ips-json': ei.RequestArguments(query='type:IP', out_format='json', limit=10)}
+
+        ei.refresh_lists_context(lists_request_args)
+        assert search.call_count == 1
+        assert set(integration_context['lists']) == {'ips', 'ips-json', 'concurrent'}
+        assert 'current_iocs' not in integration_context['lists']['ips']
+        assert 'current_iocs' not in integration_context['lists']['ips-json']
+
+        ei.refresh_lists_context(lists_request_args)
+        assert search.call_count == 2
+
+    @pytest.mark.parametrize('out_format, collapse_ips', [
+        ('text', "Don't Collapse"), ('text', 'To CIDRs'), ('csv', "Don't Collapse"), ('json', "Don't Collapse"),
+        ('json-seq', "Don't Collapse"), ('XSOAR json', "Don't Collapse"), ('XSOAR json-seq', "Don't Collapse"),
+        ('XSOAR csv', "Don't Collapse"), ('McAfee Web Gateway', "Don't Collapse"), ('PAN-OS URL', "Don't Collapse"),
+        ('Symantec ProxySG', "Don't Collapse")
+    ])
+    def test_iter_formatted_output(self, mocker, out_format, collapse_ips):
+        """
+        Given
+            - IoCs and a request for each of the output formats.
+        When
+            - Streaming the output with a small chunk size.
+        Then
+            - Ensure the chunks add up to the output created by create_values_for_returned_dict.
+        """
+        import ExportIndicators as ei
+        mocker.patch.object(ei, 'STREAM_CHUNK_SIZE', 100)
+        request_args = ei.RequestArguments(query='', out_format=out_format, collapse_ips=collapse_ips,
+                                           category_attribute='category')
+
+        def load_iocs():
+            with open('ExportIndicators_test/TestHelperFunctions/demisto_url_iocs.json', 'r') as url_iocs_f, \
+                    open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_f:
+                return json.load(url_iocs_f) + json.load(iocs_f)
+
+        out_dict, _ = ei.create_values_for_returned_dict(load_iocs(), request_args)
+        chunks = list(ei.iter_formatted_output(iter(load_iocs()), request_args))
+        assert ''.join(chunks) == out_dict[ei.CTX_VALUES_KEY]
+        if out_format != 'Symantec ProxySG':
+            assert len(chunks) > 1
+
+    def test_route_list_values_streamed(self, mocker):
+        """
+        Given
+            - An instance configured to stream its output, with indicators spread over several pages.
+        When
+            - Requesting the list with a limit and an offset, twice within the refresh rate, and then in another format.
+        Then
+            - Ensure the list is streamed page by page and saved in the integration context once fully streamed, the
+              second request is served from the context and the request in another format is streamed again.
+        """
+        import ExportIndicators as ei
+        integration_context: dict = {}
+        mocker.patch.object(ei, 'PAGE_SIZE', 2)
+        mocker.patch.object(demisto, 'params', return_value={'indicators_query': 'type:IP', 'stream_output': True,
+                                                             'cache_refresh_rate': '5 minutes'})
+        mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: json.loads(json.dumps(
+            integration_context)))
+        mocker.patch.object(demisto, 'setIntegrationContext', side_effect=lambda ctx: integration_context.update(ctx))
+        search = mocker.patch.object(demisto, 'searchIndicators', side_effect=lambda query, page, size: {
+            'iocs': [{'value': f'1.1.1.{index}', 'indicator_type': 'IP'}
+                     for index in range(page * size, min(page * size + size, 5))]})
+        client = ei.APP.test_client()
+
+        response = client.get('/?n=3&s=1')
+        assert response.status_code == 200
+        assert 'ETag' not in response.headers
+        assert response.data == b'1.1.1.1\n1.1.1.2\n1.1.1.3'
+        assert search.call_count == 2
+        assert integration_context['last_output'][ei.CTX_VALUES_KEY] == '1.1.1.1\n1.1.1.2\n1.1.1.3'
+        assert integration_context['current_iocs'] == []
+
+        response = client.get('/?n=3&s=1')
+        assert 'ETag' in response.headers
+        assert response.data == b'1.1.1.1\n1.1.1.2\n1.1.1.3'
+        assert search.call_count == 2
+
+        response = client.get('/?v=json&n=10')
+        assert 'ETag' not in response.headers
+        assert json.loads(response.data) == [{'indicator': f'1.1.1.{index}', 'value': {'indicator_type': 'IP'}}
+                                             for index in range(5)]
+        assert response.mimetype == 'application/json'
+
+    def test_iter_streamed_output_closed(self, mocker):
+        """
+        Given
+            - A list streamed with a page size smaller than the list.
+        When
+            - The stream is closed before it is fully sent, e.g. when the client disconnects.
+        Then
+            - Ensure the partially streamed output is not saved.
+        """
+        import ExportIndicators as ei
+        mocker.patch.object(ei, 'PAGE_SIZE', 2)
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+        set_context = mocker.patch.object(demisto, 'setIntegrationContext')
+        mocker.patch.object(demisto, 'searchIndicators', side_effect=lambda query, page, size: {
+            'iocs': [{'value': f'1.1.1.{index}', 'indicator_type': 'IP'}
+                     for index in range(page * size, min(page * size + size, 5))]})
+
+        output_chunks = ei.iter_streamed_output(ei.RequestArguments(query='type:IP', limit=5))
+        assert next(output_chunks)
+        output_chunks.close()
+        assert not set_context.called
+
+    def test_route_list_values_streamed_error(self, mocker):
+        """
+        Given
+            - An instance configured to stream its output.
+        When
+            - Requesting the list while searching the indicators fails.
+        Then
+            - Ensure an error response is returned instead of a streamed response, and nothing is saved.
+        """
+        import ExportIndicators as ei
+        mocker.patch.object(demisto, 'params', return_value={'indicators_query': 'type:IP', 'stream_output': True})
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+        set_context = mocker.patch.object(demisto, 'setIntegrationContext')
+        mocker.patch.object(demisto, 'searchIndicators', side_effect=ValueError('Invalid query'))
+
+        response = ei.APP.test_client().get('/')
+        assert response.status_code == 400
+        assert b'Invalid query' in response.data
+        assert not set_context.called
@@ -248,6 +248,7 @@ def main():
 
     initial_interval = params.get("initial_interval")
     fetch_full_feed = params.get("fetch_full_feed") or False
+    delta_mode = params.get("delta_mode") or False
     limit = try_parse_integer(params.get("limit") or -1)
     limit_per_request = try_parse_integer(params.get("limit_per_request"))
     filter_args = handle_filter_arg(params.get("filter_args"))
@@ -290,9 +291,13 @@ def main():
                 fetch_full_feed,
                 filter_args,
             )
-            for iter_ in batch(indicators, batch_size=2000):
+            # in delta mode only the indicators which were added or changed since the last fetch are submitted
+            delta = FeedIndicatorsDelta.from_integration_context(integration_ctx) if delta_mode else None
+            for iter_ in batch(delta.filter(indicators) if delta else indicators, batch_size=2000):
                 demisto.createIndicators(iter_)
 
+            if delta:
+                delta.update_integration_context(integration_ctx)
             demisto.setIntegrationContext(integration_ctx)
         else:
             return_results(commands[command](client, **args))  # type: ignore[operator]
@@ -5,7 +5,10 @@ from datetime import datetime
 from typing import Dict, List, Any, Optional, Tuple, Union
 import uuid
 import json
+import copy
+import time
 import requests
+from requests.adapters import HTTPAdapter
 
 # disable insecure warnings
 requests.packages.urllib3.disable_warnings()
@@ -26,6 +29,24 @@ XPATH_OBJECTS = ''
 
 XPATH_RULEBASE = ''
 
+# keep-alive session shared by all the API calls of a single run
+HTTP_POOL_SIZE = 10
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE))
+SESSION.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE))
+
+# cache of candidate configuration reads, persisted in the integration context across commands
+USE_CONFIG_CACHE = False
+CONFIG_CACHE_TTL = 10  # minutes
+CONFIG_CACHE_MAX_ENTRIES = 100
+CONFIG_CACHE_CONTEXT_KEY = 'config_cache'
+CONFIG_CACHE: Optional[Dict[str, Dict[str, Any]]] = None  # loaded from the integration context on first use
+CONFIG_CACHE_CLEARED = 0.0  # the last time the configuration was modified by this command
+CONFIG_CACHE_DIRTY = False
+CONFIG_READ_ACTIONS = ('get', 'show')
+# request types that never change the candidate configuration
+CONFIG_SAFE_TYPES = ('op', 'log', 'report', 'export', 'keygen', 'version', 'user-id')
+
 # Security rule arguments for output handling
 SECURITY_RULE_ARGS = {
     'rulename': 'Name',
@@ -87,15 +108,28 @@ def http_request(uri: str, method: str, headers: dict = {},
     """
     Makes an API call with the given arguments
     """
-    result = requests.request(
-        method,
-        uri,
-        headers=headers,
-        data=body,
-        verify=USE_SSL,
-        params=params,
-        files=files
-    )
+    request_args = {**(params or {}), **(body if isinstance(body, dict) else {})}
+    cache_key = get_config_cache_key(request_args)
+    fetch_time = time.time()
+    if cache_key:
+        cached_result = get_cached_config(cache_key)
+        if cached_result is not None:
+            return cached_result
+
+    try:
+        result = SESSION.request(
+            method,
+            uri,
+            headers=headers,
+            data=body,
+            verify=USE_SSL,
+            params=params,
+            files=files
+        )
+    finally:
+        # cleared once the request completed, so reads fetched while it was processed are dropped as well
+        if not cache_key and USE_CONFIG_CACHE and config_changed(request_args):
+            clear_config_cache()
 
     if result.status_code < 200 or result.status_code >= 300:
         raise Exception(
@@ -105,7 +139,7 @@ def http_request(uri: str, method: str, headers: dict = {},
     if is_pcap:
         return result
 
-    json_result = json.loads(xml2json(result.text))
+    json_result = xml2dict(result.text)
 
     # handle raw response that doe not contain the response key, e.g xonfiguration export
     if 'response' not in json_result or '@code' not in json_result['response']:
@@ -180,9 +214,105 @@ def http_request(uri: str, method: str, headers: dict = {},
         else:
             raise Exception('Request Failed.\n' + str(json_result['response']))
 
+    if cache_key:
+        cache_config(cache_key, json_result, fetch_time)
     return json_result
 
 
+def get_config_cache_key(request_args: dict) -> Optional[str]:
+    """
+    Returns the config cache key of a candidate configuration read, or None if the request should not be cached.
+    The key is scoped to the device group (or vsys) and the target device of the read.
+    """
+    if not USE_CONFIG_CACHE or request_args.get('type') != 'config' \
+            or request_args.get('action') not in CONFIG_READ_ACTIONS or not request_args.get('xpath'):
+        return None
+    return json.dumps([DEVICE_GROUP or VSYS, request_args.get('target', ''), request_args['action'],
+                       request_args['xpath']])
+
+
+def get_config_cache() -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the unexpired config cache entries, loading them from the integration context on first use.
+    """
+    global CONFIG_CACHE
+    if CONFIG_CACHE is None:
+        CONFIG_CACHE = get_live_config_cache_entries(demisto.getIntegrationContext().get(CONFIG_CACHE_CONTEXT_KEY) or {})
+    return CONFIG_CACHE
+
+
+def get_live_config_cache_entries(stored_cache: dict, cleared: float = 0) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the entries of a stored config cache which are not expired and were fetched after its last clear.
+    """
+    now = time.time()
+    cleared = max(cleared, stored_cache.get('cleared', 0))
+    return {key: entry for key, entry in (stored_cache.get('entries') or {}).items()
+            if entry.get('expires', 0) > now and entry.get('fetched', 0) > cleared}
+
+
+def save_config_cache():
+    """
+    Stores the config cache in the integration context once per command, if it was updated.
+    The cache is merged with the entries stored by concurrent commands, and entries fetched before the latest
+    configuration change of any of them are dropped.
+    """
+    global CONFIG_CACHE_DIRTY
+    if not CONFIG_CACHE_DIRTY:
+        return
+    context = demisto.getIntegrationContext()
+    stored_cache = context.get(CONFIG_CACHE_CONTEXT_KEY) or {}
+    cleared = max(CONFIG_CACHE_CLEARED, stored_cache.get('cleared', 0))
+    entries = get_live_config_cache_entries(stored_cache, cleared)
+    for key, entry in get_config_cache().items():
+        if entry['fetched'] > cleared and entry['fetched'] >= entries.get(key, {}).get('fetched', 0):
+            entries[key] = entry
+    entries = dict(sorted(entries.items(), key=lambda item: item[1]['expires'], reverse=True)[:CONFIG_CACHE_MAX_ENTRIES])
+    context[CONFIG_CACHE_CONTEXT_KEY] = {'entries': entries, 'cleared': cleared}
+    demisto.setIntegrationContext(context)
+    CONFIG_CACHE_DIRTY = False
+
+
+def get_cached_config(cache_key: str) -> Optional[dict]:
+    entry = get_config_cache().get(cache_key)
+    if entry and entry['expires'] > time.time():
+        return copy.deepcopy(entry['value'])
+    return None
+
+
+def cache_config(cache_key: str, result: dict, fetch_time: float):
+    """
+    Stores a configuration read in the cache, evicting the entries closest to expiration above the size limit.
+    """
+    global CONFIG_CACHE_DIRTY
+    if fetch_time <= CONFIG_CACHE_CLEARED:
+        return
+    cache = get_config_cache()
+    cache[cache_key] = {'value': copy.deepcopy(result), 'fetched': fetch_time,
+                        'expires': time.time() + CONFIG_CACHE_TTL * 60}
+    while len(cache) > CONFIG_CACHE_MAX_ENTRIES:
+        del cache[min(cache, key=lambda key: cache[key]['expires'])]
+    CONFIG_CACHE_DIRTY = True
+
+
+def clear_config_cache():
+    global CONFIG_CACHE, CONFIG_CACHE_CLEARED, CONFIG_CACHE_DIRTY
+    CONFIG_CACHE = {}
+    CONFIG_CACHE_CLEARED = time.time()
+    CONFIG_CACHE_DIRTY = True
+
+
+def config_changed(request_args: dict) -> bool:
+    """
+    Checks whether a request may modify the candidate configuration (set, edit, delete, move, commit, etc.).
+    """
+    request_type = request_args.get('type')
+    if request_type == 'op':
+        cmd = str(request_args.get('cmd', ''))
+        return '<load>' in cmd or '<revert>' in cmd
+    return request_type not in CONFIG_SAFE_TYPES
+
+
 def add_argument_list(arg: Any, field_name: str, member: Optional[bool], any_: Optional[bool] = False) -> str:
     member_stringify_list = ''
     if arg:
@@ -3079,7 +3209,7 @@ def panorama_list_pcaps_command(args: dict):
         raise Exception('can not provide dlp-pcap without password')
 
     result = http_request(URL, 'GET', params=params, is_pcap=True)
-    json_result = json.loads(xml2json(result.text))['response']
+    json_result = xml2dict(result.text)['response']
     if json_result['@status'] != 'success':
         raise Exception('Request to get list of Pcaps Failed.\nStatus code: ' + str(
             json_result['response']['@code']) + '\nWith message: ' + str(json_result['response']['msg']['line']))
@@ -6583,7 +6713,8 @@ def create_wildfire_best_practice_profile_command(profile_name: str):
 
 def initialize_instance(args: Dict[str, str], params: Dict[str, str]):
     global URL, API_KEY, USE_SSL, USE_URL_FILTERING, VSYS, DEVICE_GROUP, XPATH_SECURITY_RULES, XPATH_OBJECTS, \
-        XPATH_RULEBASE, TEMPLATE, PRE_POST
+        XPATH_RULEBASE, TEMPLATE, PRE_POST, USE_CONFIG_CACHE, CONFIG_CACHE_TTL, CONFIG_CACHE, CONFIG_CACHE_CLEARED, \
+        CONFIG_CACHE_DIRTY
     if not params.get('port'):
         raise DemistoException('Set a port for the instance')
 
@@ -6592,6 +6723,11 @@ def initialize_instance(args: Dict[str, str], params: Dict[str, str]):
     USE_SSL = not params.get('insecure')
     USE_URL_FILTERING = params.get('use_url_filtering')
     TEMPLATE = params.get('template')
+    USE_CONFIG_CACHE = argToBoolean(params.get('config_cache', False))
+    CONFIG_CACHE_TTL = int(params.get('config_cache_ttl') or CONFIG_CACHE_TTL)
+    CONFIG_CACHE = None
+    CONFIG_CACHE_CLEARED = 0.0
+    CONFIG_CACHE_DIRTY = False
 
     # determine a vsys or a device-group
     VSYS = params.get('vsys', '')
@@ -7003,6 +7139,7 @@ def main():
         return_error(str(err))
 
     finally:
+        save_config_cache()
         LOG.print_log()
 
 
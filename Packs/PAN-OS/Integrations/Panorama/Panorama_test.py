@@ -1,3 +1,5 @@
+import copy
+import time
 import pytest
 import demistomock as demisto
 
@@ -250,3 +252,159 @@ def test_validate_search_time():
     with pytest.raises(Exception):
         assert validate_search_time('219/12/26 00:00:00')
         assert validate_search_time('219/10/35')
+
+
+def mock_integration_context(mocker) -> dict:
+    integration_context: dict = {}
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: copy.deepcopy(integration_context))
+    mocker.patch.object(demisto, 'setIntegrationContext',
+                        side_effect=lambda context: integration_context.update(copy.deepcopy(context)))
+    return integration_context
+
+
+def new_config_cache_command(Panorama):
+    """Saves the config cache as the end of a command does, and resets it as a new command starts."""
+    Panorama.save_config_cache()
+    Panorama.CONFIG_CACHE = None
+    Panorama.CONFIG_CACHE_CLEARED = 0.0
+
+
+def mock_config_cache(mocker):
+    import Panorama
+    mocker.patch.object(Panorama, 'USE_CONFIG_CACHE', True)
+    mocker.patch.object(Panorama, 'CONFIG_CACHE', None)
+    mocker.patch.object(Panorama, 'CONFIG_CACHE_CLEARED', 0.0)
+    mocker.patch.object(Panorama, 'CONFIG_CACHE_DIRTY', False)
+    mocker.patch.object(Panorama, 'DEVICE_GROUP', 'dg1')
+    Panorama.URL = 'https://1.1.1.1:443/api/'
+
+
+def test_config_cache(mocker, requests_mock):
+    """
+    Given:
+        - An instance with the configuration cache enabled.
+    When:
+        - Reading the same configuration xpath in two commands, then modifying the configuration and reading again.
+    Then:
+        - Ensure the second read is served from the integration context and the read after the modification
+          queries the API again.
+    """
+    import Panorama
+    mock_integration_context(mocker)
+    mock_config_cache(mocker)
+    get_xml = '<response status="success" code="19"><result><entry name="addr1"/></result></response>'
+    set_xml = '<response status="success" code="20"><msg>command succeeded</msg></response>'
+    get_mock = requests_mock.get(Panorama.URL, text=get_xml)
+    requests_mock.post(Panorama.URL, text=set_xml)
+    get_params = {'type': 'config', 'action': 'get', 'xpath': "/config/shared/address", 'key': 'key'}
+
+    first = Panorama.http_request(Panorama.URL, 'GET', params=get_params)
+    first['response']['result'] = None
+    new_config_cache_command(Panorama)
+    second = Panorama.http_request(Panorama.URL, 'GET', params=get_params)
+    assert get_mock.call_count == 1
+    assert second['response']['result'] == {'entry': {'@name': 'addr1'}}
+
+    Panorama.http_request(Panorama.URL, 'POST', body={'type': 'config', 'action': 'set', 'xpath': "/config/shared/address",
+                                                      'element': '<entry name="addr2"/>', 'key': 'key'})
+    new_config_cache_command(Panorama)
+    Panorama.http_request(Panorama.URL, 'GET', params=get_params)
+    assert get_mock.call_count == 2
+
+
+def test_config_cache_scope_and_expiration(mocker, requests_mock):
+    """
+    Given:
+        - An instance with the configuration cache enabled.
+    When:
+        - Reading the same xpath for another device group and another target, and after the cache expired.
+    Then:
+        - Ensure each of these reads queries the API.
+    """
+    import Panorama
+    mock_integration_context(mocker)
+    mock_config_cache(mocker)
+    get_xml = '<response status="success" code="19"><result><entry name="addr1"/></result></response>'
+    get_mock = requests_mock.get(Panorama.URL, text=get_xml)
+    get_params = {'type': 'config', 'action': 'get', 'xpath': "/config/shared/address", 'key': 'key'}
+
+    Panorama.http_request(Panorama.URL, 'GET', params=get_params)
+    Panorama.http_request(Panorama.URL, 'GET', params=dict(get_params, target='007051000000001'))
+    Panorama.DEVICE_GROUP = 'dg2'
+    Panorama.http_request(Panorama.URL, 'GET', params=get_params)
+    assert get_mock.call_count == 3
+
+    mocker.patch.object(Panorama.time, 'time', return_value=time.time() + Panorama.CONFIG_CACHE_TTL * 60 + 1)
+    new_config_cache_command(Panorama)
+    Panorama.http_request(Panorama.URL, 'GET', params=get_params)
+    assert get_mock.call_count == 4
+
+
+def test_config_cache_concurrent_commands(mocker, requests_mock):
+    """
+    Given:
+        - An instance with the configuration cache enabled.
+    When:
+        - Two commands read different xpaths concurrently and save the cache one after the other.
+        - A command reads an xpath while another command modifies the configuration and saves first.
+    Then:
+        - Ensure the reads of both commands are kept in the cache.
+        - Ensure the read fetched before the modification is not saved back to the cache.
+    """
+    import Panorama
+    integration_context = mock_integration_context(mocker)
+    mock_config_cache(mocker)
+    get_xml = '<response status="success" code="19"><result><entry name="addr1"/></result></response>'
+    set_xml = '<response status="success" code="20"><msg>command succeeded</msg></response>'
+    get_mock = requests_mock.get(Panorama.URL, text=get_xml)
+    requests_mock.post(Panorama.URL, text=set_xml)
+    address_params = {'type': 'config', 'action': 'get', 'xpath': "/config/shared/address", 'key': 'key'}
+    service_params = {'type': 'config', 'action': 'get', 'xpath': "/config/shared/service", 'key': 'key'}
+
+    def run_command(requests):
+        """Runs the requests as a separate command and restores the state of the current one."""
+        state = Panorama.CONFIG_CACHE, Panorama.CONFIG_CACHE_CLEARED, Panorama.CONFIG_CACHE_DIRTY
+        Panorama.CONFIG_CACHE, Panorama.CONFIG_CACHE_CLEARED, Panorama.CONFIG_CACHE_DIRTY = None, 0.0, False
+        for method, kwargs in requests:
+            Panorama.http_request(Panorama.URL, method, **kwargs)
+        Panorama.save_config_cache()
+        Panorama.CONFIG_CACHE, Panorama.CONFIG_CACHE_CLEARED, Panorama.CONFIG_CACHE_DIRTY = state
+
+    Panorama.http_request(Panorama.URL, 'GET', params=address_params)
+    run_command([('GET', {'params': service_params})])
+    new_config_cache_command(Panorama)
+    assert len(integration_context[Panorama.CONFIG_CACHE_CONTEXT_KEY]['entries']) == 2
+
+    Panorama.http_request(Panorama.URL, 'GET', params=address_params)
+    Panorama.http_request(Panorama.URL, 'GET', params=service_params)
+    assert get_mock.call_count == 2
+
+    group_params = {'type': 'config', 'action': 'get', 'xpath': "/config/shared/address-group", 'key': 'key'}
+    Panorama.http_request(Panorama.URL, 'GET', params=group_params)
+    run_command([('POST', {'body': {'type': 'config', 'action': 'set', 'xpath': "/config/shared/address",
+                                    'element': '<entry name="addr2"/>', 'key': 'key'}})])
+    new_config_cache_command(Panorama)
+    assert integration_context[Panorama.CONFIG_CACHE_CONTEXT_KEY]['entries'] == {}
+
+    Panorama.http_request(Panorama.URL, 'GET', params=group_params)
+    Panorama.http_request(Panorama.URL, 'GET', params=address_params)
+    assert get_mock.call_count == 5
+
+
+def test_config_cache_disabled(requests_mock):
+    """
+    Given:
+        - An instance with the configuration cache disabled (default).
+    When:
+        - Reading the same configuration xpath twice.
+    Then:
+        - Ensure both reads query the API.
+    """
+    import Panorama
+    Panorama.URL = 'https://1.1.1.1:443/api/'
+    get_xml = '<response status="success" code="19"><result><entry name="addr1"/></result></response>'
+    get_mock = requests_mock.get(Panorama.URL, text=get_xml)
+    get_params = {'type': 'config', 'action': 'get', 'xpath': "/config/shared/address", 'key': 'key'}
+    Panorama.http_request(Panorama.URL, 'GET', params=get_params)
+    Panorama.http_request(Panorama.URL, 'GET', params=get_params)
+    assert get_mock.call_count == 2
@@ -22,6 +22,29 @@ MESSAGE_CODE = r'Message Code: (.+)'
 RESPONSE_CODE = r'Response code: (.+)'
 ALL_SUPPORTED_PROTOCOLS = ['HTTP', 'DNS', 'LLMNR', 'SYSLOG', 'SMTP', 'NETBIOS', 'ICMP', 'KERBEROS',
                            'TELNET', 'SSH', 'IRC', 'FTP', 'SMB2']
+# Bounds of the packets text buffered before running the IP, URL and Email regexes on it in bulk
+REGEX_BATCH_PACKETS = 1000
+REGEX_BATCH_CHARS = 8 * 1024 * 1024
+
+
+class Flow():
+    """
+    Compact record of the packets of a single flow.
+    """
+    __slots__ = ('transport', 'min_time', 'max_time', 'bytes', 'counter')
+
+    def __init__(self, transport: str):
+        self.transport = transport
+        self.min_time = float('inf')
+        self.max_time = -float('inf')
+        self.bytes = 0
+        self.counter = 0
+
+    def add_packet(self, packet_epoch_time: float, length: int) -> None:
+        self.min_time = min(self.min_time, packet_epoch_time)
+        self.max_time = max(self.max_time, packet_epoch_time)
+        self.bytes += length
+        self.counter += 1
 
 
 class PCAP():
@@ -48,13 +71,15 @@ class PCAP():
         self.min_time = float('inf')
         self.max_time = -float('inf')
         self.conversations: Dict[tuple, Any] = {}
-        self.flows: Dict[tuple, Any] = {}
+        self.flows: Dict[tuple, Flow] = {}
         self.unique_source_ip: set = set([])
         self.unique_dest_ip: set = set([])
         self.ips_extracted: set = set([])
         self.urls_extracted: set = set([])
         self.emails_extracted: set = set([])
         self.homemade_extracted: set = set([])
+        self.regex_batch: list = list()
+        self.regex_batch_chars = 0
         self.last_layer: set = set([])
         self.irc_data: list = list()
         self.protocol_data: Dict[str, Any] = dict()
@@ -313,13 +338,16 @@ class PCAP():
         """
 
         layers = layers_str.split(',')
-        if is_reg_extract:
-            self.ips_extracted.update(self.reg_ip.findall(str(packet)))
-            self.emails_extracted.update(self.reg_email.findall(str(packet)))
-            self.urls_extracted.update(self.reg_url.findall(str(packet)))
+        if is_reg_extract or self.homemade_regex:
+            packet_text = str(packet)
+            if is_reg_extract:
+                self.regex_batch.append(packet_text)
+                self.regex_batch_chars += len(packet_text)
+                if len(self.regex_batch) >= REGEX_BATCH_PACKETS or self.regex_batch_chars >= REGEX_BATCH_CHARS:
+                    self.extract_regex_batch()
 
-        if self.homemade_regex:
-            self.homemade_extracted.update(self.reg_homemade.findall((str(packet))))
+            if self.homemade_regex:
+                self.homemade_extracted.update(self.reg_homemade.findall(packet_text))
 
         if 'DNS' in self.extracted_protocols and 'DNS' in layers:
             return self.extract_dns(packet)
@@ -361,6 +389,20 @@ class PCAP():
             if 'SMTP' in layers:
                 return self.extract_smtp(packet)
 
+    def extract_regex_batch(self) -> None:
+        """
+        Runs the IP, URL and Email regexes once over the text of all the buffered packets, and empties the buffer.
+        None of these regexes match a new line, so a match never spans two packets.
+        """
+        if not self.regex_batch:
+            return
+        batch_text = '\n'.join(self.regex_batch)
+        self.ips_extracted.update(self.reg_ip.findall(batch_text))
+        self.emails_extracted.update(self.reg_email.findall(batch_text))
+        self.urls_extracted.update(self.reg_url.findall(batch_text))
+        self.regex_batch = list()
+        self.regex_batch_chars = 0
+
     @logger
     def get_outputs(self, conversation_number_to_display=15, is_flows=False, is_reg_extract=False):
         if self.num_of_packets == 0:
@@ -410,7 +452,7 @@ class PCAP():
                                        'Data': list(self.telnet_data),
                                        'EntryID': self.entry_id}
         if is_flows:
-            ec['PCAPResultsFlow'] = flows_to_ec(self.flows)
+            ec['PCAPResultsFlow'] = flows_to_ec(self.flows, self.entry_id)
         if is_reg_extract:
             general_context['IP'] = list(self.ips_extracted)
             general_context['URL'] = list(self.urls_extracted)
@@ -471,7 +513,8 @@ class PCAP():
                 self.num_of_packets += 1
 
                 # count bytes
-                self.bytes_transmitted += int(packet.length)
+                packet_length = int(packet.length)
+                self.bytes_transmitted += packet_length
 
                 # count num of streams + get src/dest ports
                 tcp = packet.get_multiple_layers('tcp')
@@ -504,17 +547,10 @@ class PCAP():
                         if (b, dest_port, a, src_port) in self.flows.keys():
                             b, a, src_port, dest_port = a, b, dest_port, src_port
                         flow = (a, src_port, b, dest_port)
-                        flow_data = self.flows.get(flow, {'EntryID': self.entry_id,
-                                                          'Transport': tcp_or_udp,
-                                                          'min_time': float('inf'),
-                                                          'max_time': -float('inf'),
-                                                          'bytes': 0,
-                                                          'counter': 0})
-                        flow_data['min_time'] = min(flow_data['min_time'], packet_epoch_time)
-                        flow_data['max_time'] = max(flow_data['min_time'], packet_epoch_time)
-                        flow_data['bytes'] += int(packet.length)
-                        flow_data['counter'] += 1
-                        self.flows[flow] = flow_data
+                        flow_data = self.flows.get(flow)
+                        if flow_data is None:
+                            flow_data = self.flows[flow] = Flow(tcp_or_udp)
+                        flow_data.add_packet(packet_epoch_time, packet_length)
 
                     # gather http data
                     if 'HTTP' in self.extracted_protocols:
@@ -557,6 +593,9 @@ class PCAP():
 
                 self.extract_context_from_packet(packet, layers, is_reg_extract)
 
+            if is_reg_extract:
+                self.extract_regex_batch()
+
         except pyshark.capture.capture.TSharkCrashException:
             raise ValueError("Could not find packets. Make sure that the file is a .cap/.pcap/.pcapng file, "
                              "the filter is of the correct syntax and that the rsa key is added correctly.")
@@ -645,20 +684,21 @@ def flows_to_md(flows: dict, disp_num: int) -> str:
 
     """
     md = '|A|port|B|port|# of Packets|\n|---|---|---|---|---|\n'
-    ordered_flow_list = sorted(flows.items(), key=lambda x: x[1].get('counter'), reverse=True)
+    ordered_flow_list = sorted(flows.items(), key=lambda x: x[1].counter, reverse=True)
     disp_num = min(disp_num, len(ordered_flow_list))
     for flow in ordered_flow_list[:disp_num]:
         (ipA, portA, ipB, portB), data = flow
-        md += f'|{ipA}|{portA}|{ipB}|{portB}|{data.get("counter", 0)}|\n'
+        md += f'|{ipA}|{portA}|{ipB}|{portB}|{data.counter}|\n'
     return md
 
 
 @logger
-def flows_to_ec(flows: dict) -> list:
+def flows_to_ec(flows: dict, entry_id: str) -> list:
     """
 
     Args:
         flows: A dictionary that hold the flows data
+        entry_id: The entry ID of the PCAP the flows were mined from.
 
     Returns:
         flows data in ec format.
@@ -671,12 +711,12 @@ def flows_to_ec(flows: dict) -> list:
             'SourcePort': flow[1],
             'DestIP': flow[2],
             'DestPort': flow[3],
-            'Duration': round(flow_data.get('max_time', 0) - flow_data.get('min_time', 0)),
-            'StartTime': formatEpochDate(flow_data.get('min_time', 0)),
-            'EndTime': formatEpochDate(flow_data.get('max_time', 0)),
-            'Bytes': flow_data.get('bytes', 0),
-            'EntryID': flow_data.get('EntryID'),
-            'Transport': flow_data.get('Transport')
+            'Duration': round(flow_data.max_time - flow_data.min_time),
+            'StartTime': formatEpochDate(flow_data.min_time),
+            'EndTime': formatEpochDate(flow_data.max_time),
+            'Bytes': flow_data.bytes,
+            'EntryID': entry_id,
+            'Transport': flow_data.transport
         }
         flows_ec.append(flow_ec)
     return flows_ec
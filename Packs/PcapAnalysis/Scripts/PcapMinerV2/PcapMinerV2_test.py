@@ -75,3 +75,54 @@ def test_mine_pcap():
     assert len(ec['PCAPResultsSMB2']) == 7
     assert raw['URL'][0] == 'http://239.255.255.250:1900*'
     assert raw['Regex'] != []
+
+
+def test_flows_to_md_and_ec():
+    """
+    Given:
+        - Two flows, recorded with out of order packets.
+    When:
+        - Converting the flows to markdown and to context.
+    Then:
+        - Ensure the flows are ordered by their packet count and the flow times and bytes are aggregated.
+    """
+    from PcapMinerV2 import Flow, flows_to_md, flows_to_ec
+    first_flow = Flow('TCP')
+    for packet_time, length in [(20.0, 100), (10.0, 50), (15.0, 10)]:
+        first_flow.add_packet(packet_time, length)
+    second_flow = Flow('UDP')
+    second_flow.add_packet(5.0, 70)
+    flows = {('1.1.1.1', 1234, '2.2.2.2', 80): second_flow, ('1.1.1.1', 1235, '2.2.2.2', 443): first_flow}
+
+    assert flows_to_md(flows, 15) == '|A|port|B|port|# of Packets|\n|---|---|---|---|---|\n' \
+                                     '|1.1.1.1|1235|2.2.2.2|443|3|\n|1.1.1.1|1234|2.2.2.2|80|1|\n'
+    flow_ec = flows_to_ec(flows, 'entry_id')[1]
+    assert flow_ec['Duration'] == 10
+    assert flow_ec['Bytes'] == 160
+    assert flow_ec['Transport'] == 'TCP'
+    assert flow_ec['EntryID'] == 'entry_id'
+
+
+def test_extract_regex_batch(mocker):
+    """
+    Given:
+        - Packets containing IPs, URLs and Emails, with a batch smaller than the number of packets.
+    When:
+        - Extracting the regexes from the packets.
+    Then:
+        - Ensure the batched extraction finds exactly what a per-packet extraction finds.
+    """
+    import PcapMinerV2
+    from PcapMinerV2 import PCAP
+    mocker.patch.object(PcapMinerV2, 'REGEX_BATCH_PACKETS', 2)
+    packets = ['Layer HTTP:\n\tHost: 8.8.8.8\n\tFull request URI: http://test.com/path',
+               'Layer IMF:\n\tFrom: user@test.com',
+               'Layer IP:\n\tSource: 1.1.1.1\n\tDestination: 2.2.2.2',
+               'Data: http://a.b/c']
+    pcap = PCAP(True, [], '', False, 'entry_id')
+    for packet in packets:
+        pcap.extract_context_from_packet(packet, 'ETH,IP', True)
+    assert len(pcap.regex_batch) == 0
+    assert pcap.ips_extracted == {'8.8.8.8', '1.1.1.1', '2.2.2.2'}
+    assert pcap.urls_extracted == {'http://test.com/path', 'http://a.b/c'}
+    assert pcap.emails_extracted == {'user@test.com'}
@@ -5,9 +5,12 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 import pandas as pd
 from bs4 import BeautifulSoup
+from sklearn.feature_extraction import DictVectorizer
 from sklearn.feature_extraction.text import CountVectorizer
-from numpy import dot
 from numpy.linalg import norm
+from collections import Counter
+import numpy as np
+import hashlib
 from email.utils import parseaddr
 import tldextract
 from urllib.parse import urlparse
@@ -41,6 +44,11 @@ URL_REGEX = r'(?:(?:https?|ftp|hxxps?):\/\/|www\[?\.\]?|ftp\[?\.\]?)(?:[-\w\d]+\
 
 IGNORE_INCIDENT_TYPE_VALUE = 'None'
 
+TOKEN_PATTERN = r"(?u)\b\w\w+\b|!|\?|\"|\'"
+TOKENS_ANALYZER = CountVectorizer(token_pattern=TOKEN_PATTERN).build_analyzer()
+VECTOR_INDEX_LIST_NAME = ''
+VECTOR_INDEX_VERSION = 1
+
 
 def get_existing_incidents(input_args, current_incident_type):
     global DEFAULT_ARGS
@@ -179,23 +187,84 @@ def filter_newer_incidents(existing_incidents_df, new_incident):
     return existing_incidents_df[earlier_incidents_mask]
 
 
-def vectorize(text, vectorizer):
-    return vectorizer.transform([text]).toarray()[0]
+def count_tokens(text):
+    return dict(Counter(TOKENS_ANALYZER(text)))
 
 
-def cosine_sim(a, b):
-    return dot(a, b) / (norm(a) * norm(b))
+def hash_text(text):
+    return hashlib.md5(text.encode('utf-8')).hexdigest()  # nosec
 
 
-def find_duplicate_incidents(new_incident, existing_incidents_df):
+def load_vector_index(list_name):
+    if not list_name:
+        return {}
+    res = demisto.executeCommand('getList', {'listName': list_name})
+    if is_error(res):  # first execution
+        return {}
+    try:
+        vector_index = json.loads(res[0]['Contents'])
+    except (TypeError, ValueError, KeyError, IndexError):
+        demisto.debug('could not load the vector index from list {}, rebuilding it'.format(list_name))
+        return {}
+    if not isinstance(vector_index, dict) or vector_index.get('version') != VECTOR_INDEX_VERSION:
+        return {}
+    return vector_index.get('incidents', {})
+
+
+def save_vector_index(list_name, vector_index):
+    list_data = json.dumps({'version': VECTOR_INDEX_VERSION, 'incidents': vector_index})
+    res = demisto.executeCommand('createList', {'listName': list_name, 'listData': list_data})
+    if is_error(res):
+        demisto.debug('could not save the vector index to list {}: {}'.format(list_name, get_error(res)))
+
+
+def update_vector_index(vector_index, incidents_texts):
+    """
+    Gets the token counts of the incidents from the vector index, tokenizing only the incidents which are missing from
+    the index or whose text has changed. The index is updated in place to hold the given incidents only.
+
+    :param vector_index: dict of incident id to the hash of its text, its token counts and their norm
+    :param incidents_texts: list of (incident id, text) tuples
+    :return: list of the index entries of the incidents, and whether an entry was added, changed or pruned
+    """
+    updated_index = {}
+    index_changed = False
+    for incident_id, text in incidents_texts:
+        incident_id = str(incident_id)
+        text_hash = hash_text(text)
+        entry = vector_index.get(incident_id)
+        if entry is None or entry.get('hash') != text_hash:
+            token_counts = count_tokens(text)
+            entry = {'hash': text_hash, 'counts': token_counts, 'norm': norm(list(token_counts.values()))}
+            index_changed = True
+        updated_index[incident_id] = entry
+    # when no entry was added, the index holds fewer incidents only if some were pruned
+    index_changed = index_changed or len(updated_index) != len(vector_index)
+    vector_index.clear()
+    vector_index.update(updated_index)
+    return list(updated_index.values()), index_changed
+
+
+def cosine_similarities(entry, existing_entries):
+    """
+    Calculates the cosine similarities of a vector index entry to a list of entries, as one sparse matrix product.
+    Only the tokens of the given entry are vectorized, as other tokens do not affect the dot products.
+    """
+    vectorizer = DictVectorizer().fit([entry['counts']])
+    existing_vectors = vectorizer.transform([existing_entry['counts'] for existing_entry in existing_entries])
+    dot_products = existing_vectors.dot(vectorizer.transform([entry['counts']]).T).toarray().ravel()
+    existing_norms = np.array([existing_entry['norm'] for existing_entry in existing_entries], dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return dot_products / (existing_norms * entry['norm'])
+
+
+def find_duplicate_incidents(new_incident, existing_incidents_df, vector_index=None):
     global MERGED_TEXT_FIELD, FROM_POLICY
-    new_incident_text = new_incident[MERGED_TEXT_FIELD]
-    text = [new_incident_text] + existing_incidents_df[MERGED_TEXT_FIELD].tolist()
-    vectorizer = CountVectorizer(token_pattern=r"(?u)\b\w\w+\b|!|\?|\"|\'").fit(text)
-    new_incident_vector = vectorize(new_incident_text, vectorizer)
-    existing_incidents_df['vector'] = existing_incidents_df[MERGED_TEXT_FIELD].apply(lambda x: vectorize(x, vectorizer))
-    existing_incidents_df['similarity'] = existing_incidents_df['vector'].apply(
-        lambda x: cosine_sim(x, new_incident_vector))
+    vector_index = vector_index if vector_index is not None else {}
+    incidents_texts = [(new_incident['id'], new_incident[MERGED_TEXT_FIELD])] + \
+        list(zip(existing_incidents_df['id'], existing_incidents_df[MERGED_TEXT_FIELD]))
+    index_entries, index_changed = update_vector_index(vector_index, incidents_texts)
+    existing_incidents_df['similarity'] = cosine_similarities(index_entries[0], index_entries[1:])
     if FROM_POLICY == FROM_POLICY_DOMAIN:
         mask = (existing_incidents_df[FROM_DOMAIN_FIELD] != '') & \
                (existing_incidents_df[FROM_DOMAIN_FIELD] == new_incident[FROM_DOMAIN_FIELD])
@@ -213,9 +282,9 @@ def find_duplicate_incidents(new_incident, existing_incidents_df):
         pass
     existing_incidents_df.sort_values(by=['distance', 'created', tie_breaker_col], inplace=True)
     if len(existing_incidents_df) > 0:
-        return existing_incidents_df.iloc[0], existing_incidents_df.iloc[0]['similarity']
+        return existing_incidents_df.iloc[0], existing_incidents_df.iloc[0]['similarity'], index_changed
     else:
-        return None, None
+        return None, None, index_changed
 
 
 def return_entry(message, existing_incident=None, similarity=0):
@@ -288,13 +357,15 @@ def create_new_incident_too_short():
 
 
 def main():
-    global EMAIL_BODY_FIELD, EMAIL_SUBJECT_FIELD, EMAIL_HTML_FIELD, FROM_FIELD, MIN_TEXT_LENGTH, FROM_POLICY
+    global EMAIL_BODY_FIELD, EMAIL_SUBJECT_FIELD, EMAIL_HTML_FIELD, FROM_FIELD, MIN_TEXT_LENGTH, FROM_POLICY, \
+        VECTOR_INDEX_LIST_NAME
     input_args = demisto.args()
     EMAIL_BODY_FIELD = input_args.get('emailBody', EMAIL_BODY_FIELD)
     EMAIL_SUBJECT_FIELD = input_args.get('emailSubject', EMAIL_SUBJECT_FIELD)
     EMAIL_HTML_FIELD = input_args.get('emailBodyHTML', EMAIL_HTML_FIELD)
     FROM_FIELD = input_args.get('emailFrom', FROM_FIELD)
     FROM_POLICY = input_args.get('fromPolicy', FROM_POLICY)
+    VECTOR_INDEX_LIST_NAME = input_args.get('vectorIndexListName', VECTOR_INDEX_LIST_NAME)
     new_incident = demisto.incidents()[0]
     existing_incidents = get_existing_incidents(input_args, new_incident.get('type', IGNORE_INCIDENT_TYPE_VALUE))
     demisto.debug('found {} incidents by query'.format(len(existing_incidents)))
@@ -315,8 +386,11 @@ def main():
         create_new_incident()
         return
     new_incident_preprocessed = new_incident_df.iloc[0].to_dict()
-    duplicate_incident_row, similarity = find_duplicate_incidents(new_incident_preprocessed,
-                                                                  existing_incidents_df)
+    vector_index = load_vector_index(VECTOR_INDEX_LIST_NAME)
+    duplicate_incident_row, similarity, index_changed = find_duplicate_incidents(new_incident_preprocessed,
+                                                                                 existing_incidents_df, vector_index)
+    if VECTOR_INDEX_LIST_NAME and index_changed:
+        save_vector_index(VECTOR_INDEX_LIST_NAME, vector_index)
     if duplicate_incident_row is None:
         create_new_incident()
         return
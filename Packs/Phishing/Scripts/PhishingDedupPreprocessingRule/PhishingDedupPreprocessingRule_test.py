@@ -4,6 +4,7 @@ import json
 from datetime import datetime
 
 EXISTING_INCIDENTS = []
+LISTS = {}
 
 RESULTS = None
 EXISTING_INCIDENT_ID = DUP_INCIDENT_ID = None
@@ -50,6 +51,12 @@ def executeCommand(command, args=None):
         return [{'Contents': incidents_str, 'Type': 'not error'}]
     if command == 'CloseInvestigationAsDuplicate':
         EXISTING_INCIDENT_ID = args['duplicateId']
+    if command == 'getList':
+        if args['listName'] not in LISTS:
+            return [{'Contents': 'Item not found', 'Type': entryTypes['error']}]
+        return [{'Contents': LISTS[args['listName']], 'Type': entryTypes['note']}]
+    if command == 'createList':
+        LISTS[args['listName']] = args['listData']
 
 
 def results(arg):
@@ -377,3 +384,45 @@ def test_similar_incidents_2_word_difference(mocker):
     mocker.patch.object(demisto, 'results', side_effect=results)
     main()
     assert not duplicated_incidents_found(existing_incident)
+
+
+def test_vector_index_list(mocker):
+    """
+    Given
+        - The vectorIndexListName argument.
+    When
+        - Running the script for an incident, and then for a newer duplicate of it.
+    Then
+        - Ensure the index is saved to the list, and only the newest incident is tokenized on the second run.
+        - Ensure the list is not saved again by a run which does not change the index.
+    """
+    import PhishingDedupPreprocessingRule as module
+    global EXISTING_INCIDENT_ID, DUP_INCIDENT_ID
+    EXISTING_INCIDENT_ID = DUP_INCIDENT_ID = None
+    LISTS.clear()
+    existing_incident = create_incident(body=text, emailfrom='mt.kb.user@gmail.com',
+                                        created=datetime.strptime('2020-01-01', '%Y-%m-%d'))
+    new_incident = create_incident(body=text2, emailfrom='mt.kb.user@gmail.com',
+                                   created=datetime.strptime('2020-01-02', '%Y-%m-%d'))
+    set_existing_incidents_list([existing_incident])
+    mocker.patch.object(demisto, 'args', return_value={'fromPolicy': 'TextOnly', 'vectorIndexListName': 'dedup'})
+    mocker.patch.object(demisto, 'executeCommand', side_effect=executeCommand)
+    mocker.patch.object(demisto, 'incidents', return_value=[new_incident])
+    mocker.patch.object(demisto, 'results', side_effect=results)
+    main()
+    assert EXISTING_INCIDENT_ID is None
+    assert set(json.loads(LISTS['dedup'])['incidents'].keys()) == {existing_incident['id'], new_incident['id']}
+
+    duplicate_incident = create_incident(body=text2, emailfrom='mt.kb.user@gmail.com',
+                                         created=datetime.strptime('2020-01-03', '%Y-%m-%d'))
+    set_existing_incidents_list([existing_incident, new_incident])
+    mocker.patch.object(demisto, 'incidents', return_value=[duplicate_incident])
+    count_tokens = mocker.spy(module, 'count_tokens')
+    main()
+    assert duplicated_incidents_found(new_incident)
+    assert count_tokens.call_count == 1
+
+    execute_command = mocker.patch.object(demisto, 'executeCommand', side_effect=executeCommand)
+    main()
+    assert count_tokens.call_count == 1
+    assert 'createList' not in [call_args[0][0] for call_args in execute_command.call_args_list]
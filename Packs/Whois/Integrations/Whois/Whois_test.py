@@ -1,4 +1,5 @@
 import datetime
+import re
 
 import Whois
 import demistomock as demisto
@@ -141,3 +142,189 @@ def test_query_result(whois_result, domain, expected):
     from Whois import create_outputs
     md, standard_ec, dbot_score = create_outputs(whois_result, domain)
     assert standard_ec['Whois']['QueryResult'] == expected
+
+
+def test_server_limiter_caps_concurrency():
+    """
+    Given
+        - A WhoisServerLimiter allowing 2 concurrent queries per server.
+    When
+        - 6 threads query the same WHOIS server at once.
+    Then
+        - Ensure no more than 2 queries run against the server at the same time.
+    """
+    import threading
+    from Whois import WhoisServerLimiter
+    limiter = WhoisServerLimiter(max_concurrent=2, min_interval=0)
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def query():
+        with limiter.slot('whois.test'):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=query) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+
+
+def test_domain_command_bulk_lookup(mocker):
+    """
+    Given
+        - A domain list with two subdomains of the same registrable domain and a second domain.
+    When
+        - Running the domain command twice with the WHOIS cache enabled.
+    Then
+        - Ensure each registrable domain is queried once, results keep the input order and the second run is served
+          from the cached records.
+    """
+    integration_context = {}
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=integration_context.update)
+    mocker.patch.object(demisto, 'args', return_value={'domain': 'www.test1.com,mail.test1.com,test2.com'})
+    mocker.patch.object(demisto, 'results')
+    get_whois_raw = mocker.patch.object(
+        Whois, 'get_whois_raw',
+        side_effect=lambda domain, **kwargs: (['Domain Name: {}\n'.format(domain)], ['whois.verisign-grs.com']))
+
+    Whois.domain_command(Whois.WhoisCache(ttl_minutes=10))
+    assert sorted(call[0][0] for call in get_whois_raw.call_args_list) == ['test1.com', 'test2.com']
+    names = [call[0][0]['EntryContext']['Domain(val.Name && val.Name == obj.Name)']['Name']
+             for call in demisto.results.call_args_list]
+    assert names == ['www.test1.com', 'mail.test1.com', 'test2.com']
+    assert set(integration_context['whois_cache']['records']) == {'test1.com', 'test2.com'}
+
+    Whois.domain_command(Whois.WhoisCache(ttl_minutes=10))
+    assert get_whois_raw.call_count == 2
+    assert demisto.results.call_count == 6
+
+
+WHOIS_RESPONSES = {
+    'whois.verisign-grs.com': 'Domain Name: TEST.COM\nRegistrar WHOIS Server: whois.registrar.test\n',
+    'whois.registrar.test': 'Domain Name: test.com\nRegistrant Name: Test\n',
+}
+
+
+def mock_whois_servers(mocker, responses):
+    integration_context = {'whois_cache': {
+        'records': {},
+        'referrals': {'test.com': {'servers': ['whois.verisign-grs.com', 'whois.registrar.test'],
+                                   'expires': time.time() + 60}}}}
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value=integration_context)
+    mocker.patch.object(Whois, 'get_root_server', return_value='whois.verisign-grs.com')
+    return mocker.patch.object(Whois, 'whois_request', side_effect=lambda domain, server: responses[server])
+
+
+def test_lookup_whois_referral_cache(mocker):
+    """
+    Given
+        - A cached referral chain of a domain whose WHOIS record expired.
+    When
+        - Looking the domain up.
+    Then
+        - Ensure the registry and the registrar are each queried once, and the raw data holds both records as in a
+          full lookup.
+    """
+    whois_request = mock_whois_servers(mocker, WHOIS_RESPONSES)
+    parse_raw_whois = mocker.patch.object(Whois, 'parse_raw_whois', return_value={})
+
+    Whois.lookup_whois('test.com', Whois.WhoisCache(ttl_minutes=10))
+    assert sorted(call[0][1] for call in whois_request.call_args_list) == ['whois.registrar.test',
+                                                                           'whois.verisign-grs.com']
+    assert parse_raw_whois.call_args[0][0] == [WHOIS_RESPONSES['whois.registrar.test'],
+                                               WHOIS_RESPONSES['whois.verisign-grs.com']]
+    assert parse_raw_whois.call_args[1]['handle_server'] == 'whois.registrar.test'
+    assert parse_raw_whois.call_args[0][0] == Whois.get_whois_raw('test.com')
+
+
+def test_lookup_whois_referral_cache_fallback(mocker):
+    """
+    Given
+        - A cached referral chain of a domain, whose registrar no longer finds the domain.
+    When
+        - Looking the domain up.
+    Then
+        - Ensure a full lookup is done, following the registry's current referral.
+    """
+    responses = dict(WHOIS_RESPONSES)
+    responses['whois.verisign-grs.com'] = 'Domain Name: TEST.COM\nRegistrar WHOIS Server: whois.new-registrar.test\n'
+    responses['whois.registrar.test'] = 'NOT FOUND\n'
+    responses['whois.new-registrar.test'] = 'Domain Name: test.com\nRegistrant Name: Test\n'
+    mock_whois_servers(mocker, responses)
+    parse_raw_whois = mocker.patch.object(Whois, 'parse_raw_whois', return_value={})
+    cache = Whois.WhoisCache(ttl_minutes=10)
+
+    Whois.lookup_whois('test.com', cache)
+    assert parse_raw_whois.call_args[0][0][0] == responses['whois.new-registrar.test']
+    assert parse_raw_whois.call_args[1]['handle_server'] == 'whois.new-registrar.test'
+    assert cache.get_referral_chain('test.com') == ['whois.verisign-grs.com', 'whois.new-registrar.test']
+
+
+def test_whois_cache_record_size_and_merge(mocker):
+    """
+    Given
+        - A WHOIS cache, and an entry stored in the integration context by another run after the cache was loaded.
+    When
+        - Setting an oversized record and a small one, and saving the cache.
+    Then
+        - Ensure the oversized raw record is not stored while its referral chain is, and the other run's entry is kept.
+    """
+    integration_context = {}
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=integration_context.update)
+    cache = Whois.WhoisCache(ttl_minutes=10, max_record_size=100)
+    integration_context['whois_cache'] = {'records': {'other.com': {'raw': ['Domain Name: other.com\n'],
+                                                                    'servers': ['whois.verisign-grs.com'],
+                                                                    'expires': time.time() + 60}},
+                                          'referrals': {}}
+
+    cache.set_record('big.com', ['x' * 101], ['whois.verisign-grs.com'])
+    cache.set_record('small.com', ['Domain Name: small.com\n'], ['whois.verisign-grs.com'])
+    cache.save()
+    stored_cache = integration_context['whois_cache']
+    assert set(stored_cache['records']) == {'other.com', 'small.com'}
+    assert set(stored_cache['referrals']) == {'big.com', 'small.com'}
+
+
+@pytest.mark.parametrize('regex, expected', [
+    ('Registrant ID:(?P<handle>.+)', 'Registrant ID:'),
+    ('\\[Created on\\]\\s*(?P<val>.+)', '[Created on]'),
+    ('Tech(?:nical)? ID:(?P<handle>.+)', 'Tech'),
+    ('Name Server[.]+ (?P<val>.+)', 'Name Server'),
+    ('Expires on\\s?[.]*:', 'Expires on'),
+    ('Createds?:', 'Created'),
+    ('(C|c)hanged:\\s*(?P<val>.+)', ''),
+    ('created:|registered:', ''),
+    ('^state:\\s*(?P<val>.+)', ''),
+])
+def test_get_literal_prefix(regex, expected):
+    from Whois import get_literal_prefix
+    assert get_literal_prefix(regex) == expected
+
+
+def test_lazy_regexes_candidates():
+    """
+    Given
+        - A LazyRegexes family of case-insensitive regexes.
+    When
+        - Getting the candidates for a text containing the literal prefix of only one of them.
+    Then
+        - Ensure only that regex is returned and compiled, and iterating the family compiles all of it.
+    """
+    from Whois import LazyRegexes
+    regexes = LazyRegexes(['Registrar:\\s*(?P<val>.+)', 'Creation Date:\\s?(?P<val>.+)', '^state:(?P<val>.+)'],
+                          re.IGNORECASE)
+    candidates = regexes.candidates('creation date: 2020-01-01')
+    assert [regex.pattern for regex in candidates] == ['Creation Date:\\s?(?P<val>.+)', '^state:(?P<val>.+)']
+    assert regexes._compiled[0] is None
+    assert len(list(regexes)) == 3
+    assert regexes._compiled[0] is not None
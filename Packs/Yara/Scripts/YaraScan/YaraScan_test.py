@@ -1,11 +1,12 @@
 
-from YaraScan import main
+from YaraScan import main, get_compiled_rules
+import YaraScan
+import yara
 import demistomock as demisto
 from CommonServerPython import entryTypes
 
 
-def test_main(mocker):
-    rule = '''rule PE_file_identifier
+RULE = '''rule PE_file_identifier
 {
     meta:
         author = "Adam Burt"
@@ -19,6 +20,10 @@ def test_main(mocker):
         $MZ at 0
 }'''
 
+
+def test_main(mocker):
+    rule = RULE
+
     def executeCommand(name, args=None):
         if name == 'getFilePath':
             return [
@@ -46,3 +51,71 @@ def test_main(mocker):
     assert results[0]['Type'] == entryTypes['note']
     assert results[0]['Contents'][0]['HasMatch']
     assert results[0]['Contents'][0]['Matches'][0]['RuleName'] == 'PE_file_identifier'
+
+
+def test_main_multiple_files(mocker, tmp_path):
+    """
+    Given:
+        - Two entries, a PE file and a text file.
+    When:
+        - Scanning both entries with a rule that detects PE files.
+    Then:
+        - Ensure the rule is compiled once and each file gets its own result, in the order of the entries.
+    """
+    text_file = tmp_path / 'file.txt'
+    text_file.write_text('not a PE file')
+    paths = {'pe': 'test_data/unzip.exe', 'text': str(text_file)}
+
+    def executeCommand(name, args=None):
+        return [{'Type': entryTypes['note'], 'Contents': {'path': paths[args['id']], 'name': args['id'], 'ID': args['id']}}]
+
+    mocker.patch.object(YaraScan, 'RULES_CACHE_DIR', str(tmp_path / 'cache'))
+    compile_spy = mocker.spy(yara, 'compile')
+    mocker.patch.object(demisto, 'args', return_value={'entryIDs': 'pe,text', 'yaraRule': RULE})
+    mocker.patch.object(demisto, 'executeCommand', side_effect=executeCommand)
+    mocker.patch.object(demisto, 'results')
+    main()
+    contents = demisto.results.call_args[0][0]['Contents']
+    assert compile_spy.call_count == 1
+    assert [result['entryID'] for result in contents] == ['pe', 'text']
+    assert [result['HasMatch'] for result in contents] == [True, False]
+
+
+def test_get_compiled_rules_cache(mocker, tmp_path):
+    """
+    Given:
+        - A yara rule that was already compiled by a previous run.
+    When:
+        - Getting the compiled rules again.
+    Then:
+        - Ensure the compiled rules are loaded from the disk cache instead of compiling the rule again.
+    """
+    mocker.patch.object(YaraScan, 'RULES_CACHE_DIR', str(tmp_path))
+    get_compiled_rules(RULE)
+    compile_spy = mocker.spy(yara, 'compile')
+    rules = get_compiled_rules(RULE)
+    assert compile_spy.call_count == 0
+    assert rules.match(filepath='test_data/unzip.exe')[0].rule == 'PE_file_identifier'
+
+
+def test_get_compiled_rules_shared_cache_dir(mocker, tmp_path):
+    """
+    Given:
+        - A yara rules cache dir that other users can write to, containing a compiled rules file.
+    When:
+        - Getting the compiled rules.
+    Then:
+        - Ensure the cached file is not loaded and the rule is compiled instead.
+    """
+    import os
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    os.chmod(str(cache_dir), 0o777)
+    mocker.patch.object(YaraScan, 'RULES_CACHE_DIR', str(cache_dir))
+    load_spy = mocker.spy(yara, 'load')
+    compile_spy = mocker.spy(yara, 'compile')
+    get_compiled_rules(RULE)
+    get_compiled_rules(RULE)
+    assert load_spy.call_count == 0
+    assert compile_spy.call_count == 2
+    assert os.listdir(str(cache_dir)) == []
@@ -10,12 +10,16 @@ import numpy as np
 from PIL import Image
 import tempfile
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import base64
 import time
 import subprocess
 import traceback
 import re
 import os
+import queue
+import threading
 
 # Chrome respects proxy env params
 handle_proxy()
@@ -32,6 +36,7 @@ EMPTY_RESPONSE_ERROR_MSG = "There is nothing to render. This can occur when ther
                            " Please check your URL."
 DEFAULT_W, DEFAULT_H = '600', '800'
 DEFAULT_W_WIDE = '1024'
+DEFAULT_BATCH_WORKERS = 4
 CHROME_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.117 Safari/537.36'  # noqa
 DRIVER_LOG = f'{tempfile.gettempdir()}/chromedriver.log'
 DEFAULT_CHROME_OPTIONS = [
@@ -87,10 +92,14 @@ def merge_options(default_options, user_options):
     return options
 
 
+class EmptyResponseError(Exception):
+    pass
+
+
 def check_response(driver):
     EMPTY_PAGE = '<html><head></head><body></body></html>'
     if driver.page_source == EMPTY_PAGE:
-        return_err_or_warn(EMPTY_RESPONSE_ERROR_MSG)
+        raise EmptyResponseError(EMPTY_RESPONSE_ERROR_MSG)
 
 
 def init_driver(offline_mode=False):
@@ -153,6 +162,147 @@ def quit_driver_and_reap_children(driver):
         demisto.error(f'Failed checking for zombie processes: {e}. Trace: {traceback.format_exc()}')
 
 
+def send_chrome_command(driver, cmd: str, params: dict):
+    """
+    Sends a Chrome DevTools Protocol command to the driver's browser
+    :return: the raw response of the command
+    """
+    resource = f'{driver.command_executor._url}/session/{driver.session_id}/chromium/send_command_and_get_result'
+    body = json.dumps({'cmd': cmd, 'params': params})
+    return driver.command_executor._request('POST', resource, body)
+
+
+class DriverPool:
+    """
+    A pool of reusable Chrome drivers, started lazily up to the pool size.
+    Every page is rendered in a fresh tab, and the cookies and storage of the page are cleared once it is
+    released, so pages rendered by the same browser do not share a session.
+    A driver that failed to render a page is quit and replaced by a new one on demand.
+    """
+
+    def __init__(self, size: int, offline_mode: bool = False):
+        self.size = max(size, 1)
+        self.offline_mode = offline_mode
+        self._idle: queue.Queue = queue.Queue()
+        self._drivers: list = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                start_driver = len(self._drivers) < self.size
+                if start_driver:
+                    self._drivers.append(None)  # reserve the slot while the browser starts
+            if start_driver:
+                break
+            try:
+                # wake up periodically, a slot is freed when a failed driver is discarded
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                pass
+        try:
+            driver = init_driver(self.offline_mode)
+        except BaseException:
+            with self._lock:
+                self._drivers.remove(None)
+            raise
+        with self._lock:
+            self._drivers[self._drivers.index(None)] = driver
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._drivers.remove(driver)
+        quit_driver_and_reap_children(driver)
+
+    @contextmanager
+    def driver(self):
+        """
+        Yields an idle driver with a single blank tab, waiting for one if all the drivers are in use
+        """
+        driver = self._acquire()
+        try:
+            open_clean_tab(driver)
+            yield driver
+            clear_page_data(driver)
+        except BaseException:
+            self._discard(driver)
+            raise
+        self._idle.put(driver)
+
+    def close(self):
+        with self._lock:
+            drivers = [driver for driver in self._drivers if driver]
+            self._drivers = []
+        for driver in drivers:
+            quit_driver_and_reap_children(driver)
+
+
+def open_clean_tab(driver):
+    """
+    Opens a new blank tab and closes all the other tabs of the driver
+    """
+    previous_handles = driver.window_handles
+    driver.execute_script('window.open("about:blank");')
+    new_handle = [handle for handle in driver.window_handles if handle not in previous_handles][0]
+    for handle in previous_handles:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(new_handle)
+
+
+def clear_page_data(driver):
+    """
+    Clears the cookies, cache and storage left by the page loaded in the driver
+    """
+    origin = driver.execute_script('return window.location.origin')
+    if origin and origin != 'null':
+        send_chrome_command(driver, 'Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+    send_chrome_command(driver, 'Network.clearBrowserCookies', {})
+    send_chrome_command(driver, 'Network.clearBrowserCache', {})
+
+
+def render_page(driver, path: str, width: int, height: int, r_type: str = 'png', wait_time: int = 0,
+                page_load_time: int = 180):
+    """
+    Loads a path (url/file) in the driver and captures it
+    :return: the .png/.pdf output of the loaded path
+    """
+    demisto.debug(f'Navigating to path: {path}. page load: {page_load_time}')
+    driver.set_page_load_timeout(page_load_time)
+    driver.get(path)
+    driver.implicitly_wait(5)
+    if wait_time > 0 or DEFAULT_WAIT_TIME > 0:
+        time.sleep(wait_time or DEFAULT_WAIT_TIME)
+    check_response(driver)
+    demisto.debug('Navigating to path - COMPLETED')
+
+    if r_type.lower() == 'pdf':
+        return get_pdf(driver, width, height)
+    return get_image(driver, width, height)
+
+
+def get_error_message(ex: Exception, page_load_time: int) -> str:
+    """
+    Builds the error message of a failed rasterize. Must be called while handling the exception.
+    """
+    if isinstance(ex, EmptyResponseError):
+        return EMPTY_RESPONSE_ERROR_MSG
+    if isinstance(ex, (InvalidArgumentException, NoSuchElementException)):
+        if 'invalid argument' in str(ex):
+            return URL_ERROR_MSG + str(ex)
+        return f'Invalid exception: {ex}\nTrace:{traceback.format_exc()}'
+    if isinstance(ex, TimeoutException):
+        return f'Timeout exception with max load time of: {page_load_time} seconds. {ex}'
+    err_str = f'General error: {ex}\nTrace:{traceback.format_exc()}'
+    demisto.error(err_str)
+    return err_str
+
+
 def rasterize(path: str, width: int, height: int, r_type: str = 'png', wait_time: int = 0,
               offline_mode: bool = False, max_page_load_time: int = 180):
     """
@@ -167,38 +317,41 @@ def rasterize(path: str, width: int, height: int, r_type: str = 'png', wait_time
     driver = init_driver(offline_mode)
     page_load_time = max_page_load_time if max_page_load_time > 0 else DEFAULT_PAGE_LOAD_TIME
     try:
-        demisto.debug(f'Navigating to path: {path}. Mode: {"OFFLINE" if offline_mode else "ONLINE"}. page load: {page_load_time}')
-        driver.set_page_load_timeout(page_load_time)
-        driver.get(path)
-        driver.implicitly_wait(5)
-        if wait_time > 0 or DEFAULT_WAIT_TIME > 0:
-            time.sleep(wait_time or DEFAULT_WAIT_TIME)
-        check_response(driver)
-        demisto.debug('Navigating to path - COMPLETED')
-
-        if r_type.lower() == 'pdf':
-            output = get_pdf(driver, width, height)
-        else:
-            output = get_image(driver, width, height)
-
-        return output
-
-    except (InvalidArgumentException, NoSuchElementException) as ex:
-        if 'invalid argument' in str(ex):
-            err_msg = URL_ERROR_MSG + str(ex)
-            return_err_or_warn(err_msg)
-        else:
-            return_err_or_warn(f'Invalid exception: {ex}\nTrace:{traceback.format_exc()}')
-    except TimeoutException as ex:
-        return_err_or_warn(f'Timeout exception with max load time of: {page_load_time} seconds. {ex}')
+        demisto.debug(f'Rasterize mode: {"OFFLINE" if offline_mode else "ONLINE"}')
+        return render_page(driver, path, width, height, r_type=r_type, wait_time=wait_time,
+                           page_load_time=page_load_time)
     except Exception as ex:
-        err_str = f'General error: {ex}\nTrace:{traceback.format_exc()}'
-        demisto.error(err_str)
-        return_err_or_warn(err_str)
+        return_err_or_warn(get_error_message(ex, page_load_time))
     finally:
         quit_driver_and_reap_children(driver)
 
 
+def rasterize_batch(paths: List[str], width: int, height: int, r_type: str = 'png', wait_time: int = 0,
+                    max_page_load_time: int = 180, max_workers: int = DEFAULT_BATCH_WORKERS):
+    """
+    Capturing snapshots of multiple paths concurrently, using a pool of reusable Chrome Drivers
+    :param paths: file paths, or website urls
+    :param max_workers: maximum number of paths rendered at the same time
+    :return: list of (output, error message) tuples, in the order of the paths
+    """
+    page_load_time = max_page_load_time if max_page_load_time > 0 else DEFAULT_PAGE_LOAD_TIME
+    pool = DriverPool(min(max_workers, len(paths)))
+
+    def render(path):
+        try:
+            with pool.driver() as driver:
+                return render_page(driver, path, width, height, r_type=r_type, wait_time=wait_time,
+                                   page_load_time=page_load_time), None
+        except Exception as ex:
+            return None, get_error_message(ex, page_load_time)
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            return list(executor.map(render, paths))
+    finally:
+        pool.close()
+
+
 def get_image(driver, width: int, height: int):
     """
     Uses the Chrome driver to generate an image out of a currently loaded path
@@ -210,7 +363,6 @@ def get_image(driver, width: int, height: int):
     driver.set_window_size(width, height)
 
     image = driver.get_screenshot_as_png()
-    driver.quit()
 
     demisto.debug('Capturing screenshot - COMPLETED')
 
@@ -225,13 +377,10 @@ def get_pdf(driver, width: int, height: int):
     demisto.debug('Generating PDF')
 
     driver.set_window_size(width, height)
-    resource = f'{driver.command_executor._url}/session/{driver.session_id}/chromium/send_command_and_get_result'
-    body = json.dumps({'cmd': 'Page.printToPDF', 'params': {'landscape': False}})
-    response = driver.command_executor._request('POST', resource, body)
+    response = send_chrome_command(driver, 'Page.printToPDF', {'landscape': False})
 
     if response.get('status'):
-        demisto.results(response.get('status'))
-        return_error(response.get('value'))
+        raise DemistoException(f'Failed generating PDF. Status: {response.get("status")}. {response.get("value")}')
 
     data = base64.b64decode(response.get('value').get('data'))
     demisto.debug('Generating PDF - COMPLETED')
@@ -305,6 +454,37 @@ def rasterize_command():
     demisto.results(res)
 
 
+def rasterize_batch_command():
+    args = demisto.args()
+    urls = argToList(args.get('urls'))
+    w = args.get('width', DEFAULT_W_WIDE).rstrip('px')
+    h = args.get('height', DEFAULT_H).rstrip('px')
+    r_type = args.get('type', 'png')
+    wait_time = int(args.get('wait_time', 0))
+    page_load = int(args.get('max_page_load_time', DEFAULT_PAGE_LOAD_TIME))
+    max_workers = int(args.get('max_workers', DEFAULT_BATCH_WORKERS))
+
+    urls = [url if url.startswith('http') else f'http://{url}' for url in urls]
+    results = rasterize_batch(urls, width=w, height=h, r_type=r_type, wait_time=wait_time,
+                              max_page_load_time=page_load, max_workers=max_workers)
+
+    entries = []
+    for index, (url, (output, err_msg)) in enumerate(zip(urls, results), start=1):
+        if err_msg:
+            entries.append({
+                'Type': entryTypes['error'] if WITH_ERRORS else entryTypes['warning'],
+                'ContentsFormat': formats['text'],
+                'Contents': f'Failed to rasterize {url}: {err_msg}'
+            })
+            continue
+        res = fileResult(filename=f'url_{index}.{"pdf" if r_type == "pdf" else "png"}', data=output)
+        if r_type == 'png':
+            res['Type'] = entryTypes['image']
+        entries.append(res)
+
+    demisto.results(entries)
+
+
 def rasterize_image_command():
     args = demisto.args()
     entry_id = args.get('EntryID')
@@ -392,6 +572,9 @@ def main():
         elif demisto.command() == 'rasterize':
             rasterize_command()
 
+        elif demisto.command() == 'rasterize-batch':
+            rasterize_batch_command()
+
         else:
             return_error('Unrecognized command')
 
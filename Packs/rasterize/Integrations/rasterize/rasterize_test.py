@@ -1,4 +1,6 @@
-from rasterize import rasterize, find_zombie_processes, merge_options, DEFAULT_CHROME_OPTIONS, rasterize_image_command
+from rasterize import rasterize, find_zombie_processes, merge_options, DEFAULT_CHROME_OPTIONS, rasterize_image_command, \
+    DriverPool, rasterize_batch_command
+import rasterize as rasterize_module
 import demistomock as demisto
 from CommonServerPython import entryTypes
 from tempfile import NamedTemporaryFile
@@ -9,6 +11,7 @@ import http.server
 import time
 import threading
 import pytest
+import base64
 
 # disable warning from urllib3. these are emitted when python driver can't connect to chrome yet
 logging.getLogger("urllib3").setLevel(logging.ERROR)
@@ -172,3 +175,138 @@ def test_rasterize_image_to_pdf(mocker):
     results = demisto.results.call_args[0]
     assert len(results) == 1
     assert results[0]['Type'] == entryTypes['entryInfoFile']
+
+
+class FakeDriver:
+    def __init__(self):
+        self.window_handles = ['tab0']
+        self.opened_tabs = 0
+        self.pages = []
+
+    def execute_script(self, script):
+        if script.startswith('window.open'):
+            self.opened_tabs += 1
+            self.window_handles = self.window_handles + [f'tab{self.opened_tabs}']
+        return 'null'
+
+    def close(self):
+        self.window_handles = self.window_handles[1:]
+
+    @property
+    def switch_to(self):
+        return self
+
+    def window(self, handle):
+        pass
+
+    def set_page_load_timeout(self, timeout):
+        pass
+
+    def get(self, path):
+        self.pages.append(path)
+        self.page_source = f'<html><body>{path}</body></html>'
+
+    def implicitly_wait(self, timeout):
+        pass
+
+    def set_window_size(self, width, height):
+        pass
+
+
+def test_driver_pool_reuses_drivers(mocker):
+    """
+    Given:
+        - A driver pool of size 2.
+    When:
+        - Rendering 6 pages with up to 2 pages at the same time, where one of the pages fails.
+    Then:
+        - Ensure at most 2 browsers are alive at the same time and that the browser of the failed page is replaced.
+        - Ensure every page gets a fresh tab and all the browsers are quit when the pool is closed.
+    """
+    init_driver_mock = mocker.patch.object(rasterize_module, 'init_driver', side_effect=lambda offline_mode: FakeDriver())
+    quit_mock = mocker.patch.object(rasterize_module, 'quit_driver_and_reap_children')
+    mocker.patch.object(rasterize_module, 'send_chrome_command')
+    pool = DriverPool(2)
+    for page in range(6):
+        with pool.driver() as driver:
+            assert len(driver.window_handles) == 1
+            driver.pages.append(page)
+    assert init_driver_mock.call_count == 1
+
+    with pytest.raises(ValueError):
+        with pool.driver() as driver:
+            raise ValueError('render failed')
+    assert quit_mock.call_count == 1
+
+    with pool.driver() as first, pool.driver() as second:
+        assert first is not second
+    assert init_driver_mock.call_count == 3
+    pool.close()
+    assert quit_mock.call_count == 3
+
+
+def test_rasterize_batch_command(mocker):
+    """
+    Given:
+        - Three URLs, one of which fails to render.
+    When:
+        - Running the rasterize-batch command.
+    Then:
+        - Ensure a file entry is returned for each rendered URL and an error entry for the failed one, in order.
+    """
+    from selenium.common.exceptions import TimeoutException
+
+    def render_page(driver, path, *args, **kwargs):
+        if 'slow' in path:
+            raise TimeoutException('timed out')
+        return path.encode()
+
+    mocker.patch.object(rasterize_module, 'init_driver', side_effect=lambda offline_mode: FakeDriver())
+    mocker.patch.object(rasterize_module, 'quit_driver_and_reap_children')
+    mocker.patch.object(rasterize_module, 'send_chrome_command')
+    mocker.patch.object(rasterize_module, 'render_page', side_effect=render_page)
+    mocker.patch.object(rasterize_module, 'WITH_ERRORS', True)
+    mocker.patch.object(rasterize_module, 'fileResult', side_effect=lambda filename, data: {'File': filename,
+                                                                                            'Data': data})
+    mocker.patch.object(demisto, 'args', return_value={'urls': 'http://a.com,slow.com,http://b.com',
+                                                       'max_workers': '2'})
+    mocker.patch.object(demisto, 'results')
+    rasterize_batch_command()
+    entries = demisto.results.call_args[0][0]
+    assert [entry.get('File') for entry in entries] == ['url_1.png', None, 'url_3.png']
+    assert entries[0]['Data'] == b'http://a.com'
+    assert entries[0]['Type'] == entryTypes['image']
+    assert entries[1]['Type'] == entryTypes['error']
+    assert 'http://slow.com' in entries[1]['Contents']
+    assert 'Timeout exception' in entries[1]['Contents']
+
+
+def test_rasterize_batch_pdf_failure(mocker):
+    """
+    Given:
+        - Three URLs to render as PDF, where Chrome fails to print one of them.
+    When:
+        - Rasterizing the URLs in a batch.
+    Then:
+        - Ensure the failure is reported for its URL only and the other PDFs are returned.
+    """
+    def send_chrome_command(driver, cmd, params):
+        if 'bad' in driver.pages[-1]:
+            return {'status': 13, 'value': 'print failed'}
+        return {'value': {'data': base64.b64encode(driver.pages[-1].encode()).decode()}}
+
+    mocker.patch.object(rasterize_module, 'init_driver', side_effect=lambda offline_mode: FakeDriver())
+    mocker.patch.object(rasterize_module, 'quit_driver_and_reap_children')
+    mocker.patch.object(rasterize_module, 'send_chrome_command', side_effect=send_chrome_command)
+    mocker.patch.object(rasterize_module, 'open_clean_tab')
+    mocker.patch.object(rasterize_module, 'clear_page_data')
+    mocker.patch.object(demisto, 'results')
+
+    results = rasterize_module.rasterize_batch(['http://a.com', 'http://bad.com', 'http://c.com'], 600, 800,
+                                               r_type='pdf', max_workers=2)
+
+    assert results[0] == (b'http://a.com', None)
+    assert results[1][0] is None
+    assert 'print failed' in results[1][1]
+    assert results[2] == (b'http://c.com', None)
+    assert not demisto.results.called